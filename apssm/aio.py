@@ -0,0 +1,151 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Iterable, TypeVar
+
+from apssm.exceptions import ChargePowerSupply, NoPowerSupplies
+from apssm.graph import AbstractPowerSupplySystemGraph
+from apssm.thin_port import ThinPort
+from apssm.tree import AbstractPowerSupplySystemForest
+
+# version of the graph and the effective switch states
+_Key = tuple[int, bytes]
+
+T = TypeVar("T")
+
+
+async def _shared(future: "asyncio.Future[T]") -> T:
+    """await a future shared by coalesced requests"""
+    try:
+        # a cancelled request doesn't cancel the others
+        return await asyncio.shield(future)
+    except ChargePowerSupply as e:
+        # each request raises its own exception, as the forest cache does
+        raise ChargePowerSupply(e.from_, e.to) from None
+
+
+class _Batch:
+    """the destinations of the `find_passages` waiting for the same forest"""
+
+    destinations: dict[tuple[str, int], None]
+    result: "asyncio.Future[dict[str, list[tuple[ThinPort, ...]]]]"
+
+    def __init__(self) -> None:
+        self.destinations = {}
+
+
+class AsyncGraph:
+    """
+    An asyncio front-end of `AbstractPowerSupplySystemGraph`.
+
+    The searches run in an executor, so the event loop is never blocked by
+    them. The requests with the same effective switch states, i.e. the key of
+    the forest cache, are coalesced while in flight: they share one forest,
+    which also goes through the forest cache of the graph, and the
+    destinations of the concurrent `find_passages` are merged and searched in
+    one pass.
+
+    The graph must not be modified while requests are in flight, and the
+    requests must come from one event loop.
+    """
+
+    graph: AbstractPowerSupplySystemGraph
+    executor: Executor | None
+    _forests: dict[_Key, "asyncio.Future[AbstractPowerSupplySystemForest]"]
+    _batches: dict[_Key, _Batch]
+
+    def __init__(
+        self, graph: AbstractPowerSupplySystemGraph, executor: Executor | None = None
+    ) -> None:
+        """
+        Args:
+            graph (AbstractPowerSupplySystemGraph): the graph
+            executor (Executor | None, optional): the executor of searches.
+                Defaults to the default executor of the event loop.
+        """
+        self.graph = graph
+        self.executor = executor
+        self._forests = {}
+        self._batches = {}
+
+    def _key(self, truth_table: dict[str, bool] | None) -> _Key:
+        """
+        Throws:
+            NoSuchDevice: if a device in truth table doesn't exist
+            NoPowerSupplies: if there are no power supplies
+        """
+        compiled = self.graph.compile()
+        links = compiled.links(truth_table)
+        if not compiled.roots:
+            raise NoPowerSupplies()
+        return self.graph.version, compiled.state_key(links)
+
+    async def gen_forest(
+        self, truth_table: dict[str, bool] | None = None
+    ) -> AbstractPowerSupplySystemForest:
+        """see `AbstractPowerSupplySystemGraph.gen_forest`, but the forest is
+        shared by the coalesced requests and the cache, it must not be modified
+        """
+        return await self._forest(self._key(truth_table), truth_table)
+
+    async def _forest(
+        self, key: _Key, truth_table: dict[str, bool] | None
+    ) -> AbstractPowerSupplySystemForest:
+        future = self._forests.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(
+                self.executor, self.graph.cached_forest, truth_table
+            )
+            self._forests[key] = future
+
+            def done(_) -> None:
+                if self._forests.get(key) is future:
+                    del self._forests[key]
+
+            future.add_done_callback(done)
+        return await _shared(future)
+
+    async def find_passages(
+        self,
+        destinations: Iterable[tuple[str, int] | ThinPort],
+        truth_table: dict[str, bool] | None = None,
+    ) -> dict[str, list[tuple[ThinPort, ...]]]:
+        """see `AbstractPowerSupplySystemGraph.find_passages`
+
+        The destinations of the requests arriving while the forest is
+        generated are searched together, once it's ready.
+        """
+        destinations = list(destinations)
+        key = self._key(truth_table)
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch()
+            batch.result = asyncio.ensure_future(self._search(key, truth_table, batch))
+        batch.destinations.update(dict.fromkeys(map(tuple, destinations)))
+        merged = await _shared(batch.result)
+
+        compiled = self.graph.compile()
+        res: dict[str, list[tuple[ThinPort, ...]]] = {}
+        for to in destinations:
+            port = compiled.lookup(to)
+            if port is None:
+                continue
+            port_id = compiled.port_ids[port]
+            if passages := merged.get(port_id):
+                res.setdefault(port_id, []).extend(passages)
+        return res
+
+    async def _search(
+        self, key: _Key, truth_table: dict[str, bool] | None, batch: _Batch
+    ) -> dict[str, list[tuple[ThinPort, ...]]]:
+        try:
+            forest = await self._forest(key, truth_table)
+        finally:
+            # the requests arriving from now on start another batch
+            if self._batches.get(key) is batch:
+                del self._batches[key]
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            self.graph.compile().passages,
+            forest,
+            list(batch.destinations),
+        )
@@ -0,0 +1,73 @@
+import sys
+from array import array
+from typing import BinaryIO, Sequence
+
+# the byte order of int sections, 0 for little endian, 1 for big endian
+BYTE_ORDER = 0 if sys.byteorder == "little" else 1
+
+
+def aligned(size: int) -> int:
+    """round `size` up to a multiple of 8"""
+    return (size + 7) & ~7
+
+
+def int64s(ints: Sequence[int]) -> array | memoryview:
+    """`ints` if it's an array or a memoryview of int64, else a copy as array"""
+    if isinstance(ints, array) and ints.typecode == "q":
+        return ints
+    if isinstance(ints, memoryview) and ints.format == "q":
+        return ints
+    return array("q", ints)
+
+
+def write_section(f: BinaryIO, data: bytes | bytearray | array | memoryview) -> None:
+    """write `data` padded to 8 bytes"""
+    data = memoryview(data).cast("B")  # type: ignore
+    f.write(data)
+    f.write(bytes(aligned(len(data)) - len(data)))
+
+
+class SectionReader:
+    """read the sections written by `write_section` from a buffer, without
+    copying them
+
+    Attributes:
+        position (int): offset of the next section
+    """
+
+    buffer: memoryview
+    byte_order: int
+    position: int
+
+    def __init__(self, buffer: memoryview, position: int, byte_order: int) -> None:
+        """
+        Args:
+            buffer (memoryview): the buffer
+            position (int): offset of the first section
+            byte_order (int): byte order the int sections were written in
+        """
+        self.buffer = buffer
+        self.position = position
+        self.byte_order = byte_order
+
+    def take(self, size: int) -> memoryview:
+        """
+        Throws:
+            ValueError: if the buffer is truncated
+        """
+        section = self.buffer[self.position : self.position + size]
+        if len(section) != size:
+            raise ValueError("truncated buffer")
+        self.position += aligned(size)
+        return section
+
+    def take_ints(self, count: int) -> memoryview | array:
+        """take `count` int64, a memoryview unless they were written in the
+        other byte order"""
+        section = self.take(8 * count)
+        if self.byte_order == BYTE_ORDER:
+            return section.cast("q")
+        ints = array("q")
+        ints.frombytes(section)
+        ints.byteswap()
+        return ints
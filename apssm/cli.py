@@ -0,0 +1,191 @@
+import argparse
+import json
+import sys
+from contextlib import ExitStack
+from functools import lru_cache
+from itertools import islice
+from typing import IO, Any, Iterator, Sequence
+
+from apssm.compiled import CompiledGraph
+from apssm.energize import energized_loads
+from apssm.exceptions import ChargePowerSupply, NoPowerSupplies, NoSuchDevice
+from apssm.protocol import check_request
+from apssm.server import make_server
+from apssm.snapshot import load, load_graph
+from apssm.sweep import map_chunks
+
+
+@lru_cache(maxsize=None)
+def _load(snapshot: str) -> CompiledGraph:
+    """the compiled graph of a snapshot, loaded once per process, the pages of
+    the snapshot are shared by the processes mapping it"""
+    return load(snapshot)
+
+
+def evaluate(compiled: CompiledGraph, request: dict[str, Any]) -> dict[str, Any]:
+    """evaluate a request of the JSONL protocol
+
+    A request is an object with the optional keys:
+
+        truth_table   {switch: bool}, defaults to the states of switches
+        destinations  [[device, index], ...], find the passages to them,
+                      otherwise find the energized loads
+        id            anything, copied to the response
+
+    The response has `id` if the request has, and one of:
+
+        passages         {port id: [[[device, index], ...], ...]}, see
+                         `AbstractPowerSupplySystemGraph.find_passages`
+        energized_loads  {load: [power supply, ...]}, see
+                         `AbstractPowerSupplySystemGraph.energized_loads`
+        charge           [from, to], the power supplies of ChargePowerSupply
+        error            the message of an invalid request, see
+                         `apssm.protocol.check_request`
+
+    Args:
+        compiled (CompiledGraph): the graph
+        request (dict[str, Any]): the request
+
+    Returns:
+        dict[str, Any]: the response
+    """
+    response: dict[str, Any] = {}
+    if isinstance(request, dict) and "id" in request:
+        response["id"] = request["id"]
+    try:
+        check_request(request, ("truth_table", "destinations", "id"))
+    except (TypeError, ValueError) as e:
+        response["error"] = str(e)
+        return response
+    truth_table = request.get("truth_table")
+    destinations = request.get("destinations")
+    try:
+        if destinations is None:
+            response["energized_loads"] = energized_loads(compiled, truth_table)
+        else:
+            response["passages"] = compiled.passages(
+                compiled.gen_forest(truth_table), map(tuple, destinations)
+            )
+    except ChargePowerSupply as e:
+        response["charge"] = [e.from_.name, e.to.name]
+    except (NoSuchDevice, NoPowerSupplies) as e:
+        response["error"] = str(e)
+    return response
+
+
+def _evaluate_lines(snapshot: str, lines: list[str]) -> list[str]:
+    compiled = _load(snapshot)
+    responses: list[str] = []
+    for line in lines:
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            response: dict[str, Any] = {"error": str(e)}
+        else:
+            response = evaluate(compiled, request)
+        responses.append(json.dumps(response, ensure_ascii=False))
+    return responses
+
+
+def batch(
+    snapshot: str,
+    input_: IO[str],
+    output: IO[str],
+    workers: int = 1,
+    chunk_size: int = 256,
+) -> None:
+    """evaluate the JSONL requests of `input_`, see `evaluate`, and write the
+    responses to `output` in the same order, one line each, blank lines are
+    skipped
+
+    The lines are read lazily, at most 2 chunks per worker are in flight, so
+    memory doesn't grow with the input. Each worker maps the snapshot once.
+
+    Args:
+        snapshot (str): path of the snapshot file
+        input_ (IO[str]): the requests
+        output (IO[str]): the responses
+        workers (int, optional): number of processes, evaluate in the current
+            process if it is 1 or less. Defaults to 1.
+        chunk_size (int, optional): number of lines sent to a worker at a time.
+            Defaults to 256.
+    """
+
+    def chunks() -> Iterator[list[str]]:
+        lines = (line for line in input_ if line.strip())
+        while chunk := list(islice(lines, chunk_size)):
+            yield chunk
+
+    # fail early if the snapshot is invalid
+    _load(snapshot)
+    for responses in map_chunks(_evaluate_lines, snapshot, chunks(), workers):
+        for response in responses:
+            output.write(response)
+            output.write("\n")
+        output.flush()
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="apssm")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_batch = commands.add_parser(
+        "batch", help="evaluate JSONL requests against a graph snapshot"
+    )
+    parser_batch.add_argument("snapshot", help="path of the snapshot file")
+    parser_batch.add_argument(
+        "-i", "--input", default="-", help="the JSONL requests, - for stdin"
+    )
+    parser_batch.add_argument(
+        "-o", "--output", default="-", help="the JSONL responses, - for stdout"
+    )
+    parser_batch.add_argument(
+        "-w", "--workers", type=int, default=1, help="number of processes"
+    )
+    parser_batch.add_argument(
+        "--chunk-size", type=int, default=256, help="lines sent to a worker at a time"
+    )
+
+    parser_serve = commands.add_parser(
+        "serve", help="serve JSON queries on a graph snapshot over HTTP"
+    )
+    parser_serve.add_argument("snapshot", help="path of the snapshot file")
+    parser_serve.add_argument("--host", default="127.0.0.1", help="host to bind")
+    parser_serve.add_argument("--port", type=int, default=8000, help="port to bind")
+    parser_serve.add_argument(
+        "--unix", help="path of a Unix socket to bind, instead of host and port"
+    )
+    parser_serve.add_argument(
+        "-w", "--workers", type=int, default=None, help="number of threads"
+    )
+    parser_serve.add_argument(
+        "--cache-size", type=int, default=128, help="max number of forests cached"
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "batch":
+        with ExitStack() as stack:
+            input_ = (
+                sys.stdin
+                if args.input == "-"
+                else stack.enter_context(open(args.input, encoding="utf-8"))
+            )
+            output = (
+                sys.stdout
+                if args.output == "-"
+                else stack.enter_context(open(args.output, "w", encoding="utf-8"))
+            )
+            batch(args.snapshot, input_, output, args.workers, args.chunk_size)
+    elif args.command == "serve":
+        graph = load_graph(args.snapshot, args.cache_size)
+        server = make_server(graph, args.unix or (args.host, args.port), args.workers)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1104 @@
+from array import array
+from enum import IntEnum
+from functools import cached_property
+from sys import getsizeof
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, NamedTuple, Sequence
+
+from apssm.buffer import int64s
+from apssm.dag import AbstractPowerSupplySystemDag
+from apssm.devices.bus import Bus
+from apssm.devices.dc_dc import DcDc
+from apssm.devices.diode import Diode
+from apssm.devices.load import Load
+from apssm.devices.power_supply import PowerSupply
+from apssm.devices.switch import Switch
+from apssm.exceptions import (
+    ChargePowerSupply,
+    NoPowerSupplies,
+    NoSuchDevice,
+)
+from apssm.stats import SearchStats, TreeStats
+from apssm.thin_port import ThinPort
+from apssm.tree import (
+    AbstractPowerSupplySystemForest,
+    AbstractPowerSupplySystemTree,
+)
+from apssm.typing import DeviceType
+
+if TYPE_CHECKING:
+    from apssm.conflicts import Conflicts
+    from apssm.graph import AbstractPowerSupplySystemGraph
+
+
+class DeviceKind(IntEnum):
+    """device kind code stored per port of a compiled graph"""
+
+    POWER_SUPPLY = 0
+    SWITCH = 1
+    DC_DC = 2
+    BUS = 3
+    LOAD = 4
+    DIODE = 5
+
+
+_KINDS: tuple[tuple[type, DeviceKind], ...] = (
+    (PowerSupply, DeviceKind.POWER_SUPPLY),
+    (Switch, DeviceKind.SWITCH),
+    (DcDc, DeviceKind.DC_DC),
+    (Bus, DeviceKind.BUS),
+    (Load, DeviceKind.LOAD),
+    (Diode, DeviceKind.DIODE),
+)
+
+
+_KIND_OF_TYPE: dict[type, DeviceKind] = dict(_KINDS)
+
+
+def device_kind(device: DeviceType) -> DeviceKind:
+    kind = _KIND_OF_TYPE.get(type(device))
+    if kind is not None:
+        return kind
+    for type_, kind in _KINDS:
+        if isinstance(device, type_):
+            return kind
+    raise TypeError(f"unknown device type: {type(device).__name__}")
+
+
+class PortTables(NamedTuple):
+    """the per port tables of a compiled graph derived from its devices, see
+    `CompiledGraph`"""
+
+    port_numbers: array
+    kinds: bytes
+    partners: array
+    base_links: bytes
+    cathodes: bytes
+    roots: tuple[int, ...]
+    switch_ports: tuple[int, ...]
+
+
+def port_tables(devices: Sequence[DeviceType]) -> PortTables:
+    """derive the per port tables of devices, numbered consecutively in order"""
+    port_numbers = array("q", [i for device in devices for i in range(device.port_num)])
+    kinds = bytes(
+        [
+            kind
+            for device in devices
+            for kind in (device_kind(device),) * device.port_num
+        ]
+    )
+    partners = array(
+        "q",
+        [
+            port + 1 - 2 * number if device.port_num == 2 else -1
+            for port, (device, number) in enumerate(
+                zip(
+                    (device for device in devices for _ in range(device.port_num)),
+                    port_numbers,
+                )
+            )
+        ],
+    )
+    return PortTables(
+        port_numbers,
+        kinds,
+        partners,
+        bytes(
+            kind == DeviceKind.DC_DC or (kind == DeviceKind.DIODE and number == 0)
+            for kind, number in zip(kinds, port_numbers)
+        ),
+        bytes(
+            kind == DeviceKind.DIODE and number == 1
+            for kind, number in zip(kinds, port_numbers)
+        ),
+        tuple(
+            port for port, kind in enumerate(kinds) if kind == DeviceKind.POWER_SUPPLY
+        ),
+        tuple(
+            port
+            for port, kind in enumerate(kinds)
+            if kind == DeviceKind.SWITCH and port_numbers[port] == 0
+        ),
+    )
+
+
+class ScenarioResult(NamedTuple):
+    """result of a scenario, either `forest` or `charge` is None"""
+
+    forest: AbstractPowerSupplySystemForest | None
+    charge: ChargePowerSupply | None
+
+
+class CompiledGraph:
+    """
+    A frozen, integer indexed form of `AbstractPowerSupplySystemGraph`.
+
+    Ports are numbered in the order they were added to the graph, the ports of
+    a device are always consecutive. The adjacency is stored CSR style: the
+    neighbors of port `i` are `neighbors[offsets[i]:offsets[i + 1]]`, and
+    `extras` is aligned with `neighbors`.
+
+    Port ids (`"<device>.<index>"`) are only built once here, on first use,
+    the traversals work on integers and convert back to names at the API
+    boundary.
+
+    Attributes:
+        devices (tuple[DeviceType, ...]): devices in insertion order
+        port_devices (tuple[DeviceType, ...]): device of each port
+        port_numbers (array): index of each port in its device
+        port_ids (tuple[str, ...]): id of each port
+        port_lookup (dict[tuple[str, int], int]): (device name, index) to port,
+            a ThinPort could be used as key directly
+        kinds (bytes): DeviceKind of each port
+        offsets (array | memoryview): CSR offsets, of length `len(port_ids) + 1`
+        neighbors (array | memoryview): CSR neighbors
+        extras (list[Any]): extras of each edge in `neighbors`
+        partners (array): the other port of a two-ported device, -1 if none
+        roots (tuple[int, ...]): ports of power supplies
+        switch_ports (tuple[int, ...]): the first port of each switch
+        switch_lookup (dict[str, int]): name of switch to its first port
+    """
+
+    devices: tuple[DeviceType, ...]
+    port_numbers: array
+    kinds: bytes
+    offsets: array | memoryview
+    neighbors: array | memoryview
+    extras: list[Any]
+    partners: array
+    roots: tuple[int, ...]
+    switch_ports: tuple[int, ...]
+    # DcDc ports and anodes(port 0) of diodes are always linked to their partner
+    base_links: bytes
+    # cathodes(port 1) of diodes could only be entered from a diode
+    cathodes: bytes
+
+    def __init__(
+        self,
+        devices: Iterable[DeviceType],
+        offsets: Sequence[int],
+        neighbors: Sequence[int],
+        extras: Sequence[Any],
+        tables: PortTables | None = None,
+    ) -> None:
+        """
+        Args:
+            devices: devices, their ports are numbered consecutively in order
+            offsets: CSR offsets, an array or a memoryview of int64 is used
+                as is, other sequences are copied
+            neighbors: CSR neighbors, as `offsets`
+            extras: extras of each edge in `neighbors`
+            tables: the tables of `port_tables(devices)`, e.g. saved in a
+                snapshot, they are trusted. Defaults to None, derived from the
+                devices.
+        """
+        self.devices = tuple(devices)
+        (
+            self.port_numbers,
+            self.kinds,
+            self.partners,
+            self.base_links,
+            self.cathodes,
+            self.roots,
+            self.switch_ports,
+        ) = tables or port_tables(self.devices)
+
+        self.offsets = int64s(offsets)
+        self.neighbors = int64s(neighbors)
+        self.extras = list(extras)
+        if len(self.offsets) != len(self.kinds) + 1 or len(self.neighbors) != len(
+            self.extras
+        ):
+            raise ValueError("adjacency doesn't match the ports of devices")
+
+    # the lookups by name are only built on first use, e.g. not to load a
+    # snapshot
+
+    @cached_property
+    def device_lookup(self) -> dict[str, int]:
+        return {device.name: i for i, device in enumerate(self.devices)}
+
+    @cached_property
+    def port_devices(self) -> tuple[DeviceType, ...]:
+        return tuple(device for device in self.devices for _ in range(device.port_num))
+
+    @cached_property
+    def port_ids(self) -> tuple[str, ...]:
+        return tuple(
+            [
+                f"{device.name}.{number}"
+                for device, number in zip(self.port_devices, self.port_numbers)
+            ]
+        )
+
+    @cached_property
+    def port_lookup(self) -> dict[tuple[str, int], int]:
+        return dict(
+            zip(
+                zip([device.name for device in self.port_devices], self.port_numbers),
+                range(len(self.kinds)),
+            )
+        )
+
+    @cached_property
+    def switch_lookup(self) -> dict[str, int]:
+        return {self.port_devices[port].name: port for port in self.switch_ports}
+
+    @classmethod
+    def from_graph(cls, graph: "AbstractPowerSupplySystemGraph") -> "CompiledGraph":
+        # the ports of graph are keyed by id, and inserted device by device
+        port_lookup = {port_id: i for i, port_id in enumerate(graph.ports)}
+        offsets = array("q", [0])
+        neighbors = array("q")
+        extras_: list[Any] = []
+        for port in graph.ports.values():
+            for neighbor, extras in port.adj_list:
+                neighbors.append(port_lookup[neighbor.id])
+                extras_.append(extras)
+            offsets.append(len(neighbors))
+        return cls(graph.devices.values(), offsets, neighbors, extras_)
+
+    def __reduce__(self):
+        # only the topology is pickled, the rest is derived from it, memoryviews
+        # (e.g. on a snapshot) can't be pickled, they are copied into arrays
+        return (
+            type(self),
+            (
+                self.devices,
+                array("q", self.offsets),
+                array("q", self.neighbors),
+                self.extras,
+            ),
+        )
+
+    def links(self, truth_table: dict[str, bool] | None = None) -> bytearray:
+        """get the ports linked to their partner under the given truth table
+
+        Args:
+            truth_table (dict[str, bool] | None, optional): switch states, the
+                switches not in it use their own state. Defaults to None.
+
+        Returns:
+            bytearray: for each port, whether it is linked to its partner
+
+        Throws:
+            NoSuchDevice: if a device in truth table doesn't exist
+        """
+        links = self.default_links()
+        if truth_table:
+            self.validate_names(truth_table)
+            self.apply(links, truth_table)
+        return links
+
+    def state_key(self, links: bytearray) -> bytes:
+        """the effective switch states of `links`, one byte per switch"""
+        return bytes(map(links.__getitem__, self.switch_ports))
+
+    def default_links(self) -> bytearray:
+        """get the linked ports with the current states of switches"""
+        links = bytearray(self.base_links)
+        port_devices = self.port_devices
+        for port in self.switch_ports:
+            if port_devices[port].on:  # type: ignore
+                links[port] = links[port + 1] = 1
+        return links
+
+    def validate_names(self, truth_table: dict[str, bool]) -> None:
+        """
+        Throws:
+            NoSuchDevice: if a device in truth table doesn't exist
+        """
+        device_lookup = self.device_lookup
+        for name in truth_table:
+            if name not in device_lookup:
+                raise NoSuchDevice(name)
+
+    def apply(self, links: bytearray, truth_table: dict[str, bool]) -> None:
+        """set the switch states of truth table to `links` in place, the devices
+        other than switches are ignored"""
+        switch_lookup = self.switch_lookup
+        for name, on in truth_table.items():
+            port = switch_lookup.get(name)
+            if port is not None:
+                links[port] = links[port + 1] = bool(on)
+
+    def iter_links(
+        self,
+        scenarios: Iterable[dict[str, bool]] | Iterable[Sequence[bool]],
+        switches: Sequence[str] | None = None,
+        defaults: bytearray | None = None,
+    ) -> Iterator[bytearray]:
+        """get the linked ports of each scenario
+
+        The states of switches are read once, before the first scenario.
+
+        Args:
+            scenarios: truth tables, or rows of switch states if `switches`
+                is given
+            switches (Sequence[str] | None, optional): the switches of each
+                column of rows. Defaults to None.
+            defaults (bytearray | None, optional): the linked ports before
+                applying scenarios. Defaults to `default_links()`.
+
+        Throws:
+            NoSuchDevice: if a device in truth table or switches doesn't exist
+        """
+        if defaults is None:
+            defaults = self.default_links()
+        if switches is None:
+            for truth_table in scenarios:
+                links = bytearray(defaults)
+                if truth_table:
+                    self.validate_names(truth_table)  # type: ignore
+                    self.apply(links, truth_table)  # type: ignore
+                yield links
+            return
+
+        self.validate_names(dict.fromkeys(switches))
+        columns = [self.switch_lookup.get(name) for name in switches]
+        for row in scenarios:
+            if len(row) != len(columns):
+                raise ValueError(f"expect {len(columns)} switch states, got {len(row)}")
+            links = bytearray(defaults)
+            for port, on in zip(columns, row):
+                if port is not None:
+                    links[port] = links[port + 1] = bool(on)
+            yield links
+
+    def lookup(self, port: ThinPort | tuple[str, int]) -> int | None:
+        """get the index of a port, None if it doesn't exist"""
+        return self.port_lookup.get(tuple(port))  # type: ignore
+
+    def gen_forest(
+        self,
+        truth_table: dict[str, bool] | None = None,
+        stats: SearchStats | None = None,
+    ) -> AbstractPowerSupplySystemForest:
+        """see `AbstractPowerSupplySystemGraph.gen_forest`"""
+        links = self.links(truth_table)
+        if not self.roots:
+            raise NoPowerSupplies()
+        return self.gen_forest_with(links, stats)
+
+    def gen_forest_with(
+        self, links: bytearray, stats: SearchStats | None = None
+    ) -> AbstractPowerSupplySystemForest:
+        """generate the forest with linked ports from `links`, `iter_links`
+
+        The roots are searched in one pass: each state (port, parent) of the
+        ports fed through diodes is labeled by the first tree growing it, and a
+        state labeled by a previous tree is copied from it instead of searched
+        again, so a region fed by several power supplies is searched once. The
+        subtree of a state doesn't depend on the root, and a copied one reached
+        no power supply, so ChargePowerSupply is raised as by searching each
+        root alone.
+
+        If `stats` is given, the search of each tree is added to it.
+        """
+        columns: list[tuple[array, array, list[Any]]] = []
+        grown: dict[int, tuple[int, int, int]] = {}
+        for root in self.roots:
+            device = self.port_devices[root]
+            if stats is None:
+                columns.append(self._grow(device, root, -1, links, grown, columns))
+                continue
+            tree = TreeStats(device.name)
+            stats.trees.append(tree)
+            start = perf_counter()
+            columns.append(self._grow(device, root, -1, links, grown, columns, tree))
+            tree.seconds = perf_counter() - start
+            stats.forest_bytes += sum(map(getsizeof, columns[-1]))
+        return AbstractPowerSupplySystemForest(
+            AbstractPowerSupplySystemTree(self, *tree) for tree in columns
+        )
+
+    def gen_forests(
+        self,
+        scenarios: Iterable[dict[str, bool]] | Iterable[Sequence[bool]],
+        switches: Sequence[str] | None = None,
+    ) -> list["ScenarioResult"]:
+        """see `AbstractPowerSupplySystemGraph.gen_forests`"""
+        if not self.roots:
+            raise NoPowerSupplies()
+        results: list[ScenarioResult] = []
+        for links in self.iter_links(scenarios, switches):
+            try:
+                forest = self.gen_forest_with(links)
+            except ChargePowerSupply as e:
+                results.append(ScenarioResult(None, e))
+            else:
+                results.append(ScenarioResult(forest, None))
+        return results
+
+    def _grow(
+        self,
+        root_device: DeviceType,
+        port: int,
+        parent: int,
+        links: bytearray,
+        grown: dict[int, tuple[int, int, int]] | None = None,
+        trees: Sequence[tuple[array, array, list[Any]]] = (),
+        stats: TreeStats | None = None,
+    ) -> tuple[array, array, list[Any]]:
+        """grow the subtree of `port`, which is entered from `parent`
+
+        Args:
+            grown (dict[int, tuple[int, int, int]] | None, optional): if
+                given, the first (tree, node, end of subtree or -1 until
+                copied) of each state of `_diode_fed` ports grown in `trees`, a
+                state grown in another tree is copied from it, and the new
+                states are added, as the next tree. Defaults to None.
+            trees (Sequence[tuple[array, array, list[Any]]], optional): the
+                columns of the trees grown before. Defaults to ().
+            stats (TreeStats | None, optional): if given, the search is counted
+                into it. Defaults to None.
+
+        Returns:
+            tuple[array, array, list[Any]]: ports, parents and extras of the
+                subtree, as `AbstractPowerSupplySystemTree`
+
+        Throws:
+            ChargePowerSupply: if another power supply is reached
+        """
+        port_devices = self.port_devices
+        kinds = self.kinds
+        offsets = self.offsets
+        neighbors = self.neighbors
+        extras_ = self.extras
+        partners = self.partners
+        cathodes = self.cathodes
+        power_supply = DeviceKind.POWER_SUPPLY
+        diode = DeviceKind.DIODE
+
+        diode_fed = self._diode_fed if grown is not None else None
+        tree = len(trees)
+        n = len(kinds)
+
+        ports = array("q")
+        parents = array("q")
+        extras_column: list[Any] = []
+        # the (begin, end) nodes of the copied subtrees, for `stats`
+        copies: list[tuple[int, int]] = []
+        # (port, parent node, parent port, extras)
+        stack: list[tuple[int, int, int, Any]] = [(port, -1, parent, None)]
+        while stack:
+            port, parent_node, parent, extras = stack.pop()
+            node = len(ports)
+            if diode_fed is not None and diode_fed[port]:
+                key = port * (n + 1) + parent + 1
+                first = grown.get(key)  # type: ignore
+                if first is None:
+                    grown[key] = (tree, node, -1)  # type: ignore
+                elif first[0] != tree:
+                    src, begin, end = first
+                    src_ports, src_parents, src_extras = trees[src]
+                    if end == -1:
+                        end = _subtree_end(src_parents, begin)
+                        grown[key] = (src, begin, end)  # type: ignore
+                    ports.extend(src_ports[begin:end])
+                    parents.append(parent_node)
+                    parents.extend(
+                        map((node - begin).__add__, src_parents[begin + 1 : end])
+                    )
+                    extras_column.append(extras)
+                    extras_column.extend(src_extras[begin + 1 : end])
+                    if stats is not None:
+                        copies.append((node, node + end - begin))
+                    continue
+            ports.append(port)
+            parents.append(parent_node)
+            extras_column.append(extras)
+            begin, end = offsets[port], offsets[port + 1]
+            adj_list = list(zip(neighbors[begin:end], extras_[begin:end]))
+            # closed switch, dc/dc and anode of diode are linked to the other port
+            if links[port]:
+                adj_list.append((partners[port], None))
+            from_diode = kinds[port] == diode
+            for child, extras in adj_list:
+                if child == parent:
+                    continue
+                if kinds[child] == power_supply:
+                    raise ChargePowerSupply(root_device, port_devices[child])  # type: ignore
+                # cathode of diode is only reachable from the anode
+                if not from_diode and cathodes[child]:
+                    if stats is not None:
+                        stats.diode_cutoffs += 1
+                    continue
+                stack.append((child, node, port, extras))
+        if stats is not None:
+            copies.append((len(ports), len(ports)))
+            node = 0
+            for begin, end in copies:
+                stats.searched += begin - node
+                stats.edges += self._degrees(ports[node:begin], links)
+                node = end
+            stats.ports += len(ports)
+        return ports, parents, extras_column
+
+    def _degrees(self, ports: Iterable[int], links: bytearray) -> int:
+        """the number of ports adjacent to `ports` with `links`"""
+        offsets = self.offsets
+        return sum(offsets[port + 1] - offsets[port] + links[port] for port in ports)
+
+    def gen_dag(
+        self, truth_table: dict[str, bool] | None = None
+    ) -> AbstractPowerSupplySystemDag:
+        """see `AbstractPowerSupplySystemGraph.gen_dag`"""
+        links = self.links(truth_table)
+        if not self.roots:
+            raise NoPowerSupplies()
+        port_devices = self.port_devices
+        kinds = self.kinds
+        offsets = self.offsets
+        neighbors = self.neighbors
+        extras_ = self.extras
+        partners = self.partners
+        cathodes = self.cathodes
+        power_supply = DeviceKind.POWER_SUPPLY
+        diode = DeviceKind.DIODE
+        n = len(kinds)
+
+        ports = array("q")
+        reached = bytearray(n)
+        edge_parents = array("q")
+        edge_children = array("q")
+        edge_extras: list[Any] = []
+        # the children of a port only depend on where it is entered from, so
+        # each (port, parent) is expanded once, for all the roots: the parent a
+        # port is first expanded from, -2 until then, and whether it's expanded
+        # again from another parent, which only adds the edge back to the first
+        # one, any further expansion adds nothing
+        first_parents = array("q", [-2]) * n
+        expanded_again = bytearray(n)
+        for root in self.roots:
+            root_device = port_devices[root]
+            ports.append(root)
+            reached[root] = 1
+            stack: list[tuple[int, int]] = [(root, -1)]
+            while stack:
+                # parent is -1 for the root
+                port, parent = stack.pop()
+                first = first_parents[port]
+                if first == -2:
+                    first_parents[port] = parent
+                elif first == parent or expanded_again[port]:
+                    continue
+                else:
+                    expanded_again[port] = 1
+                begin, end = offsets[port], offsets[port + 1]
+                adj_list = list(zip(neighbors[begin:end], extras_[begin:end]))
+                if links[port]:
+                    adj_list.append((partners[port], None))
+                from_diode = kinds[port] == diode
+                for child, extras in adj_list:
+                    if child == parent:
+                        continue
+                    if kinds[child] == power_supply:
+                        raise ChargePowerSupply(root_device, port_devices[child])  # type: ignore
+                    if not from_diode and cathodes[child]:
+                        continue
+                    if first != -2 and child != first:
+                        continue
+                    edge_parents.append(port)
+                    edge_children.append(child)
+                    edge_extras.append(extras)
+                    if not reached[child]:
+                        reached[child] = 1
+                        ports.append(child)
+                    first_child = first_parents[child]
+                    if first_child == -2 or (
+                        first_child != port and not expanded_again[child]
+                    ):
+                        stack.append((child, port))
+        dag = AbstractPowerSupplySystemDag(
+            self, ports, edge_parents, edge_children, edge_extras
+        )
+        # known already, instead of from the ports on first use
+        dag.reached = reached
+        return dag
+
+    @cached_property
+    def walk_adjacency(self) -> tuple[list[tuple[int, ...]], bytearray]:
+        """for each port, the neighbors a search could step to, i.e. without
+        power supplies, and without cathodes unless the port is a diode, and
+        whether the port has a power supply as neighbor, shared by the
+        searches of `apssm.energize`, `apssm.dominators` and `apssm.conflicts`"""
+        kinds = self.kinds
+        offsets = self.offsets
+        neighbors = self.neighbors
+        cathodes = self.cathodes
+        power_supply = DeviceKind.POWER_SUPPLY
+        diode = DeviceKind.DIODE
+        walk: list[tuple[int, ...]] = []
+        next_to_power_supply = bytearray(len(kinds))
+        for port, kind in enumerate(kinds):
+            adjacency = neighbors[offsets[port] : offsets[port + 1]]
+            walk.append(
+                tuple(
+                    child
+                    for child in adjacency
+                    if kinds[child] != power_supply
+                    and (kind == diode or not cathodes[child])
+                )
+            )
+            next_to_power_supply[port] = any(
+                kinds[child] == power_supply for child in adjacency
+            )
+        return walk, next_to_power_supply
+
+    @cached_property
+    def _diode_fed(self) -> bytearray:
+        """whether a search could reach each port through a cathode of diode,
+        with all the switches closed
+
+        Without ChargePowerSupply, the trees of two power supplies could only
+        share the ports fed through diodes, any other port reached by both
+        would link them.
+        """
+        kinds = self.kinds
+        partners = self.partners
+        cathodes = self.cathodes
+        base_links = self.base_links
+        diode = DeviceKind.DIODE
+        walk, _ = self.walk_adjacency
+        fed = bytearray(cathodes)
+        stack = [port for port, cathode in enumerate(cathodes) if cathode]
+        while stack:
+            port = stack.pop()
+            children = list(walk[port])
+            child = partners[port]
+            if (
+                child != -1
+                and (base_links[port] or kinds[port] == DeviceKind.SWITCH)
+                and (kinds[port] == diode or not cathodes[child])
+            ):
+                children.append(child)
+            for child in children:
+                if not fed[child]:
+                    fed[child] = 1
+                    stack.append(child)
+        return fed
+
+    @cached_property
+    def conflicts(self) -> "Conflicts":
+        """the power supplies each root charges, for all the states of
+        switches, see `apssm.conflicts.Conflicts`"""
+        # apssm.conflicts works on the compiled graph, it imports this module
+        from apssm.conflicts import Conflicts
+
+        return Conflicts(self)
+
+    def update_forest(
+        self,
+        forest: tuple[AbstractPowerSupplySystemTree, ...],
+        delta: dict[str, bool],
+        truth_table: dict[str, bool] | None = None,
+    ) -> AbstractPowerSupplySystemForest:
+        """see `AbstractPowerSupplySystemGraph.update_forest`
+
+        The links are read port by port, and the occurrences of the toggled
+        ports are found by scanning the port column, so the work in Python is
+        bounded by the subtrees cut and grown, not by the graph or the trees.
+        """
+        merged = {**(truth_table or {}), **delta}
+        self.validate_names(merged)
+        links = _SwitchLinks(self, merged)
+        partners = self.partners
+        offsets = self.offsets
+        neighbors = self.neighbors
+        switch_ports = [
+            self.switch_lookup[name] for name in delta if name in self.switch_lookup
+        ]
+        # a switch shorted by an edge between its own ports has its partner as a
+        # neighbor too, which the link can't be told from, so the subtrees of
+        # its ports are grown again instead
+        shorted = {
+            port
+            for port in switch_ports
+            if port + 1 in neighbors[offsets[port] : offsets[port + 1]]
+        }
+
+        updated: list[AbstractPowerSupplySystemTree] = []
+        for tree in forest:
+            ports, parents = tree.ports, tree.parents
+            size = len(ports)
+            cuts: list[tuple[int, int]] = []
+            # (node, whether the node itself is grown again, or its link)
+            grows: list[tuple[int, bool]] = []
+            for switch_port in switch_ports:
+                for port in (switch_port, switch_port + 1):
+                    if switch_port in shorted:
+                        for node in _occurrences(ports, port):
+                            cuts.append((node, _subtree_end(parents, node)))
+                            grows.append((node, True))
+                        continue
+                    other = partners[port]
+                    for node in _occurrences(ports, port):
+                        # the link is found last, so its child is visited first
+                        child = node + 1
+                        linked = child < size and (
+                            ports[child] == other and parents[child] == node
+                        )
+                        if not links[port]:
+                            if linked:
+                                cuts.append((child, _subtree_end(parents, child)))
+                        elif not linked and not (
+                            node and ports[parents[node]] == other
+                        ):
+                            grows.append((node, False))
+            if not cuts and not grows:
+                updated.append(tree)
+                continue
+
+            # nodes are in visiting order, grow in the order a full rebuild
+            # would visit them, so the same ChargePowerSupply is raised
+            grows.sort()
+            root_device = self.port_devices[ports[0]]
+            inserts: list[tuple[int, int, tuple[array, array, list[Any]], Any]] = []
+            for node, again in grows:
+                # a node inside a cut is gone, or grown again with an ancestor
+                if any(
+                    begin <= node < end and not (again and begin == node)
+                    for begin, end in cuts
+                ):
+                    continue
+                if again:
+                    parent = parents[node]
+                    inserts.append(
+                        (
+                            node,
+                            parent,
+                            self._grow(root_device, ports[node], ports[parent], links),
+                            tree.extras[node],
+                        )
+                    )
+                else:
+                    port = ports[node]
+                    inserts.append(
+                        (
+                            node + 1,
+                            node,
+                            self._grow(root_device, partners[port], port, links),
+                            # the link inside a device has no extras
+                            None,
+                        )
+                    )
+            updated.append(
+                AbstractPowerSupplySystemTree(
+                    self,
+                    *_splice(tree, cuts, inserts),  # type: ignore
+                )
+            )
+        return AbstractPowerSupplySystemForest(updated)
+
+    def find_passages_backward(
+        self,
+        destinations: Iterable[tuple[str, int] | ThinPort],
+        truth_table: dict[str, bool] | None = None,
+        stats: SearchStats | None = None,
+    ) -> dict[str, list[tuple[ThinPort, ...]]]:
+        """see `AbstractPowerSupplySystemGraph.find_passages`, the searches
+        are added to `stats` if it's given
+
+        This isn't a search from the destinations to the power supplies: the
+        backward pass only marks the ports that could feed a destination, and
+        the passages are then searched forward from each root reached, as
+        `_grow` does, skipping the other ports. The passages of a forest are
+        the last ones its depth-first search finds, which a search from the
+        destinations can't tell, so it is only used to prune the forward one.
+        """
+        links = self.links(truth_table)
+        if not self.roots:
+            raise NoPowerSupplies()
+        kinds = self.kinds
+        offsets = self.offsets
+        neighbors = self.neighbors
+        partners = self.partners
+        cathodes = self.cathodes
+        power_supply = DeviceKind.POWER_SUPPLY
+        diode = DeviceKind.DIODE
+
+        targets = [port for port in map(self.lookup, destinations) if port is not None]
+        is_target = bytearray(len(kinds))
+        # the ports that could reach a destination, the visited state is shared
+        # by all the destinations
+        relevant = bytearray(len(kinds))
+        stack: list[int] = []
+        for port in targets:
+            is_target[port] = 1
+            if not relevant[port]:
+                relevant[port] = 1
+                stack.append(port)
+        while stack:
+            port = stack.pop()
+            # a power supply only feeds, the search stops here
+            if kinds[port] == power_supply:
+                continue
+            feeders = list(neighbors[offsets[port] : offsets[port + 1]])
+            if (partner := partners[port]) >= 0 and links[partner]:
+                feeders.append(partner)
+            is_cathode = cathodes[port]
+            for feeder in feeders:
+                # cathode of diode is only reachable from a diode
+                if relevant[feeder] or (is_cathode and kinds[feeder] != diode):
+                    continue
+                relevant[feeder] = 1
+                stack.append(feeder)
+
+        # then search forward from the reached roots, only inside the relevant
+        # ports, so passages are the same as the full forest's
+        found: list[dict[int, tuple[ThinPort, ...]]] = []
+        if stats is not None:
+            stats.backward_ports = relevant.count(1)
+        for root in self.roots:
+            if not relevant[root]:
+                continue
+            if stats is None:
+                found.append(self._relevant_passages(root, links, relevant, is_target))
+                continue
+            tree = TreeStats(self.port_devices[root].name)
+            stats.trees.append(tree)
+            start = perf_counter()
+            found.append(
+                self._relevant_passages(root, links, relevant, is_target, tree)
+            )
+            tree.seconds = perf_counter() - start
+
+        res: dict[str, list[tuple[ThinPort, ...]]] = {}
+        for port in targets:
+            for passages in found:
+                if passage := passages.get(port):
+                    res.setdefault(self.port_ids[port], []).append(passage)
+        return res
+
+    def _relevant_passages(
+        self,
+        root: int,
+        links: bytearray,
+        relevant: bytearray,
+        is_target: bytearray,
+        stats: TreeStats | None = None,
+    ) -> dict[int, tuple[ThinPort, ...]]:
+        """search as `_grow` from `root`, but skip the irrelevant ports, the
+        search is counted into `stats` if it's given
+
+        Returns:
+            dict[int, tuple[ThinPort, ...]]: target port to its passage
+
+        Throws:
+            ChargePowerSupply: if a power supply is reached, or if the search
+                enters a loop, see `_charged_by_loop`
+        """
+        port_devices = self.port_devices
+        port_numbers = self.port_numbers
+        kinds = self.kinds
+        offsets = self.offsets
+        neighbors = self.neighbors
+        partners = self.partners
+        cathodes = self.cathodes
+        power_supply = DeviceKind.POWER_SUPPLY
+        diode = DeviceKind.DIODE
+
+        root_device = port_devices[root]
+        n = len(kinds)
+        # node is (port, parent node)
+        nodes: list[tuple[int, int]] = []
+        # the last visited node of each target, as `nodes` of a tree
+        found: dict[int, int] = {}
+        # the nodes from the root to the current one with their (port, parent)
+        # states, a state entered again below itself is a loop
+        branch: list[tuple[int, int]] = []
+        on_branch: set[int] = set()
+        stack: list[tuple[int, int]] = [(root, -1)]
+        while stack:
+            port, parent_node = stack.pop()
+            while branch and branch[-1][0] != parent_node:
+                on_branch.discard(branch.pop()[1])
+            parent = nodes[parent_node][0] if parent_node >= 0 else -1
+            state = port * (n + 1) + parent + 1
+            if state in on_branch:
+                raise self._charged_by_loop(root, links)
+            node = len(nodes)
+            nodes.append((port, parent_node))
+            branch.append((node, state))
+            on_branch.add(state)
+            if is_target[port]:
+                found[port] = node
+            children = list(neighbors[offsets[port] : offsets[port + 1]])
+            if links[port]:
+                children.append(partners[port])
+            from_diode = kinds[port] == diode
+            for child in children:
+                if child == parent:
+                    continue
+                if kinds[child] == power_supply:
+                    raise ChargePowerSupply(root_device, port_devices[child])  # type: ignore
+                if not from_diode and cathodes[child]:
+                    if stats is not None:
+                        stats.diode_cutoffs += 1
+                    continue
+                if relevant[child]:
+                    stack.append((child, node))
+        if stats is not None:
+            stats.ports = stats.searched = len(nodes)
+            stats.edges = self._degrees((port for port, _ in nodes), links)
+
+        passages: dict[int, tuple[ThinPort, ...]] = {}
+        for target, node in found.items():
+            path: list[ThinPort] = []
+            while node >= 0:
+                port, node = nodes[node]
+                path.append(ThinPort(port_devices[port].name, port_numbers[port]))
+            passages[target] = tuple(reversed(path))
+        return passages
+
+    def _charged_by_loop(self, root: int, links: bytearray) -> ChargePowerSupply:
+        """the error of a search from `root` entering a loop
+
+        The tree is then endless, and holds every (port, parent) the loop
+        reaches, so it charges a power supply iff `apssm.energize.energize`
+        reaches one, else the root charges itself through the loop, as in
+        `Conflicts.validate`.
+        """
+        # apssm.energize works on the compiled graph, it imports this module
+        from apssm.energize import energize
+
+        root_device = self.port_devices[root]
+        try:
+            energize(self, root, links)
+        except ChargePowerSupply as e:
+            return e
+        return ChargePowerSupply(root_device, root_device)  # type: ignore
+
+    def passages(
+        self,
+        forest: tuple[AbstractPowerSupplySystemTree, ...],
+        destinations: Iterable[tuple[str, int] | ThinPort],
+    ) -> dict[str, list[tuple[ThinPort, ...]]]:
+        """find the passages to the given ports in a generated forest"""
+        if not isinstance(forest, AbstractPowerSupplySystemForest):
+            forest = AbstractPowerSupplySystemForest(forest)
+        index = forest.index
+        res: dict[str, list[tuple[ThinPort, ...]]] = {}
+        for to in destinations:
+            port = self.lookup(to)
+            if port is None:
+                continue
+            if nodes := index.get(port):
+                res.setdefault(self.port_ids[port], []).extend(
+                    tree.passage(node) for tree, node in nodes
+                )
+        return res
+
+
+class _SwitchLinks:
+    """the links of `CompiledGraph.links`, read port by port, for a search
+    touching a few ports only"""
+
+    __slots__ = ("base_links", "kinds", "port_devices", "truth_table")
+
+    def __init__(self, compiled: CompiledGraph, truth_table: dict[str, bool]):
+        self.base_links = compiled.base_links
+        self.port_devices = compiled.port_devices
+        self.kinds = compiled.kinds
+        self.truth_table = truth_table
+
+    def __getitem__(self, port: int) -> int:
+        if self.kinds[port] != DeviceKind.SWITCH:
+            return self.base_links[port]
+        device = self.port_devices[port]
+        return int(bool(self.truth_table.get(device.name, device.on)))  # type: ignore
+
+
+def _occurrences(ports: Sequence[int], port: int) -> list[int]:
+    """all the nodes of `port` in a tree, the int64 column, an array or a
+    memoryview, is searched as bytes"""
+    if not isinstance(ports, (array, memoryview)):
+        return [node for node, port_ in enumerate(ports) if port_ == port]
+    data = ports.tobytes()
+    pattern = array("q", [port]).tobytes()
+    nodes: list[int] = []
+    i = data.find(pattern)
+    while i != -1:
+        # a match across two items isn't a node
+        if i % 8 == 0:
+            nodes.append(i // 8)
+            i = data.find(pattern, i + 8)
+        else:
+            i = data.find(pattern, i + 1)
+    return nodes
+
+
+def _subtree_end(parents: Sequence[int], node: int) -> int:
+    """the end of the subtree of `node`, which starts at `node`"""
+    end = node + 1
+    while end < len(parents) and parents[end] >= node:
+        end += 1
+    return end
+
+
+def _splice(
+    tree: AbstractPowerSupplySystemTree,
+    cuts: list[tuple[int, int]],
+    inserts: list[tuple[int, int, tuple[array, array, list[Any]], Any]],
+) -> tuple[array, array, list[Any]]:
+    """remove and insert subtrees to the columns of a tree
+
+    The nodes before the first edit are copied as they are, the others are
+    copied by slices, and their parents are mapped to the new nodes in bulk.
+
+    Args:
+        tree (AbstractPowerSupplySystemTree): the tree
+        cuts (list[tuple[int, int]]): ranges of nodes to remove
+        inserts (list[tuple[int, int, tuple[array, array, list[Any]], Any]]):
+            for each subtree, the node to insert before, its parent node, its
+            columns as returned by `CompiledGraph._grow`, and the extras of its
+            root
+
+    Returns:
+        tuple[array, array, list[Any]]: ports, parents and extras
+    """
+    old_ports, old_parents, old_extras = tree.ports, tree.parents, tree.extras
+    # a subtree is inserted before removing nodes at the same place
+    edits = sorted(
+        [(begin, 1, end, None, None) for begin, end in cuts]
+        + [
+            (before, 0, parent, columns, extras)
+            for before, parent, columns, extras in inserts
+        ],
+        key=lambda edit: edit[:2],
+    )
+    first = edits[0][0] if edits else len(old_ports)
+    ports = array("q", old_ports[:first])
+    parents = array("q", old_parents[:first])
+    extras = list(old_extras[:first])
+    # new node of each old node, the nodes before the first edit don't move
+    remap = array("q", range(len(old_ports)))
+
+    def copy(begin: int, end: int) -> None:
+        if begin >= end:
+            return
+        base = len(ports)
+        if base != begin:
+            remap[begin:end] = array("q", range(base, base + end - begin))
+        ports.extend(old_ports[begin:end])
+        parents.extend(map(remap.__getitem__, old_parents[begin:end]))
+        extras.extend(old_extras[begin:end])
+
+    copied = first
+    for at, is_cut, arg, columns, root_extras in edits:
+        copy(copied, at)
+        if is_cut:
+            copied = max(copied, arg, at)
+            continue
+        copied = max(copied, at)
+        sub_ports, sub_parents, sub_extras = columns  # type: ignore
+        base = len(ports)
+        ports.extend(sub_ports)
+        parents.append(remap[arg])
+        parents.extend(map(base.__add__, sub_parents[1:]))
+        extras.append(root_extras)
+        extras.extend(sub_extras[1:])
+    copy(copied, len(old_ports))
+    return ports, parents, extras
@@ -0,0 +1,331 @@
+from array import array
+from functools import cached_property
+from heapq import heappop, heappush
+
+from apssm.compiled import CompiledGraph, DeviceKind
+from apssm.exceptions import TooManyConflictSets
+
+
+class Conflicts:
+    """
+    The power supplies charged by each power supply of a compiled graph, for
+    all the states of switches.
+
+    The tables are computed on first use, and kept as long as the compiled
+    graph, see `CompiledGraph.conflicts`.
+
+    Attributes:
+        compiled (CompiledGraph): the graph
+        budget (int): the search steps of `masks` before giving up
+    """
+
+    compiled: CompiledGraph
+    budget: int = 1_000_000
+
+    def __init__(self, compiled: CompiledGraph) -> None:
+        self.compiled = compiled
+
+    @cached_property
+    def core(self) -> bytearray:
+        """whether each port could be on a search from a root to a power
+        supply, i.e. isn't in a branch hanging off the rest of the graph
+
+        The ports other than power supplies with a single neighbor, edges and
+        links of two-ported devices counted, are removed until none is left: a
+        search entering a hanging branch never leaves it, as it doesn't step
+        back to the port it comes from.
+        """
+        compiled = self.compiled
+        kinds = compiled.kinds
+        offsets = compiled.offsets
+        neighbors = compiled.neighbors
+        partners = compiled.partners
+        power_supply = DeviceKind.POWER_SUPPLY
+        n = len(kinds)
+        degrees = [
+            offsets[port + 1] - offsets[port] + (partners[port] != -1)
+            for port in range(n)
+        ]
+        core = bytearray(b"\x01") * n
+        stack = [
+            port
+            for port in range(n)
+            if degrees[port] <= 1 and kinds[port] != power_supply
+        ]
+        while stack:
+            port = stack.pop()
+            if not core[port]:
+                continue
+            core[port] = 0
+            others = list(neighbors[offsets[port] : offsets[port + 1]])
+            if partners[port] != -1:
+                others.append(partners[port])
+            for other in others:
+                if core[other]:
+                    degrees[other] -= 1
+                    if degrees[other] <= 1 and kinds[other] != power_supply:
+                        stack.append(other)
+        return core
+
+    @property
+    def masks(self) -> dict[tuple[int, int], list[int]]:
+        """the minimal sets of switches whose closure makes each root charge a
+        power supply
+
+        Key is the root and the port of the power supply charged, in the order
+        of roots, value is the minimal sets, each a mask whose bit `j` is
+        `switch_ports[j]`. The dc/dcs and diodes are always linked, so a truth
+        table charges a power supply iff the switches closed include one of the
+        sets.
+
+        The search is the one of `apssm.energize.energize` for all states of
+        switches at once, on the ports of `core` only: each (port, parent)
+        reached keeps the minimal sets of switches crossed to reach it, and
+        passes them on, adding the switch of each link crossed. The sets of a
+        port only grow with the switches in parallel before it, so this is fast
+        for the radial systems, but exponential in the worst case, e.g. many tie
+        switches meshing the buses, so the search gives up after `budget` steps.
+
+        Throws:
+            TooManyConflictSets: if the search takes more than `budget` steps
+        """
+        masks = self._masks
+        if masks is None:
+            raise TooManyConflictSets(self.budget)
+        return masks
+
+    @cached_property
+    def _masks(self) -> dict[tuple[int, int], list[int]] | None:
+        """`masks`, None if the search is over budget"""
+        compiled = self.compiled
+        kinds = compiled.kinds
+        offsets = compiled.offsets
+        neighbors = compiled.neighbors
+        partners = compiled.partners
+        cathodes = compiled.cathodes
+        base_links = compiled.base_links
+        power_supply = DeviceKind.POWER_SUPPLY
+        diode = DeviceKind.DIODE
+        walk, next_to_power_supply = compiled.walk_adjacency
+        n = len(kinds)
+        switch_bits = {port: 1 << j for j, port in enumerate(compiled.switch_ports)}
+        core = self.core
+        walk = [tuple(child for child in children if core[child]) for children in walk]
+        budget = self.budget
+
+        res: dict[tuple[int, int], list[int]] = {}
+        for root in compiled.roots:
+            # minimal masks of each (port, parent) reached
+            reached: dict[int, list[int]] = {}
+            # the masks with fewer switches first, so a mask reaching a port is
+            # never a superset of one reaching it later
+            heap: list[tuple[int, int, int, int]] = [(0, root, -1, 0)]
+            while heap:
+                bits, port, parent, mask = heappop(heap)
+                masks = reached.setdefault(port * (n + 1) + parent + 1, [])
+                budget -= 1 + len(masks)
+                if budget < 0:
+                    return None
+                if any(other & ~mask == 0 for other in masks):
+                    continue
+                masks.append(mask)
+                if next_to_power_supply[port]:
+                    for child in neighbors[offsets[port] : offsets[port + 1]]:
+                        if child != parent and kinds[child] == power_supply:
+                            charged = res.setdefault((root, child), [])
+                            if not any(other & ~mask == 0 for other in charged):
+                                charged.append(mask)
+                for child in walk[port]:
+                    if child != parent:
+                        heappush(heap, (bits, child, port, mask))
+                child = partners[port]
+                if (
+                    child != -1
+                    and child != parent
+                    and core[child]
+                    and (kinds[port] == diode or not cathodes[child])
+                ):
+                    if base_links[port]:
+                        heappush(heap, (bits, child, port, mask))
+                    elif kinds[port] == DeviceKind.SWITCH:
+                        bit = switch_bits[min(port, child)]
+                        if not mask & bit:
+                            heappush(heap, (bits + 1, child, port, mask | bit))
+                        else:
+                            heappush(heap, (bits, child, port, mask))
+        return res
+
+    def find(self, links: bytearray) -> tuple[int, int] | None:
+        """the first root charging a power supply with linked ports from
+        `links` and the port of the power supply, by `masks`, or by `validate`
+        if they are over budget, None if no root does"""
+        masks_ = self._masks
+        if masks_ is None:
+            return self.validate(links)
+        closed = 0
+        for j, port in enumerate(self.compiled.switch_ports):
+            if links[port]:
+                closed |= 1 << j
+        for pair, masks in masks_.items():
+            if any(mask & ~closed == 0 for mask in masks):
+                return pair
+        return None
+
+    @cached_property
+    def components(self) -> tuple[array, bytearray, list[tuple[int, int, int]]]:
+        """the components of ports linked whatever the states of switches, i.e.
+        by edges and dc/dcs, except the cathodes of diodes, which are only
+        entered one way
+
+        Returns:
+            tuple[array, bytearray, list[tuple[int, int, int]]]: the component
+                of each port, -1 for cathodes, whether each component has a
+                loop, and (component, anode, cathode) of each step from an
+                anode into a cathode, by the diode or by an edge
+        """
+        compiled = self.compiled
+        kinds = compiled.kinds
+        offsets = compiled.offsets
+        neighbors = compiled.neighbors
+        partners = compiled.partners
+        cathodes = compiled.cathodes
+        n = len(kinds)
+        parent = list(range(n))
+        looped = bytearray(n)
+
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = x = parent[parent[x]]
+            return x
+
+        def union(a: int, b: int) -> None:
+            a, b = find(a), find(b)
+            if a == b:
+                looped[a] = 1
+            else:
+                parent[b] = a
+                looped[a] |= looped[b]
+
+        for port in range(n):
+            if cathodes[port]:
+                continue
+            for child in neighbors[offsets[port] : offsets[port + 1]]:
+                if port < child and not cathodes[child]:
+                    union(port, child)
+            # a dc/dc with an edge between its own ports isn't a loop, as the
+            # search doesn't step back to the port it comes from
+            if (
+                kinds[port] == DeviceKind.DC_DC
+                and port < partners[port]
+                and partners[port] not in neighbors[offsets[port] : offsets[port + 1]]
+            ):
+                union(port, partners[port])
+
+        labels = array("q", [-1]) * n
+        loops = bytearray()
+        compact: dict[int, int] = {}
+        for port in range(n):
+            if not cathodes[port]:
+                root = find(port)
+                if root not in compact:
+                    compact[root] = len(loops)
+                    loops.append(looped[root])
+                labels[port] = compact[root]
+
+        steps: list[tuple[int, int, int]] = []
+        for port in range(n):
+            if kinds[port] == DeviceKind.DIODE and not cathodes[port]:
+                steps.append((labels[port], port, partners[port]))
+                steps.extend(
+                    (labels[port], port, child)
+                    for child in neighbors[offsets[port] : offsets[port + 1]]
+                    if cathodes[child] and child != partners[port]
+                )
+        return labels, loops, steps
+
+    def validate(self, links: bytearray) -> tuple[int, int] | None:
+        """the first root charging a power supply with linked ports from
+        `links` and the port of a power supply it charges, None if no root does
+
+        The components of `components` are merged by the closed switches with
+        a union-find, a root charges the power supplies of the components it
+        reaches through diodes, and itself if its component has a loop, a
+        switch or a dc/dc with an edge between its own ports doesn't make one,
+        as in `gen_forest`. Only the cathodes are searched port by port, as a
+        cathode doesn't step back to the port it is entered from.
+        """
+        compiled = self.compiled
+        offsets = compiled.offsets
+        neighbors = compiled.neighbors
+        cathodes = compiled.cathodes
+        labels, loops, diode_steps = self.components
+        parent = list(range(len(loops)))
+        looped = bytearray(loops)
+
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = x = parent[parent[x]]
+            return x
+
+        for port in compiled.switch_ports:
+            # nor is a closed switch with an edge between its own ports
+            if (
+                links[port]
+                and port + 1 not in neighbors[offsets[port] : offsets[port + 1]]
+            ):
+                a, b = find(labels[port]), find(labels[port + 1])
+                if a == b:
+                    looped[a] = 1
+                else:
+                    parent[b] = a
+                    looped[a] |= looped[b]
+
+        supplies: dict[int, list[int]] = {}
+        for root in compiled.roots:
+            supplies.setdefault(find(labels[root]), []).append(root)
+        steps: dict[int, list[tuple[int, int]]] = {}
+        for label, anode, cathode in diode_steps:
+            steps.setdefault(find(label), []).append((anode, cathode))
+
+        for root in compiled.roots:
+            home = find(labels[root])
+            for other in supplies[home]:
+                if other != root:
+                    return root, other
+            if looped[home]:
+                return root, root
+            reached = {home}
+            components = [home]
+            # the port each cathode is first entered from, -1 once entered
+            # from two ports, as it could then step to all its neighbors
+            entered: dict[int, int] = {}
+            # (cathode, the port it is entered from)
+            stack: list[tuple[int, int]] = []
+            while components or stack:
+                if components:
+                    for anode, cathode in steps.get(components.pop(), ()):
+                        stack.append((cathode, anode))
+                    continue
+                cathode, from_ = stack.pop()
+                adjacency = neighbors[offsets[cathode] : offsets[cathode + 1]]
+                first = entered.get(cathode)
+                if first is None:
+                    entered[cathode] = from_
+                    children = [child for child in adjacency if child != from_]
+                elif first != -1 and first != from_:
+                    entered[cathode] = -1
+                    children = [first] if first in adjacency else []
+                else:
+                    continue
+                for child in children:
+                    if cathodes[child]:
+                        stack.append((child, cathode))
+                        continue
+                    component = find(labels[child])
+                    if component in supplies:
+                        # home is reached again from a diode
+                        return root, supplies[component][0]
+                    if component not in reached:
+                        reached.add(component)
+                        components.append(component)
+        return None
@@ -0,0 +1,246 @@
+from itertools import islice
+from typing import Iterator, NamedTuple, Sequence
+
+from apssm.compiled import CompiledGraph, DeviceKind
+from apssm.energize import energize
+from apssm.exceptions import NoPowerSupplies, NoSuchDevice
+from apssm.graph import AbstractPowerSupplySystemGraph
+from apssm.sweep import ChunkPool
+
+
+class ContingencyResult(NamedTuple):
+    """the loads losing power when the elements of a contingency fail"""
+
+    contingency: tuple[str, ...]
+    de_energized: list[str]
+
+
+class _Topology(NamedTuple):
+    compiled: CompiledGraph
+    links: bytearray
+    # the loads of each root under `links`
+    root_loads: tuple[tuple[int, ...], ...]
+    # the roots whose passages cross each element, and feed each load
+    element_roots: dict[int, tuple[int, ...]]
+    load_roots: dict[int, tuple[int, ...]]
+    # the loads of a root losing power and the elements still crossed from
+    # it, by the root and the failed elements it crosses, filled by each process
+    walks: dict[tuple[int, tuple[int, ...]], tuple[tuple[int, ...], frozenset[int]]]
+
+
+def _walk(
+    topology: _Topology, i: int, failed: tuple[int, ...]
+) -> tuple[tuple[int, ...], frozenset[int]]:
+    """the loads of root `i` losing power and the elements it still crosses"""
+    compiled, links, root_loads, element_roots = topology[:4]
+    saved = [(port, links[port], links[port + 1]) for port in failed]
+    for port in failed:
+        links[port] = links[port + 1] = 0
+    crossed: set[int] = set()
+    try:
+        energized = energize(compiled, compiled.roots[i], links, crossed)
+    finally:
+        for port, first, second in saved:
+            links[port] = first
+            links[port + 1] = second
+    return (
+        # failures only remove passages, the loads are those of the root
+        tuple(load for load in root_loads[i] if not energized[load]),
+        frozenset(port for port in crossed if port in element_roots),
+    )
+
+
+def _evaluate(
+    topology: _Topology, chunk: tuple[list[tuple[int, ...]], bool]
+) -> list[tuple[tuple[int, ...], list[int], frozenset[int] | None]]:
+    """each contingency, its de-energized loads and, if asked for, the elements
+    still crossed"""
+    element_roots, load_roots, walks = topology[3:]
+    contingencies_, with_crossed = chunk
+    results: list[tuple[tuple[int, ...], list[int], frozenset[int] | None]] = []
+    for contingency in contingencies_:
+        # only the trees of roots crossing a failed element change, and only
+        # by the failed elements they cross
+        changed = {i for port in contingency for i in element_roots[port]}
+        crossed: set[int] = set()
+        dead: dict[int, int] = {}
+        for i in changed:
+            failed = tuple(port for port in contingency if i in element_roots[port])
+            key = (i, failed)
+            walk = walks.get(key)
+            if walk is None:
+                walk = _walk(topology, i, failed)
+                # a walk is looked up again by the contingencies of the next size
+                if with_crossed or len(failed) < len(contingency):
+                    walks[key] = walk
+            for load in walk[0]:
+                dead[load] = dead.get(load, 0) + 1
+            if with_crossed:
+                crossed |= walk[1]
+        results.append(
+            (
+                contingency,
+                sorted(
+                    load
+                    for load, count in dead.items()
+                    if count == len(load_roots[load])
+                ),
+                (
+                    frozenset(
+                        element
+                        for element, roots in element_roots.items()
+                        if element in crossed or not changed.issuperset(roots)
+                    )
+                    if with_crossed
+                    else None
+                ),
+            )
+        )
+    return results
+
+
+def contingencies(
+    graph: AbstractPowerSupplySystemGraph | CompiledGraph,
+    truth_table: dict[str, bool] | None = None,
+    k: int = 2,
+    elements: Sequence[str] | None = None,
+    workers: int | None = None,
+    chunk_size: int = 64,
+) -> Iterator[ContingencyResult]:
+    """find the loads losing power for the failures of up to `k` elements
+
+    An element is a switch forced open or a dc/dc lost. Combinations are
+    enumerated by size, then in the order of `elements`, but a combination is
+    skipped if one of its elements is not on any energized passage once the
+    other elements have failed, e.g. an open switch, or a switch behind another
+    failed one, since it can't change the result: the loads losing power are
+    those of the combination without it.
+
+    Failures only remove passages, so each contingency only searches again the
+    trees of the power supplies whose passages cross a failed element, the other
+    trees are those of `truth_table`. A tree only depends on the failed elements
+    it crosses, so the searches of smaller contingencies are reused, e.g. a
+    double failure across two power supplies searches nothing. The
+    contingencies are evaluated by a pool of processes, started once for all
+    the sizes, see `apssm.sweep.ChunkPool`, and the results are yielded in
+    order as they are ready.
+
+    Args:
+        graph (AbstractPowerSupplySystemGraph | CompiledGraph): the graph
+        truth_table (dict[str, bool] | None, optional): the truth table for
+            switches. Defaults to None.
+        k (int, optional): the max number of failed elements. Defaults to 2.
+        elements (Sequence[str] | None, optional): names of the switches and
+            dc/dcs which could fail. Defaults to all of them.
+        workers (int | None, optional): number of processes, evaluate in the
+            current process if it is 1 or less. Defaults to the number of CPUs.
+        chunk_size (int, optional): number of contingencies sent to a worker at
+            a time. Defaults to 64.
+
+    Yields:
+        ContingencyResult: each contingency not skipped and the names of loads
+            losing power, in the order the loads were added
+
+    Throws:
+        NoSuchDevice: if a device in truth table or elements doesn't exist
+        ValueError: if an element is not a switch or dc/dc
+        NoPowerSupplies: if there are no power supplies
+        ChargePowerSupply: as `gen_forest(truth_table)` does
+    """
+    compiled = graph if isinstance(graph, CompiledGraph) else graph.compile()
+    links = compiled.links(truth_table)
+    if not compiled.roots:
+        raise NoPowerSupplies()
+    kinds = compiled.kinds
+    if elements is None:
+        ports = [
+            port
+            for port, kind in enumerate(kinds)
+            if kind in (DeviceKind.SWITCH, DeviceKind.DC_DC)
+            and compiled.port_numbers[port] == 0
+        ]
+    else:
+        ports = []
+        for name in elements:
+            if name not in compiled.device_lookup:
+                raise NoSuchDevice(name)
+            port = compiled.port_lookup[(name, 0)]
+            if kinds[port] not in (DeviceKind.SWITCH, DeviceKind.DC_DC):
+                raise ValueError(f"not a switch or dc/dc: {name}")
+            ports.append(port)
+
+    element_ports = dict.fromkeys(ports)
+    root_loads: list[tuple[int, ...]] = []
+    element_roots: dict[int, list[int]] = {}
+    load_roots: dict[int, list[int]] = {}
+    for i, root in enumerate(compiled.roots):
+        crossed: set[int] = set()
+        energized = energize(compiled, root, links, crossed)
+        for port in crossed:
+            if port in element_ports:
+                element_roots.setdefault(port, []).append(i)
+        loads = tuple(
+            port
+            for port, kind in enumerate(kinds)
+            if kind == DeviceKind.LOAD and energized[port]
+        )
+        for load in loads:
+            load_roots.setdefault(load, []).append(i)
+        root_loads.append(loads)
+    # elements not crossed can't change the result whatever else fails
+    rank = {
+        port: i
+        for i, port in enumerate(
+            port for port in element_ports if port in element_roots
+        )
+    }
+    topology = _Topology(
+        compiled,
+        links,
+        tuple(root_loads),
+        {port: tuple(element_roots[port]) for port in rank},
+        {load: tuple(roots) for load, roots in load_roots.items()},
+        {},
+    )
+    port_devices = compiled.port_devices
+
+    # the elements still crossed when each contingency of the previous size
+    # fails, a contingency is extended by those after its last element only
+    previous: dict[tuple[int, ...], frozenset[int]] = {(): frozenset(rank)}
+    with ChunkPool(topology, workers) as pool:
+        for size in range(1, k + 1):
+
+            def contingencies_(
+                previous: dict[tuple[int, ...], frozenset[int]], size: int
+            ) -> Iterator[tuple[int, ...]]:
+                for others, crossed in previous.items():
+                    last = rank[others[-1]] if others else -1
+                    for element in sorted(crossed, key=rank.__getitem__):
+                        if rank[element] <= last:
+                            continue
+                        contingency = others + (element,)
+                        # each other element must still be crossed as well
+                        if all(
+                            contingency[i]
+                            in previous.get(contingency[:i] + contingency[i + 1 :], ())
+                            for i in range(size - 1)
+                        ):
+                            yield contingency
+
+            def chunks(
+                previous: dict[tuple[int, ...], frozenset[int]], size: int
+            ) -> Iterator[tuple[list[tuple[int, ...]], bool]]:
+                it = contingencies_(previous, size)
+                while chunk := list(islice(it, chunk_size)):
+                    yield chunk, size < k
+
+            current: dict[tuple[int, ...], frozenset[int]] = {}
+            for results in pool.map(_evaluate, chunks(previous, size)):
+                for contingency, lost, crossed in results:
+                    if crossed is not None:
+                        current[contingency] = crossed
+                    yield ContingencyResult(
+                        tuple(port_devices[port].name for port in contingency),
+                        [port_devices[port].name for port in lost],
+                    )
+            previous = current
@@ -0,0 +1,154 @@
+from array import array
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import TYPE_CHECKING, Any, Sequence
+
+from apssm.thin_port import ThinPort
+from apssm.tree import DirectedEdge, DirectedPort
+from apssm.typing import DeviceType
+
+if TYPE_CHECKING:
+    from apssm.compiled import CompiledGraph
+
+
+class DagPort(DirectedPort):
+    """
+    A port of `AbstractPowerSupplySystemDag`, which might be fed by several
+    parents, `parent` is the first of them.
+    """
+
+    __slots__ = ("parents",)
+
+    parents: list["DagPort"]
+
+    def __init__(self, device: DeviceType, port_index: int) -> None:
+        super().__init__(device, port_index)
+        self.parents = []
+
+    def add_parent(self, parent: "DagPort") -> None:
+        if not self.parents:
+            self.parent = parent
+        self.parents.append(parent)
+
+
+@dataclass(eq=False)
+class AbstractPowerSupplySystemDag:
+    """
+    The running state of a graph, as a DAG whose roots are the power supplies,
+    stored compactly as columns.
+
+    It is equivalent to the forest generated by `gen_forest`, but each port
+    appears only once, with all the ports feeding it as parents. `ports` is
+    the ports of the compiled graph in the order they are reached, and edge
+    `i` is from port `edge_parents[i]` to port `edge_children[i]`, with the
+    extras `edge_extras[i]` (None for the links inside a device), in the order
+    the edges are found.
+
+    `roots` and `nodes` are built from the columns on first access.
+    """
+
+    compiled: "CompiledGraph" = field(repr=False)
+    ports: Sequence[int]
+    edge_parents: Sequence[int]
+    edge_children: Sequence[int]
+    edge_extras: Sequence[Any]
+
+    def __len__(self) -> int:
+        return len(self.ports)
+
+    @cached_property
+    def parent_offsets(self) -> array:
+        """CSR offsets of `parents`, by port of the compiled graph"""
+        offsets = array("q", bytes(8 * (len(self.compiled.kinds) + 1)))
+        for child in self.edge_children:
+            offsets[child + 1] += 1
+        for i in range(1, len(offsets)):
+            offsets[i] += offsets[i - 1]
+        return offsets
+
+    @cached_property
+    def parents(self) -> array:
+        """parents of the ports in the order they were found, the parents of
+        port `i` are `parents[parent_offsets[i]:parent_offsets[i + 1]]`"""
+        positions = self.parent_offsets[:-1]
+        parents = array("q", bytes(8 * len(self.edge_children)))
+        for parent, child in zip(self.edge_parents, self.edge_children):
+            parents[positions[child]] = parent
+            positions[child] += 1
+        return parents
+
+    @cached_property
+    def reached(self) -> bytearray:
+        """whether each port of the compiled graph is in the DAG"""
+        reached = bytearray(len(self.compiled.kinds))
+        for port in self.ports:
+            reached[port] = 1
+        return reached
+
+    @property
+    def roots(self) -> tuple[DagPort, ...]:
+        dag_ports = self._dag_ports
+        return tuple(dag_ports[root] for root in self.compiled.roots)
+
+    @cached_property
+    def nodes(self) -> dict[str, DagPort]:
+        port_ids = self.compiled.port_ids
+        dag_ports = self._dag_ports
+        return {port_ids[port]: dag_ports[port] for port in self.ports}
+
+    @cached_property
+    def _dag_ports(self) -> dict[int, DagPort]:
+        port_devices = self.compiled.port_devices
+        port_numbers = self.compiled.port_numbers
+        dag_ports = {
+            port: DagPort(port_devices[port], port_numbers[port]) for port in self.ports
+        }
+        for parent_port, child_port, extras in zip(
+            self.edge_parents, self.edge_children, self.edge_extras
+        ):
+            parent, child = dag_ports[parent_port], dag_ports[child_port]
+            child.add_parent(parent)
+            parent.children.append(child)
+            parent.edges.append(DirectedEdge(from_=parent, to=child, extras=extras))
+        return dag_ports
+
+    def find_passages(self, to: ThinPort) -> list[tuple[ThinPort, ...]]:
+        """
+        Finds all the passages from the roots to the given ThinPort.
+
+        Args:
+            to (ThinPort): The ThinPort to find the passages to.
+
+        Returns:
+            list[tuple[ThinPort, ...]]: passages in the order of roots, then
+                in the order of visiting, empty if there is no path to the
+                given ThinPort.
+        """
+        port = self.compiled.lookup(to)
+        if port is None or not self.reached[port]:
+            return []
+        offsets, parents = self.parent_offsets, self.parents
+        passages: list[tuple[int, ...]] = []
+        # the paths are reversed, from `to` to the roots
+        stack: list[tuple[int, tuple[int, ...]]] = [(port, (port,))]
+        while stack:
+            port, path = stack.pop()
+            begin, end = offsets[port], offsets[port + 1]
+            if begin == end:
+                passages.append(path)
+                continue
+            for parent in reversed(parents[begin:end]):
+                # a port is never passed twice
+                if parent not in path:
+                    stack.append((parent, path + (parent,)))
+        root_order = {root: i for i, root in enumerate(self.compiled.roots)}
+        passages.sort(key=lambda path: root_order[path[-1]])
+        port_devices = self.compiled.port_devices
+        port_numbers = self.compiled.port_numbers
+        return [
+            tuple(
+                ThinPort(port_devices[port].name, port_numbers[port])
+                for port in reversed(path)
+            )
+            for path in passages
+        ]
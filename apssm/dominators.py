@@ -0,0 +1,167 @@
+from typing import Sequence
+
+from apssm.compiled import CompiledGraph, DeviceKind
+from apssm.exceptions import ChargePowerSupply, NoPowerSupplies
+
+
+def immediate_dominators(successors: Sequence[Sequence[int]], root: int) -> list[int]:
+    """find the immediate dominator of each node of a directed graph
+
+    Node `d` dominates node `n` if every path from `root` to `n` goes through
+    `d`. This is the iterative algorithm of Cooper, Harvey and Kennedy ("A
+    Simple, Fast Dominance Algorithm"), which takes a few passes over the nodes
+    in reverse postorder, i.e. nearly linear time for graphs with few back
+    edges, like the graphs of power supply systems.
+
+    Args:
+        successors (Sequence[Sequence[int]]): successors of each node, nodes are
+            numbered from 0
+        root (int): the entry node
+
+    Returns:
+        list[int]: the immediate dominator of each node, `root` for `root`
+            itself, -1 for the nodes unreachable from `root`
+    """
+    n = len(successors)
+    # postorder by an iterative depth first search
+    postorder: list[int] = []
+    visited = bytearray(n)
+    visited[root] = 1
+    stack = [(root, iter(successors[root]))]
+    while stack:
+        node, children = stack[-1]
+        for child in children:
+            if not visited[child]:
+                visited[child] = 1
+                stack.append((child, iter(successors[child])))
+                break
+        else:
+            stack.pop()
+            postorder.append(node)
+    number = [-1] * n
+    for i, node in enumerate(postorder):
+        number[node] = i
+    predecessors: list[list[int]] = [[] for _ in range(n)]
+    for node in postorder:
+        for child in successors[node]:
+            predecessors[child].append(node)
+
+    idom = [-1] * n
+    idom[root] = root
+    reverse_postorder = postorder[-2::-1]
+    changed = True
+    while changed:
+        changed = False
+        for node in reverse_postorder:
+            new_idom = -1
+            for predecessor in predecessors[node]:
+                if idom[predecessor] == -1:
+                    # not processed yet
+                    continue
+                if new_idom == -1:
+                    new_idom = predecessor
+                    continue
+                # the nearest common dominator of both
+                a, b = predecessor, new_idom
+                while a != b:
+                    while number[a] < number[b]:
+                        a = idom[a]
+                    while number[b] < number[a]:
+                        b = idom[b]
+                new_idom = a
+            if idom[node] != new_idom:
+                idom[node] = new_idom
+                changed = True
+    return idom
+
+
+def critical_loads(
+    compiled: CompiledGraph, truth_table: dict[str, bool] | None = None
+) -> dict[str, list[str]]:
+    """see `AbstractPowerSupplySystemGraph.critical_loads`"""
+    links = compiled.links(truth_table)
+    if not compiled.roots:
+        raise NoPowerSupplies()
+    kinds = compiled.kinds
+    port_devices = compiled.port_devices
+    n = len(kinds)
+    successors = feeding_graph(compiled, links)
+    idom = immediate_dominators(successors, 2 * n)
+
+    res: dict[str, list[str]] = {
+        device.name: []
+        for device, kind in zip(port_devices, kinds)
+        if kind in (DeviceKind.SWITCH, DeviceKind.DC_DC, DeviceKind.BUS)
+    }
+    for load, kind in enumerate(kinds):
+        if kind != DeviceKind.LOAD or idom[load] == -1:
+            continue
+        node = idom[load]
+        while node != 2 * n:
+            # the link of a two-ported device, or a bus
+            port = node - n if node >= n else node
+            if node >= n or kinds[port] == DeviceKind.BUS:
+                name = port_devices[port].name
+                if name in res:
+                    res[name].append(port_devices[load].name)
+            node = idom[node]
+    return res
+
+
+def feeding_graph(compiled: CompiledGraph, links: bytearray) -> list[list[int]]:
+    """the ports and the steps between them of all the trees, as a graph
+    of `2 * len(kinds) + 1` nodes for dominators
+
+    Node `i < len(kinds)` is port `i`, the link between port `i` and `i + 1`
+    of a two-ported device is node `len(kinds) + i`, so a step over the link
+    goes through it, and node `2 * len(kinds)` is the entry, which feeds the
+    power supplies.
+
+    Throws:
+        ChargePowerSupply: as `CompiledGraph.gen_forest_with`
+    """
+    port_devices = compiled.port_devices
+    kinds = compiled.kinds
+    offsets = compiled.offsets
+    neighbors = compiled.neighbors
+    partners = compiled.partners
+    cathodes = compiled.cathodes
+    power_supply = DeviceKind.POWER_SUPPLY
+    diode = DeviceKind.DIODE
+    walk, next_to_power_supply = compiled.walk_adjacency
+    n = len(kinds)
+
+    successors: list[list[int]] = [[] for _ in range(2 * n + 1)]
+    successors[2 * n].extend(compiled.roots)
+    steps: set[int] = set()
+    # as gen_dag, each (port, parent) is expanded once, for all the roots
+    expanded: set[int] = set()
+    for root in compiled.roots:
+        root_device = port_devices[root]
+        stack: list[tuple[int, int]] = [(root, -1)]
+        while stack:
+            port, parent = stack.pop()
+            key = port * (n + 1) + parent + 1
+            if key in expanded:
+                continue
+            expanded.add(key)
+            if next_to_power_supply[port]:
+                for child in neighbors[offsets[port] : offsets[port + 1]]:
+                    if child != parent and kinds[child] == power_supply:
+                        raise ChargePowerSupply(root_device, port_devices[child])  # type: ignore
+            for child in walk[port]:
+                if child != parent:
+                    if port * n + child not in steps:
+                        steps.add(port * n + child)
+                        successors[port].append(child)
+                    stack.append((child, port))
+            if links[port]:
+                child = partners[port]
+                if child != parent and (kinds[port] == diode or not cathodes[child]):
+                    link = n + min(port, child)
+                    if port * n + child not in steps:
+                        steps.add(port * n + child)
+                        successors[port].append(link)
+                        successors[link].append(child)
+                    stack.append((child, port))
+    return successors
@@ -0,0 +1,129 @@
+from apssm.compiled import CompiledGraph, DeviceKind
+from apssm.exceptions import ChargePowerSupply, NoPowerSupplies
+
+
+def energized_ports(
+    compiled: CompiledGraph, truth_table: dict[str, bool] | None = None
+) -> dict[str, bytearray]:
+    """see `AbstractPowerSupplySystemGraph.energized_ports`"""
+    links = compiled.links(truth_table)
+    if not compiled.roots:
+        raise NoPowerSupplies()
+    return dict(
+        zip(
+            (compiled.port_devices[root].name for root in compiled.roots),
+            energized_with(compiled, links),
+        )
+    )
+
+
+def energized_loads(
+    compiled: CompiledGraph, truth_table: dict[str, bool] | None = None
+) -> dict[str, list[str]]:
+    """see `AbstractPowerSupplySystemGraph.energized_loads`
+
+    The ports reached are recorded by each search, so only the loads of each
+    root are visited, not all the loads for all the roots.
+    """
+    links = compiled.links(truth_table)
+    if not compiled.roots:
+        raise NoPowerSupplies()
+    port_devices = compiled.port_devices
+    kinds = compiled.kinds
+    load = DeviceKind.LOAD
+    power_supplies: dict[int, list[str]] = {}
+    for root in compiled.roots:
+        name = port_devices[root].name
+        reached: list[int] = []
+        energize(compiled, root, links, reached=reached)
+        for port in reached:
+            if kinds[port] == load:
+                power_supplies.setdefault(port, []).append(name)
+    return {
+        port_devices[port].name: power_supplies[port] for port in sorted(power_supplies)
+    }
+
+
+def energized_with(compiled: CompiledGraph, links: bytearray) -> list[bytearray]:
+    """the ports reached from each root with linked ports from `links`, as
+    one byte per port
+
+    Throws:
+        ChargePowerSupply: as `CompiledGraph.gen_forest_with`
+    """
+    return [energize(compiled, root, links) for root in compiled.roots]
+
+
+def energize(
+    compiled: CompiledGraph,
+    root: int,
+    links: bytearray,
+    crossed: set[int] | None = None,
+    reached: list[int] | None = None,
+) -> bytearray:
+    """the ports reached from `root` with linked ports from `links`, as one
+    byte per port
+
+    Args:
+        compiled (CompiledGraph): the graph
+        root (int): port of the power supply
+        links (bytearray): as returned by `CompiledGraph.links`
+        crossed (set[int] | None, optional): if given, the links crossed
+            are added to it, each as the first port of its device.
+            Defaults to None.
+        reached (list[int] | None, optional): if given, the ports reached are
+            appended to it, in the order they are reached. Defaults to None.
+
+    Throws:
+        ChargePowerSupply: as `CompiledGraph.gen_forest_with`
+    """
+    port_devices = compiled.port_devices
+    kinds = compiled.kinds
+    offsets = compiled.offsets
+    neighbors = compiled.neighbors
+    partners = compiled.partners
+    cathodes = compiled.cathodes
+    power_supply = DeviceKind.POWER_SUPPLY
+    diode = DeviceKind.DIODE
+    walk, next_to_power_supply = compiled.walk_adjacency
+    n = len(kinds)
+
+    root_device = port_devices[root]
+    energized = bytearray(n)
+    # the children of a port only depend on where it is entered from, an
+    # expanded (port, parent) would be expanded the same way, and it didn't
+    # reach a power supply. Most ports are entered once, so only the parent
+    # of the first entrance is kept for each port, in a dict as a search
+    # usually reaches a small part of the graph.
+    entered_from: dict[int, int] = {}
+    reentered: set[int] = set()
+    stack: list[tuple[int, int]] = [(root, -1)]
+    while stack:
+        port, parent = stack.pop()
+        if not energized[port]:
+            energized[port] = 1
+            entered_from[port] = parent
+            if reached is not None:
+                reached.append(port)
+        elif entered_from[port] == parent:
+            continue
+        else:
+            key = port * (n + 1) + parent + 1
+            if key in reentered:
+                continue
+            reentered.add(key)
+        if next_to_power_supply[port]:
+            for child in neighbors[offsets[port] : offsets[port + 1]]:
+                if child != parent and kinds[child] == power_supply:
+                    raise ChargePowerSupply(root_device, port_devices[child])  # type: ignore
+        for child in walk[port]:
+            if child != parent:
+                stack.append((child, port))
+        # closed switch, dc/dc and anode of diode are linked to the other port
+        if links[port]:
+            child = partners[port]
+            if child != parent and (kinds[port] == diode or not cathodes[child]):
+                stack.append((child, port))
+                if crossed is not None:
+                    crossed.add(min(port, child))
+    return energized
@@ -94,3 +94,19 @@ class InvalidPort(Exception):
         super().__init__(f"Invalid port: {device.name}.{port_index}")
         self.device = device
         self.port_index = port_index
+
+
+class TooManyConflictSets(Exception):
+    """
+    Exception raised when the minimal sets of switches charging power supplies
+    take more than a budget of search steps to compute.
+
+    Attributes:
+        budget (int): The search steps allowed.
+    """
+
+    budget: int
+
+    def __init__(self, budget: int):
+        super().__init__(f"Too many conflict sets: more than {budget} search steps")
+        self.budget = budget
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, NamedTuple
+
+from apssm.exceptions import ChargePowerSupply
+from apssm.tree import AbstractPowerSupplySystemForest as Forest
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class ForestCache:
+    """
+    A bounded LRU cache of forests, keyed by the effective switch states.
+
+    ChargePowerSupply is cached as well, and raised again on hits. The cache
+    belongs to one version of a graph, it is cleared once the version changes.
+    The forests are shared by all the hits, so they must not be modified.
+    """
+
+    maxsize: int
+    version: int
+    hits: int
+    misses: int
+    _forests: OrderedDict[bytes, Forest | ChargePowerSupply]
+    _lock: Lock
+
+    def __init__(self, maxsize: int = 128) -> None:
+        self.maxsize = maxsize
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._forests = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, version: int, key: bytes, build: Callable[[], Forest]) -> Forest:
+        """get the forest of `key`, build and cache it if it is missing
+
+        Args:
+            version (int): version of the graph
+            key (bytes): the effective switch states
+            build (Callable[[], Forest]): build the forest
+
+        Throws:
+            ChargePowerSupply: if it is raised by `build`
+        """
+        with self._lock:
+            if version != self.version:
+                self._forests.clear()
+                self.version = version
+            forest = self._forests.get(key)
+            if forest is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._forests.move_to_end(key)
+        if forest is None:
+            try:
+                forest = build()
+            except ChargePowerSupply as e:
+                forest = e
+            with self._lock:
+                if version == self.version and self.maxsize > 0:
+                    self._forests[key] = forest
+                    if len(self._forests) > self.maxsize:
+                        self._forests.popitem(last=False)
+        if isinstance(forest, ChargePowerSupply):
+            raise ChargePowerSupply(forest.from_, forest.to)
+        return forest
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._forests))
+
+    def clear(self) -> None:
+        """remove all the forests and reset the statistics"""
+        with self._lock:
+            self._forests.clear()
+            self.hits = self.misses = 0
@@ -1,9 +1,11 @@
-from typing import Any, Iterable, NamedTuple
-
-from apssm.devices.dc_dc import DcDc
-from apssm.devices.diode import Diode
-from apssm.devices.power_supply import PowerSupply
-from apssm.devices.switch import Switch
+from itertools import islice
+from time import perf_counter
+from typing import Any, Callable, Iterable, Literal, NamedTuple, Sequence, TypeVar
+
+from apssm.compiled import CompiledGraph, ScenarioResult
+from apssm.dag import AbstractPowerSupplySystemDag
+from apssm.dominators import critical_loads
+from apssm.energize import energized_loads, energized_ports
 from apssm.exceptions import (
     ChargePowerSupply,
     DuplicateConnection,
@@ -12,11 +14,15 @@ from apssm.exceptions import (
     NoPowerSupplies,
     NoSuchDevice,
 )
+from apssm.forest_cache import CacheInfo, ForestCache
 from apssm.gen_port_id import gen_port_id
+from apssm.stats import SearchStats, StatsSink
 from apssm.thin_port import ThinPort
-from apssm.tree import AbstractPowerSupplySystemTree, DirectedEdge, DirectedPort
+from apssm.tree import AbstractPowerSupplySystemForest, AbstractPowerSupplySystemTree
 from apssm.typing import DeviceType
 
+T = TypeVar("T")
+
 
 class ThinEdge(NamedTuple):
     first: ThinPort
@@ -42,14 +48,67 @@ class Edge(NamedTuple):
 
 
 class AbstractPowerSupplySystemGraph:
-    ports: dict[str, Port]
     devices: dict[str, DeviceType]
-    edges: list[Edge]
-
-    def __init__(self):
-        self.ports = {}
-        self.edges = []
+    # the tables of `ports` and `edges`, see `_ensure_tables`
+    _ports: dict[str, Port]
+    _edges: list[Edge]
+    # the connected pairs of port ids, the smaller id first
+    _connections: set[tuple[str, str]]
+    # increased by each modification of the graph
+    version: int
+    _compiled: CompiledGraph | None
+    _compiled_version: int
+    _forest_cache: ForestCache
+    # called with the statistics of each `gen_forest` and `find_passages`
+    stats_sink: StatsSink | None
+    # the compiled graph and edges of `from_compiled`, until the ports, edges
+    # and connections are built from them, None once built
+    _unbuilt: tuple[CompiledGraph, Iterable[tuple[int, int, Any]]] | None
+
+    def __init__(
+        self, forest_cache_size: int = 128, stats_sink: StatsSink | None = None
+    ):
+        """
+        Args:
+            forest_cache_size (int, optional): max number of forests cached for
+                `find_passages`, 0 to disable the cache. Defaults to 128.
+            stats_sink (StatsSink | None, optional): if given, the searches of
+                `gen_forest` and `find_passages` are counted and timed, and the
+                `SearchStats` of each call is passed to it, on the thread of
+                the call, e.g. to export them to metrics. Nothing is collected
+                without it. Defaults to None.
+        """
+        self._ports = {}
+        self._edges = []
+        self._connections = set()
+        self._unbuilt = None
         self.devices = {}
+        self.version = 0
+        self._compiled = None
+        self._compiled_version = -1
+        self._forest_cache = ForestCache(forest_cache_size)
+        self.stats_sink = stats_sink
+
+    @property
+    def ports(self) -> dict[str, Port]:
+        """the ports by id, in the order they were added"""
+        self._ensure_tables()
+        return self._ports
+
+    @property
+    def edges(self) -> list[Edge]:
+        """the edges, in the order they were added"""
+        self._ensure_tables()
+        return self._edges
+
+    def _ensure_tables(self) -> None:
+        """build the ports, edges and connections of a graph of `from_compiled`
+        on first use, e.g. to modify the graph, the queries only use the
+        compiled graph"""
+        if self._unbuilt is not None:
+            compiled, edges = self._unbuilt
+            self._unbuilt = None
+            self._build_from_compiled(compiled, edges)
 
     def add_device(self, device: DeviceType) -> "AbstractPowerSupplySystemGraph":
         if device.name in self.devices:
@@ -57,6 +116,36 @@ class AbstractPowerSupplySystemGraph:
         self.devices[device.name] = device
         for i in range(device.port_num):
             self.ports[gen_port_id(device.name, i)] = Port(device, i, [])
+        self.version += 1
+        return self
+
+    def add_devices(
+        self, devices: Iterable[DeviceType]
+    ) -> "AbstractPowerSupplySystemGraph":
+        """add devices in bulk, the graph is untouched if any device is invalid
+
+        Args:
+            devices (Iterable[DeviceType]): devices to add
+
+        Returns:
+            AbstractPowerSupplySystemGraph: self
+
+        Throws:
+            DuplicateDevice: if a device already exists, or appears twice
+        """
+        devices = list(devices)
+        names = set(self.devices)
+        for device in devices:
+            if device.name in names:
+                raise DuplicateDevice(device.name)
+            names.add(device.name)
+        ports = self.ports
+        for device in devices:
+            self.devices[device.name] = device
+            for i in range(device.port_num):
+                ports[gen_port_id(device.name, i)] = Port(device, i, [])
+        if devices:
+            self.version += 1
         return self
 
     def add_edge(
@@ -84,39 +173,218 @@ class AbstractPowerSupplySystemGraph:
             InvalidPort: if port index is invalid
             DuplicateConnection: if connection already exists
         """
-        first_device_name, first_port_index = first
-        try:
-            first_device = self.devices[first_device_name]
-        except KeyError:
-            raise NoSuchDevice(first_device_name)
-        if first_port_index >= first_device.port_num:
-            raise InvalidPort(device=first_device, port_index=first_port_index)
+        return self.add_edges(((first, second, extras),))
+
+    def add_edges(
+        self,
+        edges: Iterable[
+            tuple[ThinPort | tuple[str, int], ThinPort | tuple[str, int]]
+            | tuple[ThinPort | tuple[str, int], ThinPort | tuple[str, int], Any]
+        ],
+    ) -> "AbstractPowerSupplySystemGraph":
+        """add edges in bulk, the graph is untouched if any edge is invalid
 
-        second_device_name, second_port_index = second
+        Args:
+            edges: `(first, second)` or `(first, second, extras)` of each edge,
+                as the arguments of `add_edge`, ThinEdge is accepted too
+
+        Returns:
+            AbstractPowerSupplySystemGraph: self
+
+        Throws:
+            NoSuchDevice: if device not found
+            InvalidPort: if port index is invalid
+            DuplicateConnection: if connection already exists, or appears twice
+        """
+        self._ensure_tables()
+        ports = self._ports
+        connections = self._connections
+        resolved: list[Edge] = []
+        new_connections: set[tuple[str, str]] = set()
+        for edge in edges:
+            if len(edge) == 2:
+                first, second = edge  # type: ignore
+                extras = None
+            else:
+                first, second, extras = edge  # type: ignore
+            first_id = gen_port_id(*first)
+            second_id = gen_port_id(*second)
+            try:
+                first_port = ports[first_id]
+                second_port = ports[second_id]
+            except KeyError:
+                self._validate_port(first)
+                self._validate_port(second)
+                raise
+            key = (
+                (first_id, second_id)
+                if first_id <= second_id
+                else (second_id, first_id)
+            )
+            if key in connections or key in new_connections:
+                raise DuplicateConnection(first, second, extras)
+            new_connections.add(key)
+            resolved.append(Edge(first_port, second_port, extras))
+
+        connections |= new_connections
+        self._edges.extend(resolved)
+        for first_port, second_port, extras in resolved:
+            first_port.adj_list.append((second_port, extras))
+            second_port.adj_list.append((first_port, extras))
+        if resolved:
+            self.version += 1
+        return self
+
+    def _validate_port(self, port: ThinPort | tuple[str, int]):
+        device_name, port_index = port
         try:
-            second_device = self.devices[second_device_name]
+            device = self.devices[device_name]
         except KeyError:
-            raise NoSuchDevice(second_device_name)
+            raise NoSuchDevice(device_name)
+        if not 0 <= port_index < device.port_num:
+            raise InvalidPort(device=device, port_index=port_index)
+
+    @classmethod
+    def from_compiled(
+        cls,
+        compiled: CompiledGraph,
+        edges: Iterable[tuple[int, int, Any]],
+        forest_cache_size: int = 128,
+        stats_sink: StatsSink | None = None,
+    ) -> "AbstractPowerSupplySystemGraph":
+        """build the graph of a compiled graph, e.g. loaded from a snapshot
+
+        The compiled graph is trusted, nothing is validated, and it's used as
+        the compiled form of the graph until the graph is modified. The ports
+        and edges of the graph are only built when first used.
+
+        Args:
+            compiled (CompiledGraph): the compiled graph
+            edges (Iterable[tuple[int, int, Any]]): ports and extras of each
+                edge in the order they were added, which must match the
+                adjacency of `compiled`
+            forest_cache_size (int, optional): see `__init__`. Defaults to 128.
+            stats_sink (StatsSink | None, optional): see `__init__`. Defaults
+                to None.
+
+        Returns:
+            AbstractPowerSupplySystemGraph: the graph
+        """
+        graph = cls(forest_cache_size, stats_sink)
+        graph.devices = {device.name: device for device in compiled.devices}
+        graph._unbuilt = (compiled, edges)
+        graph.version = 1
+        graph._compiled = compiled
+        graph._compiled_version = graph.version
+        return graph
+
+    def _build_from_compiled(
+        self, compiled: CompiledGraph, edges: Iterable[tuple[int, int, Any]]
+    ) -> None:
+        ports = [
+            Port(device, index, [])
+            for device, index in zip(compiled.port_devices, compiled.port_numbers)
+        ]
+        self._ports = dict(zip(compiled.port_ids, ports))
+        offsets, neighbors, extras = (
+            compiled.offsets,
+            compiled.neighbors,
+            compiled.extras,
+        )
+        for port, begin, end in zip(ports, offsets, islice(offsets, 1, None)):
+            port.adj_list.extend(
+                zip(map(ports.__getitem__, neighbors[begin:end]), extras[begin:end])
+            )
+        self._edges = []
+        self._connections = set()
+        port_ids = compiled.port_ids
+        for first, second, extras_ in edges:
+            self._edges.append(Edge(ports[first], ports[second], extras_))
+            first_id, second_id = port_ids[first], port_ids[second]
+            self._connections.add(
+                (first_id, second_id)
+                if first_id <= second_id
+                else (second_id, first_id)
+            )
 
-        if second_port_index >= second_device.port_num:
-            raise InvalidPort(device=second_device, port_index=second_port_index)
+    def compile(self) -> CompiledGraph:
+        """freeze the graph into integer indexed ports with CSR adjacency
 
-        first_port = self.ports[gen_port_id(first_device_name, first_port_index)]
-        second_port = self.ports[gen_port_id(second_device_name, second_port_index)]
+        The compiled graph is cached until the graph is modified by `add_device`
+        or `add_edge`. Note that the states of switches are not frozen, they are
+        read when a truth table is applied.
 
-        if any(port.id == second_port.id for port, _ in first_port.adj_list):
-            raise DuplicateConnection(first, second, extras)
+        Returns:
+            CompiledGraph: the compiled graph
+        """
+        if self._compiled is None or self._compiled_version != self.version:
+            self._compiled = CompiledGraph.from_graph(self)
+            self._compiled_version = self.version
+        return self._compiled
 
-        edge = Edge(first=first_port, second=second_port, extras=extras)
-        self.edges.append(edge)
+    def forest_cache_info(self) -> CacheInfo:
+        """statistics of the forest cache used by `find_passages`"""
+        return self._forest_cache.info()
 
-        first_port.adj_list.append((second_port, edge.extras))
-        second_port.adj_list.append((first_port, edge.extras))
-        return self
+    def cached_forest(
+        self,
+        truth_table: dict[str, bool] | None = None,
+        stats: SearchStats | None = None,
+    ) -> AbstractPowerSupplySystemForest:
+        """like `gen_forest`, but the forest is taken from the forest cache of
+        `find_passages`, and added to it if missing
+
+        The forest is shared with the cache and the other callers, it must not
+        be modified.
+
+        Args:
+            truth_table (dict[str, bool] | None, optional): the truth table for
+                switches. Defaults to None.
+            stats (SearchStats | None, optional): if given, the search is
+                counted into it, and whether the forest is cached. Defaults to
+                None.
+
+        Returns:
+            AbstractPowerSupplySystemForest: the forest
+
+        Throws:
+            NoSuchDevice: if a device in truth table doesn't exist
+            NoPowerSupplies: if there are no power supplies
+            ChargePowerSupply: as `gen_forest` does
+        """
+        compiled = self.compile()
+        links = compiled.links(truth_table)
+        if not compiled.roots:
+            raise NoPowerSupplies()
+        if stats is None:
+            return self._forest_cache.get(
+                self.version,
+                compiled.state_key(links),
+                lambda: compiled.gen_forest_with(links),
+            )
+
+        def build() -> AbstractPowerSupplySystemForest:
+            stats.cache_hit = False
+            return compiled.gen_forest_with(links, stats)
+
+        stats.cache_hit = True
+        return self._forest_cache.get(self.version, compiled.state_key(links), build)
+
+    def _traced(self, stats: SearchStats, search: Callable[[], T]) -> T:
+        """run `search`, which fills `stats`, then pass them to `stats_sink`"""
+        start = perf_counter()
+        try:
+            return search()
+        except ChargePowerSupply as e:
+            stats.charge = (e.from_.name, e.to.name)
+            raise
+        finally:
+            stats.seconds = perf_counter() - start
+            self.stats_sink(stats)  # type: ignore
 
     def gen_forest(
         self, truth_table: dict[str, bool] | None = None
-    ) -> tuple[AbstractPowerSupplySystemTree, ...]:
+    ) -> AbstractPowerSupplySystemForest:
         """根据真值表生成森林
 
             Args:
@@ -124,112 +392,287 @@ class AbstractPowerSupplySystemGraph:
         Defaults to None.
 
             Returns:
-                AbstractPowerSupplySystemDag: 当前真值表对应的dag
-        """
-        if not truth_table:
-            truth_table = {}
-        for k in truth_table:
-            if k not in self.devices:
-                raise NoSuchDevice(k)
-        directed_roots: list[DirectedPort] = []
-        for port in self.ports.values():
-            if isinstance(port.device, PowerSupply):
-                directed_roots.append(
-                    DirectedPort(device=port.device, port_index=port.index)
-                )
-        if not directed_roots:
-            raise NoPowerSupplies()
+                AbstractPowerSupplySystemForest: 当前真值表对应的森林, 每个电源一棵树
+        """
+        if self.stats_sink is None:
+            return self.compile().gen_forest(truth_table)
+        stats = SearchStats("gen_forest")
+        return self._traced(
+            stats, lambda: self.compile().gen_forest(truth_table, stats)
+        )
+
+    def gen_dag(
+        self, truth_table: dict[str, bool] | None = None
+    ) -> AbstractPowerSupplySystemDag:
+        """generate a DAG from the truth table, equivalent to `gen_forest`
+
+        Unlike the forest, where a port fed by several power supplies (e.g.
+        through diodes) is copied into each tree along with its subtree, each
+        port appears once in the DAG, and the shared part is searched only once.
+        The DAG is stored as columns of ports and edges, the DagPorts are only
+        built on first access of its `roots` or `nodes`.
+
+        Args:
+            truth_table (dict[str, bool] | None, optional): the truth table for
+                switches. Defaults to None.
+
+        Returns:
+            AbstractPowerSupplySystemDag: the DAG rooted at the power supplies
+
+        Throws:
+            NoSuchDevice: if a device in truth table doesn't exist
+            NoPowerSupplies: if there are no power supplies
+            ChargePowerSupply: as `gen_forest` does
+        """
+        return self.compile().gen_dag(truth_table)
+
+    def energized_ports(
+        self, truth_table: dict[str, bool] | None = None
+    ) -> dict[str, bytearray]:
+        """find the ports energized by each power supply, without generating
+        the forest
+
+        The ports are those of the forest `gen_forest(truth_table)` generates,
+        but neither the trees nor the passages are built.
+
+        Args:
+            truth_table (dict[str, bool] | None, optional): the truth table for
+                switches. Defaults to None.
+
+        Returns:
+            dict[str, bytearray]: key is the name of each power supply, value is
+                one byte for each port of `compile()`, 1 if the port is
+                energized by the power supply, e.g.
+                `numpy.frombuffer(value, dtype=bool)` is a boolean array of it
+
+        Throws:
+            NoSuchDevice: if a device in truth table doesn't exist
+            NoPowerSupplies: if there are no power supplies
+            ChargePowerSupply: as `gen_forest` does
+        """
+        return energized_ports(self.compile(), truth_table)
+
+    def energized_loads(
+        self, truth_table: dict[str, bool] | None = None
+    ) -> dict[str, list[str]]:
+        """find the loads energized and their power supplies, see
+        `energized_ports`
+
+        Args:
+            truth_table (dict[str, bool] | None, optional): the truth table for
+                switches. Defaults to None.
+
+        Returns:
+            dict[str, list[str]]: key is the name of each energized load, in the
+                order the loads were added, value is the names of the power
+                supplies energizing it
 
-        forest: list[AbstractPowerSupplySystemTree] = []
+        Throws:
+            NoSuchDevice: if a device in truth table doesn't exist
+            NoPowerSupplies: if there are no power supplies
+            ChargePowerSupply: as `gen_forest` does
+        """
+        return energized_loads(self.compile(), truth_table)
 
-        visited_edges: set[str] = set()
+    def critical_loads(
+        self, truth_table: dict[str, bool] | None = None
+    ) -> dict[str, list[str]]:
+        """find the loads solely fed by each switch, dc/dc and bus
 
-        # search from roots
-        for directed_root in directed_roots:
-            assert isinstance(directed_root.device, PowerSupply)
-            stack: list[tuple[DirectedPort, DirectedPort | None]] = [
-                (directed_root, None)
+        A load is solely fed by a device if it loses power when the device
+        opens (or fails), i.e. every passage to the load, from every power
+        supply, goes through the device. All of them are found in a single
+        pass: the ports visited by `gen_forest(truth_table)` are put in one
+        graph, where a step from one port of a two-ported device to the other
+        goes through a node of the device, then the dominators of the loads
+        are computed.
+
+        Args:
+            truth_table (dict[str, bool] | None, optional): the truth table for
+                switches. Defaults to None.
+
+        Returns:
+            dict[str, list[str]]: key is the name of each switch, dc/dc and bus,
+                in the order they were added, value is the names of the loads
+                it solely feeds, in the order they were added
+
+        Throws:
+            NoSuchDevice: if a device in truth table doesn't exist
+            NoPowerSupplies: if there are no power supplies
+            ChargePowerSupply: as `gen_forest` does
+        """
+        return critical_loads(self.compile(), truth_table)
+
+    def conflict_sets(self) -> dict[tuple[str, str], list[frozenset[str]]]:
+        """find the minimal sets of switches whose closure makes a power supply
+        charge another one, respecting the direction of diodes
+
+        The sets are computed once for all truth tables, and cached until the
+        graph changes, see `apssm.conflicts.Conflicts.masks`.
+
+        Returns:
+            dict[tuple[str, str], list[frozenset[str]]]: key is the names of the
+                power supply charging and the power supply charged, they are
+                the same if a power supply charges itself through a loop,
+                value is the names of switches of each minimal set
+
+        Throws:
+            TooManyConflictSets: if the sets take more than
+                `apssm.conflicts.Conflicts.budget` search steps, e.g. with many
+                tie switches meshing the buses
+        """
+        compiled = self.compile()
+        port_devices = compiled.port_devices
+        switches = [port_devices[port].name for port in compiled.switch_ports]
+        return {
+            (port_devices[root].name, port_devices[to].name): [
+                frozenset(name for j, name in enumerate(switches) if mask >> j & 1)
+                for mask in masks
             ]
-            directed_ports: dict[str, DirectedPort] = {}
-            while stack:
-                candidate_port, parent_port = stack.pop()
-                directed_ports[candidate_port.id] = candidate_port
-                # NOTE: 这里必须是一个clone， 因为后面会修改adj_list
-                adj_list = self.ports[candidate_port.id].adj_list[:]
-                # 若是闭合开关或者dcdc, 视为存在一个到另外一个端口的连接
-                is_closed_switch = isinstance(
-                    candidate_port.device, Switch
-                ) and truth_table.get(
-                    candidate_port.device.name, candidate_port.device.on
-                )
-                is_dc_dc = isinstance(candidate_port.device, DcDc)
-                if is_closed_switch or is_dc_dc:
-                    the_other_port = self.ports[
-                        gen_port_id(
-                            candidate_port.device.name,
-                            1 - candidate_port.port_index,
-                        )
-                    ]
-                    adj_list.append((the_other_port, None))
-                # 若是二极管, 并且是第0端口，视为一个连接
-
-                if (
-                    isinstance(candidate_port.device, Diode)
-                    and candidate_port.port_index == 0
-                ):
-                    adj_list.append(
-                        (self.ports[gen_port_id(candidate_port.device.name, 1)], None)
-                    )
-                for port, extras in adj_list:
-                    # 防止回溯到父节点
-                    if parent_port and port.id == parent_port.id:
-                        continue
-                    child_port = self.ports[port.id]
-                    # 如果找到了一个电源
-                    if isinstance(child_port.device, PowerSupply):
-                        raise ChargePowerSupply(directed_root.device, child_port.device)
-
-                    directed_child_port = DirectedPort(
-                        device=child_port.device, port_index=child_port.index
-                    )
-
-                    # 如果是二极管， 并且是第1端口， 停止查找
-                    if (
-                        not isinstance(candidate_port.device, Diode)
-                        and isinstance(directed_child_port.device, Diode)
-                        and directed_child_port.port_index == 1
-                    ):
-                        continue
-                    candidate_port.children.append(directed_child_port)
-                    directed_child_port.parent = candidate_port
-                    directed_edge = DirectedEdge(
-                        from_=candidate_port,
-                        to=directed_child_port,
-                        extras=extras,
-                    )
-                    visited_edges.add(directed_edge.id)
-                    candidate_port.edges.append(directed_edge)
-
-                    stack.append((directed_child_port, candidate_port))
-            forest.append(
-                AbstractPowerSupplySystemTree(root=directed_root, nodes=directed_ports)
-            )
+            for (root, to), masks in compiled.conflicts.masks.items()
+        }
+
+    def find_conflict(
+        self, truth_table: dict[str, bool] | None = None
+    ) -> tuple[str, str] | None:
+        """check the truth table against `conflict_sets`, without searching the
+        graph, or with `validate` if the sets are over budget
+
+        Args:
+            truth_table (dict[str, bool] | None, optional): the truth table for
+                switches. Defaults to None.
+
+        Returns:
+            tuple[str, str] | None: None if `gen_forest(truth_table)` doesn't
+                raise ChargePowerSupply, else the names of the first power
+                supply charging another one, and of a power supply it charges
+
+        Throws:
+            NoSuchDevice: if a device in truth table doesn't exist
+        """
+        compiled = self.compile()
+        pair = compiled.conflicts.find(compiled.links(truth_table))
+        if pair is None:
+            return None
+        root, to = pair
+        return compiled.port_devices[root].name, compiled.port_devices[to].name
+
+    def validate(
+        self, truth_table: dict[str, bool] | None = None
+    ) -> tuple[str, str] | None:
+        """check if the truth table is legal, without generating the forest
+
+        The ports linked by edges and dc/dcs are labeled by components once,
+        cached until the graph changes, then the components are merged by the
+        closed switches with a union-find, and only the diodes are followed
+        from each power supply. Unlike `find_conflict`, nothing is computed for
+        all the truth tables, so it suits large graphs with many switches.
+
+        Args:
+            truth_table (dict[str, bool] | None, optional): the truth table for
+                switches. Defaults to None.
+
+        Returns:
+            tuple[str, str] | None: None if `gen_forest(truth_table)` doesn't
+                raise ChargePowerSupply, else the names of the first power
+                supply charging another one, and of a power supply it charges
 
-        return tuple(forest)
+        Throws:
+            NoSuchDevice: if a device in truth table doesn't exist
+        """
+        compiled = self.compile()
+        pair = compiled.conflicts.validate(compiled.links(truth_table))
+        if pair is None:
+            return None
+        root, to = pair
+        return compiled.port_devices[root].name, compiled.port_devices[to].name
+
+    def gen_forests(
+        self,
+        scenarios: Iterable[dict[str, bool]] | Iterable[Sequence[bool]],
+        switches: Sequence[str] | None = None,
+    ) -> list[ScenarioResult]:
+        """generate a forest for each scenario of the same topology
+
+        The topology is compiled once, and the states of switches are read
+        once, so this is much faster than calling `gen_forest` repeatedly.
+        ChargePowerSupply doesn't stop the batch, it is returned as the result
+        of that scenario.
+
+        Args:
+            scenarios: truth tables, or if `switches` is given, rows of a
+                scenarios × switches boolean matrix
+            switches (Sequence[str] | None, optional): the switch of each column
+                of the matrix. Defaults to None.
+
+        Returns:
+            list[ScenarioResult]: the result of each scenario, in order
+
+        Throws:
+            NoPowerSupplies: if there are no power supplies
+            NoSuchDevice: if a device in truth tables or switches doesn't exist
+            ValueError: if a row doesn't match `switches`
+        """
+        return self.compile().gen_forests(scenarios, switches)
+
+    def update_forest(
+        self,
+        forest: tuple[AbstractPowerSupplySystemTree, ...],
+        delta: dict[str, bool],
+        truth_table: dict[str, bool] | None = None,
+    ) -> tuple[AbstractPowerSupplySystemTree, ...]:
+        """update a forest after some switches are toggled
+
+        Only the subtrees under the toggled switches are re-derived: the subtree
+        behind a switch turned off is cut, and the subtree behind a switch turned
+        on is grown, the trees without the toggled switches are shared with the
+        returned forest.
+
+        Args:
+            forest (tuple[AbstractPowerSupplySystemTree, ...]): the forest
+                generated by `gen_forest(truth_table)`
+            delta (dict[str, bool]): the new states of the toggled switches
+            truth_table (dict[str, bool] | None, optional): the truth table
+                `forest` was generated with. Defaults to None.
+
+        Returns:
+            tuple[AbstractPowerSupplySystemTree, ...]: a forest equal to
+                `gen_forest({**truth_table, **delta})`, `forest` is not modified
+
+        Throws:
+            NoSuchDevice: if a device in truth table or delta doesn't exist
+            ChargePowerSupply: as `gen_forest` does
+        """
+        return self.compile().update_forest(forest, delta, truth_table)
 
     def find_passages(
         self,
         destinations: Iterable[tuple[str, int] | ThinPort],
         truth_table: dict[str, bool] | None = None,
+        search: Literal["forward", "backward"] = "forward",
     ) -> dict[str, list[tuple[ThinPort, ...]]]:
         """find the passages to the given ports
 
         **NOTE! 为了防止反复生成森林， 请一次性传入尽可能多的要查找通路的目标端口**
 
+        The forests are cached by the effective switch states, i.e. the truth
+        table merged with the states of switches, see `forest_cache_info`.
+
+        With `search="backward"`, no forest is generated. The ports that could
+        feed the destinations are searched from the destinations back to the
+        power supplies, then the passages are searched forward from the power
+        supplies reached, only through those ports, see
+        `CompiledGraph.find_passages_backward`. It is much faster when the
+        destinations are a small part of the graph, the passages are the same,
+        but ChargePowerSupply is only raised if it happens on the way to the
+        destinations.
+
         Args:
             destinations (Iterable[tuple[str, int]  |  ThinPort]): as the name
             truth_table (dict[str, bool] | None, optional): the truth table for switchs.
                 Defaults to None.
+            search (Literal["forward", "backward"], optional): search from the
+                power supplies or from the destinations. Defaults to "forward".
 
         Returns:
             dict[str, list[tuple[ThinPort, ...]]]: key is each destination's id,
@@ -237,13 +680,34 @@ class AbstractPowerSupplySystemGraph:
 
 
         """
-        truth_table = truth_table or {}
-        forest = self.gen_forest(truth_table)
-        res: dict[str, list[tuple[ThinPort, ...]]] = {}
-        for to in destinations:
-            if not isinstance(to, ThinPort):
-                to = ThinPort(*to)
-            for tree in forest:
-                if passage := tree.find_passage(to):
-                    res.setdefault(to.id, []).append(passage)
-        return res
+        if self.stats_sink is not None:
+            return self._traced_passages(list(destinations), truth_table, search)
+        if search == "backward":
+            return self.compile().find_passages_backward(destinations, truth_table)
+        forest = self.cached_forest(truth_table)
+        return self.compile().passages(forest, destinations)
+
+    def _traced_passages(
+        self,
+        destinations: list[tuple[str, int] | ThinPort],
+        truth_table: dict[str, bool] | None,
+        search: Literal["forward", "backward"],
+    ) -> dict[str, list[tuple[ThinPort, ...]]]:
+        """`find_passages` with `stats_sink`"""
+        stats = SearchStats(
+            "find_passages_backward" if search == "backward" else "find_passages",
+            destinations=len(destinations),
+        )
+
+        def find() -> dict[str, list[tuple[ThinPort, ...]]]:
+            compiled = self.compile()
+            if search == "backward":
+                res = compiled.find_passages_backward(destinations, truth_table, stats)
+            else:
+                res = compiled.passages(
+                    self.cached_forest(truth_table, stats), destinations
+                )
+            stats.passages = sum(map(len, res.values()))
+            return res
+
+        return self._traced(stats, find)
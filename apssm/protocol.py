@@ -0,0 +1,59 @@
+from typing import Any, Collection
+
+
+def check_request(
+    request: Any, fields: Collection[str], required: Collection[str] = ()
+) -> dict[str, Any]:
+    """check the shape of a JSON request of `apssm.cli` or `apssm.server`,
+    before any of it is used
+
+    The known fields are:
+
+        truth_table   {switch: bool}
+        destinations  [[device, index], ...]
+        search        "forward" or "backward"
+        id            anything
+
+    Args:
+        request (Any): the decoded request
+        fields (Collection[str]): the fields allowed
+        required (Collection[str], optional): the fields required. Defaults to
+            ().
+
+    Returns:
+        dict[str, Any]: the request
+
+    Throws:
+        TypeError: if the request isn't an object
+        ValueError: if the request has a field not allowed or missing, or a
+            field of the wrong type
+    """
+    if not isinstance(request, dict):
+        raise TypeError("a request must be an object")
+    if unknown := request.keys() - set(fields):
+        raise ValueError(f"unknown fields: {', '.join(sorted(map(str, unknown)))}")
+    if missing := [field for field in required if field not in request]:
+        raise ValueError(f"missing fields: {', '.join(missing)}")
+
+    truth_table = request.get("truth_table")
+    if truth_table is not None and not (
+        isinstance(truth_table, dict)
+        and all(isinstance(state, bool) for state in truth_table.values())
+    ):
+        raise ValueError("truth_table must be an object of switch names to booleans")
+    destinations = request.get("destinations")
+    if destinations is not None and not (
+        isinstance(destinations, list)
+        and all(
+            isinstance(to, list)
+            and len(to) == 2
+            and isinstance(to[0], str)
+            and isinstance(to[1], int)
+            and not isinstance(to[1], bool)
+            for to in destinations
+        )
+    ):
+        raise ValueError("destinations must be a list of [device, index]")
+    if request.get("search", "forward") not in ("forward", "backward"):
+        raise ValueError(f"invalid search: {request['search']}")
+    return request
@@ -0,0 +1,243 @@
+import json
+import os
+import socketserver
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Callable
+
+from loguru import logger
+
+from apssm.exceptions import ChargePowerSupply, NoPowerSupplies, NoSuchDevice
+from apssm.graph import AbstractPowerSupplySystemGraph
+from apssm.protocol import check_request
+
+
+def _gen_forest(
+    graph: AbstractPowerSupplySystemGraph, request: dict[str, Any]
+) -> dict[str, Any]:
+    forest = graph.cached_forest(request.get("truth_table"))
+    port_ids = graph.compile().port_ids
+    return {
+        "forest": [
+            {
+                "ports": [port_ids[port] for port in tree.ports],
+                "parents": list(tree.parents),
+            }
+            for tree in forest
+        ]
+    }
+
+
+def _find_passages(
+    graph: AbstractPowerSupplySystemGraph, request: dict[str, Any]
+) -> dict[str, Any]:
+    return {
+        "passages": graph.find_passages(
+            map(tuple, request["destinations"]),
+            request.get("truth_table"),
+            request.get("search", "forward"),
+        )
+    }
+
+
+def _energized_loads(
+    graph: AbstractPowerSupplySystemGraph, request: dict[str, Any]
+) -> dict[str, Any]:
+    return {"energized_loads": graph.energized_loads(request.get("truth_table"))}
+
+
+def _validate(
+    graph: AbstractPowerSupplySystemGraph, request: dict[str, Any]
+) -> dict[str, Any]:
+    return {"charge": graph.validate(request.get("truth_table"))}
+
+
+# path to the query, its fields and its required fields, see `check_request`
+QUERIES: dict[
+    str,
+    tuple[
+        Callable[[AbstractPowerSupplySystemGraph, dict[str, Any]], dict[str, Any]],
+        tuple[str, ...],
+        tuple[str, ...],
+    ],
+] = {
+    "/gen_forest": (_gen_forest, ("truth_table",), ()),
+    "/find_passages": (
+        _find_passages,
+        ("destinations", "truth_table", "search"),
+        ("destinations",),
+    ),
+    "/energized_loads": (_energized_loads, ("truth_table",), ()),
+    "/validate": (_validate, ("truth_table",), ()),
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    POST a JSON object to the path of a query, the keys are the arguments of
+    the method of `AbstractPowerSupplySystemGraph` with the same name:
+
+        /gen_forest       truth_table, the forest is returned as the ports and
+                          parents of each tree, see
+                          `AbstractPowerSupplySystemTree`
+        /find_passages    destinations, truth_table, search
+        /energized_loads  truth_table
+        /validate         truth_table
+
+    A query returns an object with the result under the name of its return
+    value, or `charge` for ChargePowerSupply, status 400 with `error` for an
+    invalid request, e.g. an unknown or ill-typed field, see
+    `apssm.protocol.check_request`. GET /cache_info returns the statistics of
+    the forest cache.
+    """
+
+    server: "QueryServer | UnixQueryServer"
+
+    def do_GET(self) -> None:
+        if self.path == "/cache_info":
+            self._respond(200, self.server.graph.forest_cache_info()._asdict())
+        else:
+            self._respond(404, {"error": f"no such query: {self.path}"})
+
+    def do_POST(self) -> None:
+        if self.path not in QUERIES:
+            self._respond(404, {"error": f"no such query: {self.path}"})
+            return
+        query, fields, required = QUERIES[self.path]
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = check_request(
+                json.loads(self.rfile.read(length) or b"{}"), fields, required
+            )
+        except (TypeError, ValueError) as e:
+            self._respond(400, {"error": f"{type(e).__name__}: {e}"})
+            return
+        try:
+            response = query(self.server.graph, request)
+        except ChargePowerSupply as e:
+            self._respond(200, {"charge": [e.from_.name, e.to.name]})
+        except (NoSuchDevice, NoPowerSupplies) as e:
+            self._respond(400, {"error": f"{type(e).__name__}: {e}"})
+        else:
+            self._respond(200, response)
+
+    def _respond(self, status: int, body: dict[str, Any]) -> None:
+        content = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # the client address of a Unix socket is empty
+        logger.debug(format % args)
+
+
+class _PoolMixIn:
+    """handle each request in a bounded pool of threads, instead of a thread
+    per request as `socketserver.ThreadingMixIn`
+
+    The searches are pure Python, so the threads only interleave the requests
+    under the GIL: a slow search doesn't block the others from being read and
+    answered, but the searches don't run in parallel. Run a server per core,
+    e.g. behind a load balancer, or `apssm batch --workers` for throughput.
+    """
+
+    graph: AbstractPowerSupplySystemGraph
+    executor: ThreadPoolExecutor
+
+    def process_request(self, request, client_address) -> None:
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)  # type: ignore
+        except Exception:
+            self.handle_error(request, client_address)  # type: ignore
+        finally:
+            self.shutdown_request(request)  # type: ignore
+
+    def server_close(self) -> None:
+        super().server_close()  # type: ignore
+        self.executor.shutdown(wait=True)
+
+
+class QueryServer(_PoolMixIn, HTTPServer):
+    """serve the queries of `_Handler` on TCP"""
+
+    def __init__(
+        self,
+        graph: AbstractPowerSupplySystemGraph,
+        address: tuple[str, int],
+        workers: int | None = None,
+    ) -> None:
+        self.graph = graph
+        self.executor = ThreadPoolExecutor(workers)
+        super().__init__(address, _Handler)
+
+
+class UnixQueryServer(_PoolMixIn, socketserver.UnixStreamServer):
+    """serve the queries of `_Handler` on a Unix socket"""
+
+    def __init__(
+        self,
+        graph: AbstractPowerSupplySystemGraph,
+        address: str,
+        workers: int | None = None,
+    ) -> None:
+        """
+        Throws:
+            FileExistsError: if `address` exists and isn't a socket, e.g. a
+                socket left by a previous server is removed, but not a file
+        """
+        try:
+            mode = os.lstat(address).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise FileExistsError(f"not a socket: {address}")
+            os.unlink(address)
+        self.graph = graph
+        self.executor = ThreadPoolExecutor(workers)
+        super().__init__(address, _Handler)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.server_address):  # type: ignore
+            os.unlink(self.server_address)  # type: ignore
+
+
+def make_server(
+    graph: AbstractPowerSupplySystemGraph,
+    address: tuple[str, int] | str,
+    workers: int | None = None,
+) -> QueryServer | UnixQueryServer:
+    """make a server of JSON queries on the graph, see `_Handler` for the
+    protocol
+
+    The graph is compiled once, when the server is made, and the forests are
+    cached by the forest cache of the graph, shared by all the requests. The
+    requests are handled by a pool of threads, which don't search in parallel,
+    see `_PoolMixIn`.
+
+    Args:
+        graph (AbstractPowerSupplySystemGraph): the graph, it must not be
+            modified while serving
+        address (tuple[str, int] | str): (host, port) for TCP, or the path of
+            a Unix socket
+        workers (int | None, optional): number of threads. Defaults to the
+            default of ThreadPoolExecutor.
+
+    Returns:
+        QueryServer | UnixQueryServer: the server, call `serve_forever`
+
+    Throws:
+        FileExistsError: if the path of a Unix socket exists and isn't a socket
+    """
+    graph.compile()
+    if isinstance(address, str):
+        return UnixQueryServer(graph, address, workers)
+    return QueryServer(graph, address, workers)
@@ -0,0 +1,304 @@
+import mmap
+import os
+import pickle
+import struct
+from array import array
+from itertools import islice
+from typing import Any
+
+from apssm.buffer import BYTE_ORDER, SectionReader, write_section
+from apssm.compiled import CompiledGraph, DeviceKind, PortTables, device_kind
+from apssm.devices.bus import Bus
+from apssm.devices.dc_dc import DcDc
+from apssm.devices.diode import Diode
+from apssm.devices.load import Load
+from apssm.devices.power_supply import PowerSupply
+from apssm.devices.switch import Switch
+from apssm.graph import AbstractPowerSupplySystemGraph
+from apssm.stats import StatsSink
+from apssm.typing import DeviceType
+
+MAGIC = b"APSSMSNP"
+FORMAT_VERSION = 2
+
+# magic, format version, byte order (0 little, 1 big), number of devices,
+# ports, edges, size of names and size of pickled extras
+_HEADER = struct.Struct("<8sHBxxxxxQQQQQ")
+
+_DEVICE_TYPES: dict[int, type] = {
+    DeviceKind.POWER_SUPPLY: PowerSupply,
+    DeviceKind.SWITCH: Switch,
+    DeviceKind.DC_DC: DcDc,
+    DeviceKind.BUS: Bus,
+    DeviceKind.LOAD: Load,
+    DeviceKind.DIODE: Diode,
+}
+
+
+class Snapshot:
+    """
+    The content of a snapshot file, the integer sections are memoryviews on the
+    memory-mapped file, so they are neither parsed nor copied, and processes
+    loading the same file share its pages.
+
+    Sections, each aligned to 8 bytes:
+
+        header
+        kinds           uint8[devices]      DeviceKind of each device
+        states          uint8[devices]      whether each switch is on
+        name_offsets    int64[devices + 1]  offsets of the names of devices
+        names           utf-8               all names joined
+        offsets         int64[ports + 1]    CSR offsets of the compiled graph
+        neighbors       int64[2 * edges]    CSR neighbors of the compiled graph
+        neighbor_edges  int64[2 * edges]    the edge of each neighbor
+        edges           int64[2 * edges]    both ports of each edge, in the
+                                            order the edges were added
+        extras          pickle              extras of each edge, empty if all
+                                            extras are None
+        port_numbers    int64[ports]        the tables of `port_tables`, so
+        port_kinds      uint8[ports]        they are copied, not derived from
+        partners        int64[ports]        the devices
+        base_links      uint8[ports]
+        cathodes        uint8[ports]
+        roots           int64[power supplies]
+        switch_ports    int64[switches]
+
+    Attributes:
+        devices (list[DeviceType]): the devices, newly created for each load
+        offsets (memoryview): CSR offsets
+        neighbors (memoryview): CSR neighbors
+        neighbor_edges (memoryview): edge of each neighbor
+        edges (memoryview): ports of edge `i` are `edges[2 * i]` and
+            `edges[2 * i + 1]`
+        edge_extras (list[Any]): extras of each edge
+        tables (PortTables): the per port tables of the compiled graph
+    """
+
+    devices: list[DeviceType]
+    offsets: memoryview
+    neighbors: memoryview
+    neighbor_edges: memoryview
+    edges: memoryview
+    edge_extras: list[Any]
+    tables: PortTables
+
+    def __init__(self, buffer: memoryview) -> None:
+        """
+        Args:
+            buffer (memoryview): the bytes of a snapshot file
+
+        Throws:
+            ValueError: if the buffer is not a snapshot of this format version
+        """
+        if len(buffer) < _HEADER.size:
+            raise ValueError("not an apssm snapshot")
+        (
+            magic,
+            version,
+            byte_order,
+            n_devices,
+            n_ports,
+            n_edges,
+            names_size,
+            extras_size,
+        ) = _HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError("not an apssm snapshot")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"unsupported snapshot format version: {version}")
+
+        reader = SectionReader(buffer, _HEADER.size, byte_order)
+        kinds = reader.take(n_devices)
+        states = reader.take(n_devices)
+        name_offsets = reader.take_ints(n_devices + 1)
+        names = reader.take(names_size)
+        self.offsets = reader.take_ints(n_ports + 1)  # type: ignore
+        self.neighbors = reader.take_ints(2 * n_edges)  # type: ignore
+        self.neighbor_edges = reader.take_ints(2 * n_edges)  # type: ignore
+        self.edges = reader.take_ints(2 * n_edges)  # type: ignore
+        extras = reader.take(extras_size)
+        self.edge_extras = pickle.loads(extras) if extras_size else [None] * n_edges
+        port_numbers = _int_array(reader.take_ints(n_ports))
+        port_kinds = bytes(reader.take(n_ports))
+        partners = _int_array(reader.take_ints(n_ports))
+        base_links = bytes(reader.take(n_ports))
+        cathodes = bytes(reader.take(n_ports))
+        roots = tuple(reader.take_ints(kinds.tobytes().count(DeviceKind.POWER_SUPPLY)))
+        switch_ports = tuple(reader.take_ints(kinds.tobytes().count(DeviceKind.SWITCH)))
+        self.tables = PortTables(
+            port_numbers,
+            port_kinds,
+            partners,
+            base_links,
+            cathodes,
+            roots,
+            switch_ports,
+        )
+
+        if unknown := set(kinds) - _DEVICE_TYPES.keys():
+            raise ValueError(f"unknown device kind in snapshot: {min(unknown)}")
+        text = str(names, "utf-8")
+        bounds = zip(name_offsets, islice(name_offsets, 1, None))
+        if len(text) == len(names):
+            # ascii only, the offsets of bytes are those of characters
+            device_names = [text[begin:end] for begin, end in bounds]
+        else:
+            device_names = [str(names[begin:end], "utf-8") for begin, end in bounds]
+        self.devices = [
+            (
+                Switch(name, on=bool(state))
+                if kind == DeviceKind.SWITCH
+                else _DEVICE_TYPES[kind](name)
+            )
+            for kind, state, name in zip(kinds, states, device_names)
+        ]
+
+    def compiled(self) -> CompiledGraph:
+        """the compiled graph, whose adjacency is backed by the snapshot"""
+        edge_extras = self.edge_extras
+        if any(extras is not None for extras in edge_extras):
+            extras = [edge_extras[edge] for edge in self.neighbor_edges]
+        else:
+            extras = [None] * len(self.neighbors)
+        return CompiledGraph(
+            self.devices, self.offsets, self.neighbors, extras, self.tables
+        )
+
+    def graph(
+        self, forest_cache_size: int = 128, stats_sink: StatsSink | None = None
+    ) -> AbstractPowerSupplySystemGraph:
+        """the graph, whose compiled graph is the one backed by the snapshot
+
+        Args:
+            forest_cache_size (int, optional): see
+                `AbstractPowerSupplySystemGraph.__init__`. Defaults to 128.
+            stats_sink (StatsSink | None, optional): see
+                `AbstractPowerSupplySystemGraph.__init__`. Defaults to None.
+        """
+        edges = self.edges
+        return AbstractPowerSupplySystemGraph.from_compiled(
+            self.compiled(),
+            zip(edges[::2], edges[1::2], self.edge_extras),
+            forest_cache_size,
+            stats_sink,
+        )
+
+
+def _int_array(ints: memoryview | array) -> array:
+    """copy int64s of a section into an array"""
+    if isinstance(ints, array):
+        return ints
+    copied = array("q")
+    copied.frombytes(ints.cast("B"))
+    return copied
+
+
+def save(graph: AbstractPowerSupplySystemGraph, file: str | os.PathLike) -> None:
+    """write the graph to a snapshot file
+
+    The states of switches are saved as the defaults of the loaded graph.
+
+    Args:
+        graph (AbstractPowerSupplySystemGraph): the graph
+        file (str | os.PathLike): path of the snapshot file
+
+    Throws:
+        TypeError: if an extras can't be pickled
+    """
+    compiled = graph.compile()
+    port_lookup = {port_id: i for i, port_id in enumerate(compiled.port_ids)}
+    edges = array("q")
+    edge_extras: list[Any] = []
+    for edge in graph.edges:
+        edges.append(port_lookup[edge.first.id])
+        edges.append(port_lookup[edge.second.id])
+        edge_extras.append(edge.extras)
+    # the edge of each neighbor: the adjacency of a port lists its edges in the
+    # order they were added, a self loop is listed twice
+    positions = array("q", compiled.offsets[:-1])
+    neighbor_edges = array("q", bytes(8 * len(compiled.neighbors)))
+    for edge, (first, second) in enumerate(zip(edges[::2], edges[1::2])):
+        neighbor_edges[positions[first]] = edge
+        positions[first] += 1
+        neighbor_edges[positions[second]] = edge
+        positions[second] += 1
+
+    name_offsets = array("q", [0])
+    names = bytearray()
+    for device in compiled.devices:
+        names += device.name.encode("utf-8")
+        name_offsets.append(len(names))
+    extras = (
+        pickle.dumps(edge_extras, pickle.HIGHEST_PROTOCOL)
+        if any(extras is not None for extras in edge_extras)
+        else b""
+    )
+
+    with open(file, "wb") as f:
+        f.write(
+            _HEADER.pack(
+                MAGIC,
+                FORMAT_VERSION,
+                BYTE_ORDER,
+                len(compiled.devices),
+                len(compiled.port_ids),
+                len(graph.edges),
+                len(names),
+                len(extras),
+            )
+        )
+        write_section(f, bytes(device_kind(device) for device in compiled.devices))
+        write_section(
+            f,
+            bytes(
+                isinstance(device, Switch) and device.on for device in compiled.devices
+            ),
+        )
+        write_section(f, name_offsets)
+        write_section(f, names)
+        write_section(f, compiled.offsets)
+        write_section(f, compiled.neighbors)
+        write_section(f, neighbor_edges)
+        write_section(f, edges)
+        write_section(f, extras)
+        write_section(f, compiled.port_numbers)
+        write_section(f, compiled.kinds)
+        write_section(f, compiled.partners)
+        write_section(f, compiled.base_links)
+        write_section(f, compiled.cathodes)
+        write_section(f, array("q", compiled.roots))
+        write_section(f, array("q", compiled.switch_ports))
+
+
+def open_snapshot(file: str | os.PathLike) -> Snapshot:
+    """memory-map a snapshot file
+
+    Args:
+        file (str | os.PathLike): path of the snapshot file
+
+    Returns:
+        Snapshot: the snapshot, the file is mapped as long as it's referenced
+
+    Throws:
+        ValueError: if the file is not a snapshot of this format version
+    """
+    with open(file, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            raise ValueError("not an apssm snapshot")
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return Snapshot(memoryview(buffer))
+
+
+def load(file: str | os.PathLike) -> CompiledGraph:
+    """load the compiled graph of a snapshot file, see `open_snapshot`"""
+    return open_snapshot(file).compiled()
+
+
+def load_graph(
+    file: str | os.PathLike,
+    forest_cache_size: int = 128,
+    stats_sink: StatsSink | None = None,
+) -> AbstractPowerSupplySystemGraph:
+    """load the graph of a snapshot file, see `open_snapshot`"""
+    return open_snapshot(file).graph(forest_cache_size, stats_sink)
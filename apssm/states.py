@@ -0,0 +1,115 @@
+from typing import Iterator, NamedTuple, Sequence
+
+from apssm.compiled import CompiledGraph, DeviceKind
+from apssm.energize import energize
+from apssm.exceptions import ChargePowerSupply, NoPowerSupplies, NoSuchDevice
+from apssm.graph import AbstractPowerSupplySystemGraph
+
+
+class LegalState(NamedTuple):
+    """a truth table without `ChargePowerSupply`, and its energized loads as
+    `AbstractPowerSupplySystemGraph.energized_loads`"""
+
+    truth_table: dict[str, bool]
+    energized_loads: dict[str, list[str]]
+
+
+def legal_states(
+    graph: AbstractPowerSupplySystemGraph | CompiledGraph,
+    switches: Sequence[str] | None = None,
+    truth_table: dict[str, bool] | None = None,
+) -> Iterator[LegalState]:
+    """enumerate every state of `switches` and find the legal ones
+
+    The 2 ** len(switches) states are walked in Gray code order, starting from
+    all switches open, so consecutive states differ by one switch. The ports
+    reached from each power supply only depend on the switches whose ports are
+    reached, so when a switch flips, only the power supplies reaching it are
+    searched again, and a power supply charging another one is searched again
+    on each flip. Nothing is kept but the current state, so memory doesn't grow
+    with the number of states, but time does: keep `switches` to a small
+    subsystem, say 20 switches.
+
+    Args:
+        graph (AbstractPowerSupplySystemGraph | CompiledGraph): the graph
+        switches (Sequence[str] | None, optional): the switches to enumerate.
+            Defaults to all switches.
+        truth_table (dict[str, bool] | None, optional): the states of the
+            other switches, those not in it use their own state. Defaults to
+            None.
+
+    Yields:
+        LegalState: each legal state, its truth table has the states of
+            `switches` only
+
+    Throws:
+        NoSuchDevice: if a device in switches or truth table doesn't exist
+        ValueError: if a device in switches is not a switch
+        NoPowerSupplies: if there are no power supplies
+    """
+    compiled = graph if isinstance(graph, CompiledGraph) else graph.compile()
+    links = compiled.links(truth_table)
+    if not compiled.roots:
+        raise NoPowerSupplies()
+    if switches is None:
+        switches = [compiled.port_devices[port].name for port in compiled.switch_ports]
+    else:
+        switches = list(dict.fromkeys(switches))
+        for name in switches:
+            if name not in compiled.device_lookup:
+                raise NoSuchDevice(name)
+            if name not in compiled.switch_lookup:
+                raise ValueError(f"not a switch: {name}")
+    ports = [compiled.switch_lookup[name] for name in switches]
+    for port in ports:
+        links[port] = links[port + 1] = 0
+
+    roots = compiled.roots
+    root_names = [compiled.port_devices[root].name for root in roots]
+    load_names = {
+        port: compiled.port_devices[port].name
+        for port, kind in enumerate(compiled.kinds)
+        if kind == DeviceKind.LOAD
+    }
+    # for each root, the energized loads, or None if it charges a power supply,
+    # and the switches reached, i.e. those which could change its ports
+    root_loads: list[tuple[int, ...] | None] = [None] * len(roots)
+    root_switches: list[frozenset[int]] = [frozenset()] * len(roots)
+    all_switches = frozenset(range(len(ports)))
+
+    def search(i: int) -> None:
+        try:
+            energized = energize(compiled, roots[i], links)
+        except ChargePowerSupply:
+            root_loads[i] = None
+            root_switches[i] = all_switches
+        else:
+            root_loads[i] = tuple(port for port in load_names if energized[port])
+            root_switches[i] = frozenset(
+                j
+                for j, port in enumerate(ports)
+                if energized[port] or energized[port + 1]
+            )
+
+    for i in range(len(roots)):
+        search(i)
+    states = [False] * len(ports)
+    for step in range(1 << len(ports)):
+        if step:
+            # the lowest set bit of the step is the switch flipping
+            j = (step & -step).bit_length() - 1
+            states[j] = not states[j]
+            links[ports[j]] = links[ports[j] + 1] = states[j]
+            for i in range(len(roots)):
+                if j in root_switches[i]:
+                    search(i)
+        if any(loads is None for loads in root_loads):
+            continue
+        feeders: dict[int, list[str]] = {}
+        for name, loads in zip(root_names, root_loads):
+            for load in loads:  # type: ignore
+                feeders.setdefault(load, []).append(name)
+        yield LegalState(
+            dict(zip(switches, states)),
+            {load_names[load]: feeders[load] for load in sorted(feeders)},
+        )
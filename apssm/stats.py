@@ -0,0 +1,77 @@
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Literal
+
+
+@dataclass
+class TreeStats:
+    """the search of the tree of a power supply"""
+
+    # name of the power supply
+    root: str
+    # nodes of the tree
+    ports: int = 0
+    # nodes searched, the others are copied from the trees before, see
+    # `CompiledGraph.gen_forest_with`
+    searched: int = 0
+    # adjacent ports scanned by the search
+    edges: int = 0
+    # cathodes of diodes not entered, since they are only entered from their
+    # diode
+    diode_cutoffs: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class SearchStats:
+    """
+    The statistics of a `gen_forest` or `find_passages` call, collected if the
+    graph has a `stats_sink`, see `AbstractPowerSupplySystemGraph`.
+    """
+
+    operation: Literal["gen_forest", "find_passages", "find_passages_backward"]
+    seconds: float = 0.0
+    # the trees searched, in the order of the power supplies, none if the
+    # forest is a hit of the forest cache, only the power supplies reaching
+    # the destinations for "find_passages_backward"
+    trees: list[TreeStats] = field(default_factory=list)
+    # whether the forest is a hit of the forest cache, None if it isn't looked
+    # up
+    cache_hit: bool | None = None
+    # bytes allocated by the columns of the trees searched
+    forest_bytes: int = 0
+    # ports reached by the backward search from the destinations
+    backward_ports: int = 0
+    destinations: int = 0
+    passages: int = 0
+    # the names of the power supplies, if ChargePowerSupply is raised
+    charge: tuple[str, str] | None = None
+
+    def largest(self) -> TreeStats | None:
+        """the tree with the most nodes, None if no tree is searched"""
+        return max(self.trees, key=lambda tree: tree.ports, default=None)
+
+    def metrics(self) -> dict[str, float]:
+        """the totals as flat numbers, for a metrics sink, e.g. gauges or
+        histograms named `apssm.<operation>.<key>`"""
+        return {
+            "seconds": self.seconds,
+            "trees": len(self.trees),
+            "ports": sum(tree.ports for tree in self.trees),
+            "searched": sum(tree.searched for tree in self.trees),
+            "edges": sum(tree.edges for tree in self.trees),
+            "diode_cutoffs": sum(tree.diode_cutoffs for tree in self.trees),
+            "max_tree_ports": max((tree.ports for tree in self.trees), default=0),
+            "cache_hit": float(bool(self.cache_hit)),
+            "forest_bytes": self.forest_bytes,
+            "backward_ports": self.backward_ports,
+            "destinations": self.destinations,
+            "passages": self.passages,
+            "charge": float(self.charge is not None),
+        }
+
+    def to_dict(self) -> dict[str, Any]:
+        """all the statistics, the trees included, as JSON compatible values"""
+        return asdict(self)
+
+
+StatsSink = Callable[[SearchStats], None]
@@ -0,0 +1,246 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Generic,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Sequence,
+    TypeVar,
+)
+
+from apssm.compiled import CompiledGraph
+from apssm.exceptions import ChargePowerSupply, NoPowerSupplies
+from apssm.graph import AbstractPowerSupplySystemGraph
+from apssm.thin_port import ThinPort
+
+Scenario = dict[str, bool] | Sequence[bool]
+
+
+class SweepResult(NamedTuple):
+    """result of a scenario, either `passages` or `charge` is None"""
+
+    passages: dict[str, list[tuple[ThinPort, ...]]] | None
+    charge: ChargePowerSupply | None
+
+
+class _Topology(NamedTuple):
+    compiled: CompiledGraph
+    destinations: tuple[ThinPort, ...]
+    switches: tuple[str, ...] | None
+    defaults: bytearray
+
+
+T = TypeVar("T")
+C = TypeVar("C")
+R = TypeVar("R")
+
+# the topology of a worker process, set once by `_init_worker`
+_topology: Any = None
+
+
+def _init_worker(topology: Any) -> None:
+    global _topology
+    _topology = topology
+
+
+def _evaluate_in_worker(evaluate: Callable[[Any, C], R], chunk: C) -> R:
+    return evaluate(_topology, chunk)
+
+
+class ChunkPool(Generic[T]):
+    """
+    A pool of processes evaluating chunks of work on the same topology.
+
+    `topology` is sent to each worker once, when it starts, after that only
+    the chunks and their results are transferred, so several batches of chunks,
+    e.g. one depending on the results of the other, are mapped by the same
+    workers. With 1 worker or less, the chunks are evaluated in the current
+    process.
+
+    Attributes:
+        topology (T): the data shared by all chunks
+        workers (int): number of processes
+    """
+
+    topology: T
+    workers: int
+    _executor: ProcessPoolExecutor | None
+
+    def __init__(self, topology: T, workers: int | None = None) -> None:
+        """
+        Args:
+            topology (T): the data shared by all chunks
+            workers (int | None, optional): number of processes, evaluate in the
+                current process if it is 1 or less. Defaults to the number of
+                CPUs.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.topology = topology
+        self.workers = workers
+        self._executor = None
+        if self.workers > 1:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(topology,),
+            )
+
+    def map(self, evaluate: Callable[[T, C], R], chunks: Iterable[C]) -> Iterator[R]:
+        """evaluate chunks of work, see `map_chunks`
+
+        Args:
+            evaluate (Callable[[T, C], R]): a module level function, evaluates a
+                chunk with the topology
+            chunks (Iterable[C]): the chunks
+
+        Yields:
+            R: the result of each chunk
+        """
+        executor = self._executor
+        if executor is None:
+            for chunk in chunks:
+                yield evaluate(self.topology, chunk)
+            return
+
+        pending: deque[Future] = deque()
+        try:
+            for chunk in chunks:
+                pending.append(executor.submit(_evaluate_in_worker, evaluate, chunk))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def close(self) -> None:
+        """wait for the chunks in flight and stop the workers"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "ChunkPool[T]":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+def map_chunks(
+    evaluate: Callable[[T, C], R],
+    topology: T,
+    chunks: Iterable[C],
+    workers: int | None = None,
+) -> Iterator[R]:
+    """evaluate chunks of work with a pool of processes
+
+    `topology` is sent to each worker once, when it starts, after that only
+    the chunks and their results are transferred. Chunks are consumed lazily,
+    at most 2 chunks per worker are in flight, and the results are yielded in
+    the order of chunks. See `ChunkPool` to map several batches of chunks with
+    the same workers.
+
+    Args:
+        evaluate (Callable[[T, C], R]): a module level function, evaluates a
+            chunk with the topology
+        topology (T): the data shared by all chunks
+        chunks (Iterable[C]): the chunks
+        workers (int | None, optional): number of processes, evaluate in the
+            current process if it is 1 or less. Defaults to the number of CPUs.
+
+    Yields:
+        R: the result of each chunk
+    """
+    with ChunkPool(topology, workers) as pool:
+        yield from pool.map(evaluate, chunks)
+
+
+def _evaluate(
+    topology: _Topology, chunk: list[Scenario]
+) -> list[tuple[dict | None, tuple[str, str] | None]]:
+    compiled, destinations, switches, defaults = topology
+    results: list[tuple[dict | None, tuple[str, str] | None]] = []
+    for links in compiled.iter_links(chunk, switches, defaults):  # type: ignore
+        try:
+            forest = compiled.gen_forest_with(links)
+        except ChargePowerSupply as e:
+            # the exception can't be unpickled, send the names back
+            results.append((None, (e.from_.name, e.to.name)))
+        else:
+            results.append((compiled.passages(forest, destinations), None))
+    return results
+
+
+def sweep(
+    graph: AbstractPowerSupplySystemGraph | CompiledGraph,
+    scenarios: Iterable[dict[str, bool]] | Iterable[Sequence[bool]],
+    destinations: Iterable[tuple[str, int] | ThinPort],
+    switches: Sequence[str] | None = None,
+    workers: int | None = None,
+    chunk_size: int = 64,
+) -> Iterator[SweepResult]:
+    """find passages of many scenarios with a pool of processes
+
+    The compiled topology is sent to each worker once, when it starts, after
+    that only chunks of scenarios and their results are transferred. Scenarios
+    are consumed lazily, at most 2 chunks per worker are in flight, and the
+    results are yielded in the order of scenarios.
+
+    The states of switches are read once, when the sweep starts.
+
+    Args:
+        graph (AbstractPowerSupplySystemGraph | CompiledGraph): the graph
+        scenarios: truth tables, or if `switches` is given, rows of a
+            scenarios × switches boolean matrix
+        destinations (Iterable[tuple[str, int] | ThinPort]): as
+            `AbstractPowerSupplySystemGraph.find_passages`
+        switches (Sequence[str] | None, optional): the switch of each column.
+            Defaults to None.
+        workers (int | None, optional): number of processes, evaluate in the
+            current process if it is 1 or less. Defaults to the number of CPUs.
+        chunk_size (int, optional): number of scenarios sent to a worker at a
+            time. Defaults to 64.
+
+    Yields:
+        SweepResult: the result of each scenario
+
+    Throws:
+        NoPowerSupplies: if there are no power supplies
+        NoSuchDevice: if a device in truth tables or switches doesn't exist
+    """
+    compiled = graph if isinstance(graph, CompiledGraph) else graph.compile()
+    if not compiled.roots:
+        raise NoPowerSupplies()
+    if switches is not None:
+        switches = tuple(switches)
+        compiled.validate_names(dict.fromkeys(switches))
+    topology = _Topology(
+        compiled,
+        tuple(to if isinstance(to, ThinPort) else ThinPort(*to) for to in destinations),
+        switches,  # type: ignore
+        compiled.default_links(),
+    )
+
+    def chunks() -> Iterator[list[Scenario]]:
+        it = iter(scenarios)
+        while chunk := list(islice(it, chunk_size)):
+            if switches is None:
+                for truth_table in chunk:
+                    compiled.validate_names(truth_table)  # type: ignore
+            yield chunk  # type: ignore
+
+    for results in map_chunks(_evaluate, topology, chunks(), workers):
+        for passages, charge in results:
+            if charge:
+                from_, to = (
+                    compiled.devices[compiled.device_lookup[name]] for name in charge
+                )
+                yield SweepResult(None, ChargePowerSupply(from_, to))  # type: ignore
+            else:
+                yield SweepResult(passages, None)
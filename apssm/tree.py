@@ -1,8 +1,15 @@
-from dataclasses import dataclass
-from typing import Any, NamedTuple, Optional, TypeVar
+import io
+import pickle
+import struct
+from array import array
+from dataclasses import dataclass, field
+from functools import cached_property
+from itertools import islice
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional, Sequence, TypeVar
 
 from loguru import logger
 
+from apssm.buffer import BYTE_ORDER, SectionReader, int64s, write_section
 from apssm.devices.bus import Bus
 from apssm.devices.dc_dc import DcDc
 from apssm.devices.diode import Diode
@@ -12,10 +19,25 @@ from apssm.devices.switch import Switch
 from apssm.thin_port import ThinPort
 from apssm.typing import DeviceType
 
+if TYPE_CHECKING:
+    from apssm.compiled import CompiledGraph
+
 NT = TypeVar("NT", PowerSupply, Switch, DcDc, Bus, Load, Diode)
 
+TREE_MAGIC = b"APSSMTRE"
+FOREST_MAGIC = b"APSSMFOR"
+FORMAT_VERSION = 1
+
+# magic, format version, byte order (0 little, 1 big), number of ports of the
+# compiled graph, number of nodes and size of pickled extras
+_TREE_HEADER = struct.Struct("<8sHBxxxxxQQQ")
+# magic, format version, byte order, number of trees
+_FOREST_HEADER = struct.Struct("<8sHBxxxxxQ")
+
 
 class DirectedPort:
+    __slots__ = ("children", "device", "edges", "parent", "port_index")
+
     device: DeviceType
     port_index: int
     edges: list["DirectedEdge"]
@@ -70,10 +92,237 @@ class DirectedEdge(NamedTuple):
         return f"{from_} -> {to}"
 
 
-@dataclass
+@dataclass(eq=False)
 class AbstractPowerSupplySystemTree:
-    root: DirectedPort
-    nodes: dict[str, DirectedPort]
+    """
+    A tree rooted at a power supply, stored compactly as columns.
+
+    Node `i` is the `i`th port visited by the search, so node 0 is the root and
+    the subtree of a node is a contiguous range following it. For each node,
+    `ports` is its port in the compiled graph, `parents` is the node of its
+    parent (-1 for the root), and `extras` is the extras of the edge from its
+    parent (None for the root and the links inside a device).
+
+    `root` and `nodes` are built from the columns on first access. A tree of
+    linked DirectedPorts, as built before the columns, is converted by
+    `from_root`. Trees are equal if their nodes are.
+
+    A tree could be exported to a flat buffer by `to_buffer` and imported by
+    `from_buffer`, which is also how a tree is pickled.
+    """
+
+    compiled: "CompiledGraph" = field(repr=False)
+    ports: Sequence[int]
+    parents: Sequence[int]
+    extras: Sequence[Any]
+
+    def __len__(self) -> int:
+        return len(self.ports)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, AbstractPowerSupplySystemTree):
+            return NotImplemented
+        port_ids = self.compiled.port_ids
+        other_port_ids = other.compiled.port_ids
+        return (
+            len(self.ports) == len(other.ports)
+            and all(
+                port_ids[a] == other_port_ids[b]
+                for a, b in zip(self.ports, other.ports)
+            )
+            and list(self.parents) == list(other.parents)
+            and list(self.extras) == list(other.extras)
+        )
+
+    # unhashable, as the dataclass of `root` and `nodes` was
+    __hash__ = None  # type: ignore
+
+    @classmethod
+    def from_root(
+        cls, compiled: "CompiledGraph", root: DirectedPort
+    ) -> "AbstractPowerSupplySystemTree":
+        """convert a tree of linked DirectedPorts, which replaces the former
+        `AbstractPowerSupplySystemTree(root, nodes)`, the nodes being those
+        reached from `root`
+
+        Args:
+            compiled (CompiledGraph): the compiled graph of the ports
+            root (DirectedPort): the root of the tree
+
+        Returns:
+            AbstractPowerSupplySystemTree: the tree
+
+        Throws:
+            ValueError: if a port of the tree isn't in `compiled`
+        """
+        ports: list[int] = []
+        parents: list[int] = []
+        extras: list[Any] = []
+        # (directed port, parent node, extras of the edge from the parent)
+        stack: list[tuple[DirectedPort, int, Any]] = [(root, -1, None)]
+        while stack:
+            directed_port, parent, extra = stack.pop()
+            port = compiled.lookup(
+                (directed_port.device.name, directed_port.port_index)
+            )
+            if port is None:
+                raise ValueError(f"no such port {directed_port.id} in the graph")
+            node = len(ports)
+            ports.append(port)
+            parents.append(parent)
+            extras.append(extra)
+            edges = {id(edge.to): edge.extras for edge in directed_port.edges}
+            for child in directed_port.children:
+                stack.append((child, node, edges.get(id(child))))
+        return cls(compiled, array("q", ports), array("q", parents), extras)
+
+    def __reduce__(self):
+        # the columns instead of the linked DirectedPorts, which may be cached
+        return (type(self).from_buffer, (self.compiled, self.to_buffer()))
+
+    def to_buffer(self) -> bytes:
+        """export the tree to a flat buffer
+
+        Sections, each aligned to 8 bytes:
+
+            header
+            ports    int64[nodes]  the port of each node, the first is the root
+            parents  int64[nodes]  the parent node of each node
+            extras   pickle        the extras of each node, empty if all extras
+                                   are None
+
+        The ports are those of the compiled graph, which is not exported.
+
+        Returns:
+            bytes: the buffer
+        """
+        extras = (
+            pickle.dumps(list(self.extras), pickle.HIGHEST_PROTOCOL)
+            if any(extras is not None for extras in self.extras)
+            else b""
+        )
+        f = io.BytesIO()
+        f.write(
+            _TREE_HEADER.pack(
+                TREE_MAGIC,
+                FORMAT_VERSION,
+                BYTE_ORDER,
+                len(self.compiled.port_ids),
+                len(self.ports),
+                len(extras),
+            )
+        )
+        write_section(f, int64s(self.ports))
+        write_section(f, int64s(self.parents))
+        write_section(f, extras)
+        return f.getvalue()
+
+    @classmethod
+    def from_buffer(
+        cls, compiled: "CompiledGraph", buffer: bytes | bytearray | memoryview
+    ) -> "AbstractPowerSupplySystemTree":
+        """import a tree exported by `to_buffer`
+
+        The ports and parents are memoryviews on `buffer`, they are not copied
+        or parsed, `find_passage` works on them directly.
+
+        Args:
+            compiled (CompiledGraph): the compiled graph of the exported tree,
+                or one of the same topology
+            buffer (bytes | bytearray | memoryview): the buffer
+
+        Returns:
+            AbstractPowerSupplySystemTree: the tree
+
+        Throws:
+            ValueError: if the buffer is not a tree of this format version, or
+                it doesn't match `compiled`
+        """
+        reader = _reader(buffer, _TREE_HEADER, TREE_MAGIC, "tree")
+        _, _, _, n_ports, n_nodes, extras_size = _TREE_HEADER.unpack_from(buffer)
+        if n_ports != len(compiled.port_ids):
+            raise ValueError("the tree doesn't match the compiled graph")
+        ports = reader.take_ints(n_nodes)
+        parents = reader.take_ints(n_nodes)
+        extras = reader.take(extras_size)
+        return cls(
+            compiled,
+            ports,
+            parents,
+            pickle.loads(extras) if extras_size else [None] * n_nodes,
+        )
+
+    @cached_property
+    def last_nodes(self) -> dict[int, int]:
+        """port to its last visited node, which is the one `nodes` keeps"""
+        return dict(zip(self.ports, range(len(self.ports))))
+
+    @cached_property
+    def child_offsets(self) -> array:
+        """CSR offsets of `children`"""
+        offsets = array("q", bytes(8 * (len(self.ports) + 1)))
+        for parent in islice(self.parents, 1, None):
+            offsets[parent + 1] += 1
+        for i in range(1, len(offsets)):
+            offsets[i] += offsets[i - 1]
+        return offsets
+
+    @cached_property
+    def children(self) -> array:
+        """children of the nodes in the order they were found, the children of
+        node `i` are `children[child_offsets[i]:child_offsets[i + 1]]`"""
+        positions = self.child_offsets[:-1]
+        children = array("q", bytes(8 * max(len(self.ports) - 1, 0)))
+        # siblings are visited in the reverse order they were found
+        for node in range(len(self.ports) - 1, 0, -1):
+            parent = self.parents[node]
+            children[positions[parent]] = node
+            positions[parent] += 1
+        return children
+
+    @property
+    def root(self) -> DirectedPort:
+        return self._directed_ports[0]
+
+    @cached_property
+    def nodes(self) -> dict[str, DirectedPort]:
+        port_ids = self.compiled.port_ids
+        return {
+            port_ids[port]: self._directed_ports[node]
+            for port, node in self.last_nodes.items()
+        }
+
+    @cached_property
+    def _directed_ports(self) -> list[DirectedPort]:
+        port_devices = self.compiled.port_devices
+        port_numbers = self.compiled.port_numbers
+        directed_ports = [
+            DirectedPort(device=port_devices[port], port_index=port_numbers[port])
+            for port in self.ports
+        ]
+        for node in range(len(self.ports) - 1, 0, -1):
+            directed_port = directed_ports[node]
+            parent = directed_ports[self.parents[node]]
+            directed_port.parent = parent
+            parent.children.append(directed_port)
+            parent.edges.append(
+                DirectedEdge(from_=parent, to=directed_port, extras=self.extras[node])
+            )
+        return directed_ports
+
+    def passage(self, node: int) -> tuple[ThinPort, ...]:
+        """get the passage from the root to `node`"""
+        port_devices = self.compiled.port_devices
+        port_numbers = self.compiled.port_numbers
+        ports = self.ports
+        parents = self.parents
+        path: list[ThinPort] = []
+        while node >= 0:
+            port = ports[node]
+            path.append(ThinPort(port_devices[port].name, port_numbers[port]))
+            node = parents[node]
+        path.reverse()
+        return tuple(path)
 
     def find_passage(self, to: ThinPort) -> tuple[ThinPort, ...] | None:
         """
@@ -87,13 +336,114 @@ class AbstractPowerSupplySystemTree:
                 from the root to the given ThinPort, or None if there is no path to
                 the given ThinPort.
         """
-        try:
-            node = self.nodes[to.id]
-        except KeyError:
-            logger.debug(f"no such port {to.id} in tree(root: {self.root.id})")
+        port = self.compiled.lookup(to)
+        node = None if port is None else self.last_nodes.get(port)
+        if node is None:
+            # the root is named from the columns, nothing is materialized
+            logger.debug(
+                "no such port {} in tree(root: {})",
+                to.id,
+                self.compiled.port_ids[self.ports[0]],
+            )
             # no path to `to`
             return
-        path: list[ThinPort] = [node.as_thin_port()]
-        while node := node.parent:
-            path.append(node.as_thin_port())
-        return tuple(reversed(path))
+        return self.passage(node)
+
+
+class AbstractPowerSupplySystemForest(tuple[AbstractPowerSupplySystemTree, ...]):
+    """
+    The trees generated from a graph, one tree for each power supply.
+
+    Besides being a tuple of trees, it carries an index from port to the nodes
+    of that port in all the trees, the index is built on first use.
+    """
+
+    def __reduce__(self):
+        if not self:
+            return (type(self), ((),))
+        return (type(self).from_buffer, (self[0].compiled, self.to_buffer()))
+
+    def to_buffer(self) -> bytes:
+        """export the forest to a flat buffer
+
+        The buffer is a header, the sizes of trees as int64 and the buffers of
+        trees, see `AbstractPowerSupplySystemTree.to_buffer`.
+
+        Returns:
+            bytes: the buffer
+        """
+        trees = [tree.to_buffer() for tree in self]
+        f = io.BytesIO()
+        f.write(
+            _FOREST_HEADER.pack(FOREST_MAGIC, FORMAT_VERSION, BYTE_ORDER, len(trees))
+        )
+        write_section(f, array("q", map(len, trees)))
+        for tree in trees:
+            write_section(f, tree)
+        return f.getvalue()
+
+    @classmethod
+    def from_buffer(
+        cls, compiled: "CompiledGraph", buffer: bytes | bytearray | memoryview
+    ) -> "AbstractPowerSupplySystemForest":
+        """import a forest exported by `to_buffer`, the trees are imported
+        without copying, see `AbstractPowerSupplySystemTree.from_buffer`
+
+        Throws:
+            ValueError: if the buffer is not a forest of this format version, or
+                it doesn't match `compiled`
+        """
+        reader = _reader(buffer, _FOREST_HEADER, FOREST_MAGIC, "forest")
+        *_, n_trees = _FOREST_HEADER.unpack_from(buffer)
+        sizes = reader.take_ints(n_trees)
+        return cls(
+            AbstractPowerSupplySystemTree.from_buffer(compiled, reader.take(size))
+            for size in sizes
+        )
+
+    @cached_property
+    def index(self) -> dict[int, list[tuple[AbstractPowerSupplySystemTree, int]]]:
+        """port of compiled graph to (tree, node) of the trees containing it"""
+        index: dict[int, list[tuple[AbstractPowerSupplySystemTree, int]]] = {}
+        for tree in self:
+            for port, node in tree.last_nodes.items():
+                try:
+                    index[port].append((tree, node))
+                except KeyError:
+                    index[port] = [(tree, node)]
+        return index
+
+    def find_passages(self, to: ThinPort) -> list[tuple[ThinPort, ...]]:
+        """
+        Finds the passages from the roots of all trees to the given ThinPort.
+
+        Args:
+            to (ThinPort): The ThinPort to find the passages to.
+
+        Returns:
+            list[tuple[ThinPort, ...]]: passages in the order of trees, empty if
+                there is no path to the given ThinPort.
+        """
+        if not self:
+            return []
+        port = self[0].compiled.lookup(to)
+        if port is None:
+            return []
+        return [tree.passage(node) for tree, node in self.index.get(port, ())]
+
+
+def _reader(
+    buffer: bytes | bytearray | memoryview,
+    header: struct.Struct,
+    magic: bytes,
+    what: str,
+) -> SectionReader:
+    buffer = memoryview(buffer).cast("B")
+    if len(buffer) < header.size:
+        raise ValueError(f"not an apssm {what}")
+    magic_, version, byte_order = header.unpack_from(buffer)[:3]
+    if magic_ != magic:
+        raise ValueError(f"not an apssm {what}")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"unsupported format version: {version}")
+    return SectionReader(buffer, header.size, byte_order)
@@ -0,0 +1,207 @@
+import random
+from typing import Iterator
+
+from apssm.devices.bus import Bus
+from apssm.devices.dc_dc import DcDc
+from apssm.devices.diode import Diode
+from apssm.devices.load import Load
+from apssm.devices.power_supply import PowerSupply
+from apssm.devices.switch import Switch
+from apssm.graph import AbstractPowerSupplySystemGraph
+from apssm.typing import DeviceType
+from benchmarks.topologies import Topology
+
+
+def random_topology(
+    ports: int,
+    supplies: int | None = None,
+    seed: int = 0,
+    stages: float = 0.02,
+    diodes: float = 0.005,
+    ties: float = 0.005,
+) -> Topology:
+    """a random topology shaped like a real power supply system, as the
+    limitations of README:
+
+    - each power supply feeds a main bus through a switch and a dc/dc
+    - a bus feeds a stage, a switch, a dc/dc and another bus, of the same
+      power supply, so the buses of a power supply form a tree
+    - shared buses are OR-ed by diodes from the buses of 2 or 3 power supplies
+    - buses of different power supplies are tied by switches, open by default
+    - the rest are switched loads, on the buses and shared buses
+
+    The same arguments give the same topology, the graph built from it is
+    legal with the default switch states.
+
+    Args:
+        ports (int): the number of ports to reach, up to a few ports more
+        supplies (int | None, optional): the number of power supplies.
+            Defaults to 1 per 50,000 ports, at least 2.
+        seed (int, optional): the seed. Defaults to 0.
+        stages (float, optional): the probability of a stage, instead of a
+            load. Defaults to 0.02.
+        diodes (float, optional): the probability of a shared bus. Defaults
+            to 0.005.
+        ties (float, optional): the probability of a tie switch. Defaults to
+            0.005.
+
+    Returns:
+        Topology: the topology, the destinations are the loads, and `ties`
+            maps each tie switch to the power supplies of its sides
+    """
+    rng = random.Random(seed)
+    if supplies is None:
+        supplies = max(2, ports // 50_000)
+    devices: list[DeviceType] = []
+    edges: list = []
+    destinations: list[tuple[str, int]] = []
+    tie_sides: dict[str, tuple[str, str]] = {}
+    # the buses of each power supply, and all the buses loads could be put on
+    buses: list[list[str]] = []
+    load_buses: list[str] = []
+
+    count = 0
+    for s in range(supplies):
+        supply, bus = f"power_supply_{s}", f"bus_{s}_0"
+        devices += [
+            PowerSupply(supply),
+            Switch(f"{supply}_switch"),
+            DcDc(f"{supply}_dc_dc"),
+            Bus(bus),
+        ]
+        edges += [
+            ((supply, 0), (f"{supply}_switch", 0)),
+            ((f"{supply}_switch", 1), (f"{supply}_dc_dc", 0)),
+            ((f"{supply}_dc_dc", 1), (bus, 0)),
+        ]
+        buses.append([bus])
+        load_buses.append(bus)
+        count += 6
+
+    while count < ports:
+        r = rng.random()
+        n = len(devices)
+        if r < stages:
+            s = rng.randrange(supplies)
+            bus = f"bus_{s}_{len(buses[s])}"
+            devices += [Switch(f"switch_{n}"), DcDc(f"dc_dc_{n}"), Bus(bus)]
+            edges += [
+                ((rng.choice(buses[s]), 0), (f"switch_{n}", 0)),
+                ((f"switch_{n}", 1), (f"dc_dc_{n}", 0)),
+                ((f"dc_dc_{n}", 1), (bus, 0)),
+            ]
+            buses[s].append(bus)
+            load_buses.append(bus)
+            count += 5
+        elif r < stages + diodes:
+            shared = f"shared_{n}"
+            devices.append(Bus(shared))
+            for s in rng.sample(range(supplies), min(supplies, rng.randint(2, 3))):
+                diode = f"diode_{len(devices)}"
+                devices.append(Diode(diode))
+                edges += [
+                    ((rng.choice(buses[s]), 0), (diode, 0)),
+                    ((diode, 1), (shared, 0)),
+                ]
+                count += 2
+            load_buses.append(shared)
+            count += 1
+        elif r < stages + diodes + ties:
+            a, b = rng.sample(range(supplies), 2)
+            tie = f"tie_{n}"
+            devices.append(Switch(tie, on=False))
+            edges += [
+                ((rng.choice(buses[a]), 0), (tie, 0)),
+                ((tie, 1), (rng.choice(buses[b]), 0)),
+            ]
+            tie_sides[tie] = (f"power_supply_{a}", f"power_supply_{b}")
+            count += 2
+        else:
+            devices += [Switch(f"switch_{n}"), Load(f"load_{n}")]
+            edges += [
+                ((rng.choice(load_buses), 0), (f"switch_{n}", 0)),
+                ((f"switch_{n}", 1), (f"load_{n}", 0)),
+            ]
+            destinations.append((f"load_{n}", 0))
+            count += 3
+    return Topology(devices, edges, destinations, tie_sides)
+
+
+def _find(parents: dict[str, str], supply: str) -> str:
+    """the root of `supply` in the union-find `parents`, halving the path"""
+    while parents[supply] != supply:
+        parents[supply] = supply = parents[parents[supply]]
+    return supply
+
+
+def random_truth_tables(
+    graph: AbstractPowerSupplySystemGraph,
+    topology: Topology,
+    n: int,
+    seed: int = 0,
+    off: float = 0.05,
+    supply_off: float = 0.2,
+    tie_on: float = 0.5,
+) -> Iterator[dict[str, bool]]:
+    """random legal truth tables of a topology of `random_topology`
+
+    Each switch is turned off with the probability `off`, the switch of each
+    power supply with the probability `supply_off`. Then the tie switches are
+    tried in a random order, each is turned on with the probability `tie_on`
+    if it doesn't tie 2 power supplies on, or a power supply to itself: the
+    power supplies tied together are tracked with a union-find, since only
+    ties leave the buses of a power supply, and diodes lead to shared buses
+    which lead nowhere else.
+
+    Args:
+        graph (AbstractPowerSupplySystemGraph): the graph of the topology, to
+            validate the truth tables
+        topology (Topology): the topology
+        n (int): the number of truth tables
+        seed (int, optional): the seed. Defaults to 0.
+        off (float, optional): the probability of an open switch. Defaults to
+            0.05.
+        supply_off (float, optional): the probability of an open switch of a
+            power supply. Defaults to 0.2.
+        tie_on (float, optional): the probability of a closed tie switch, if
+            it is legal. Defaults to 0.5.
+
+    Yields:
+        dict[str, bool]: the truth tables of all the switches
+
+    Throws:
+        ValueError: if a truth table isn't legal, i.e. the topology isn't of
+            `random_topology`
+    """
+    rng = random.Random(seed)
+    ties = topology.ties or {}
+    supplies = [
+        device.name for device in topology.devices if isinstance(device, PowerSupply)
+    ]
+    switches = [
+        device.name
+        for device in topology.devices
+        if isinstance(device, Switch) and device.name not in ties
+    ]
+    for _ in range(n):
+        truth_table = {name: rng.random() >= off for name in switches}
+        parents = {supply: supply for supply in supplies}
+        # whether a power supply on is tied to the group of each root
+        live = {}
+        for supply in supplies:
+            on = rng.random() >= supply_off
+            truth_table[f"{supply}_switch"] = on
+            live[supply] = on
+
+        order = list(ties)
+        rng.shuffle(order)
+        for tie in order:
+            a, b = (_find(parents, supply) for supply in ties[tie])
+            on = a != b and not (live[a] and live[b]) and rng.random() < tie_on
+            truth_table[tie] = on
+            if on:
+                parents[a] = b
+                live[b] = live[a] or live[b]
+        if pair := graph.validate(truth_table):
+            raise ValueError(f"{pair[0]} charges {pair[1]}")
+        yield truth_table
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The benchmark suite: each operation on each topology family, see
+`benchmarks.topologies`, timed run by run.
+
+    python -m benchmarks.suite -o results.json
+    python -m benchmarks.suite --baseline results.json
+
+The results are written as JSON, and compared with a baseline written the
+same way: the exit code is 1 if the p50 or the peak memory of a case
+regresses beyond the tolerance.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tracemalloc
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Any, Callable, NamedTuple
+
+from loguru import logger
+from tabulate import tabulate
+
+from apssm.conflicts import Conflicts
+from apssm.exceptions import TooManyConflictSets
+from benchmarks.random_graph import random_topology
+from benchmarks.topologies import FAMILIES, SIZES, Topology, sample
+
+logger.disable("apssm")
+
+# the sizes of the random topologies are in ports
+FAMILIES = {**FAMILIES, "random": random_topology}
+SIZES = {**SIZES, "random": (20_000, 200_000)}
+
+
+class CaseResult(NamedTuple):
+    family: str
+    size: int
+    operation: str
+    ports: int
+    edges: int
+    runs: int
+    p50_ms: float
+    p99_ms: float
+    mean_ms: float
+    peak_kib: float
+
+
+def _percentile(sorted_times: list[float], q: float) -> float:
+    """nearest rank percentile"""
+    rank = max(0, min(len(sorted_times) - 1, round(q * len(sorted_times)) - 1))
+    return sorted_times[rank]
+
+
+def _add_edge(topology: Topology) -> Callable[[], Callable[[], Any]]:
+    """each run adds an edge to a graph of all the devices, in order"""
+    state: dict[str, Any] = {}
+
+    def setup() -> Callable[[], Any]:
+        graph = state.get("graph")
+        if graph is None or state["next"] == len(topology.edges):
+            graph = state["graph"] = topology.build_devices()
+            state["next"] = 0
+        first, second = topology.edges[state["next"]]
+        state["next"] += 1
+        return lambda: graph.add_edge(first, second)
+
+    return setup
+
+
+def _conflict_sets(topology: Topology, graph: Any) -> Callable[[], Callable[[], Any]]:
+    """each run searches the conflict sets again, instead of taking those
+    cached by the compiled graph, the search stops at the budget"""
+    compiled = graph.compile()
+
+    def search() -> None:
+        try:
+            _ = Conflicts(compiled).masks
+        except TooManyConflictSets:
+            pass
+
+    return lambda: search
+
+
+# operation name to a function of the topology and its graph, returning the
+# setup of each run, which returns the timed call
+OPERATIONS: dict[str, Callable[..., Callable[[], Callable[[], Any]]]] = {
+    "add_edge": lambda topology, graph: _add_edge(topology),
+    "gen_forest": lambda topology, graph: lambda: graph.gen_forest,
+    # the same state as gen_forest, compare their peak memory
+    "gen_dag": lambda topology, graph: lambda: graph.gen_dag,
+    # the energized ports and loads only, compare with gen_forest
+    "energized_ports": lambda topology, graph: lambda: graph.energized_ports,
+    "energized_loads": lambda topology, graph: lambda: graph.energized_loads,
+    "conflict_sets": _conflict_sets,
+    "find_passages": lambda topology, graph: (
+        lambda: lambda: graph.find_passages(topology.destinations)
+    ),
+    # a few destinations in a large graph
+    "find_passages_sparse": lambda topology, graph: (
+        lambda: lambda: graph.find_passages(sample(topology.destinations, 5))
+    ),
+    "find_passages_sparse_backward": lambda topology, graph: (
+        lambda: (
+            lambda: graph.find_passages(
+                sample(topology.destinations, 5), search="backward"
+            )
+        )
+    ),
+}
+
+
+def run_case(
+    family: str, size: int, operation: str, runs: int, min_seconds: float
+) -> CaseResult:
+    """time `runs` runs of an operation, at least `min_seconds` in total, and
+    measure the peak memory of one more run with tracemalloc"""
+    topology = FAMILIES[family](size)
+    graph = topology.build()
+    compiled = graph.compile()
+    setup = OPERATIONS[operation](topology, graph)
+
+    # warm up, e.g. the compiled graph and its cached properties
+    setup()()
+    times: list[float] = []
+    total = 0.0
+    while len(times) < runs or total < min_seconds:
+        call = setup()
+        start = perf_counter()
+        call()
+        elapsed = perf_counter() - start
+        times.append(elapsed)
+        total += elapsed
+
+    call = setup()
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    times.sort()
+    return CaseResult(
+        family,
+        size,
+        operation,
+        len(compiled.port_ids),
+        len(graph.edges),
+        len(times),
+        round(_percentile(times, 0.5) * 1e3, 4),
+        round(_percentile(times, 0.99) * 1e3, 4),
+        round(total / len(times) * 1e3, 4),
+        round(peak / 1024, 1),
+    )
+
+
+def compare(
+    results: list[CaseResult], baseline: dict[str, Any], tolerance: float
+) -> list[tuple[CaseResult, float | None, float | None, bool]]:
+    """the ratios of the p50 and of the peak memory of each result to the
+    baseline, None if the case is not in the baseline, and whether either
+    regresses beyond `tolerance`"""
+    base = {
+        (case["family"], case["size"], case["operation"]): case
+        for case in baseline["results"]
+    }
+    compared: list[tuple[CaseResult, float | None, float | None, bool]] = []
+    for result in results:
+        case = base.get((result.family, result.size, result.operation))
+        if case is None:
+            compared.append((result, None, None, False))
+            continue
+        ratio = result.p50_ms / case["p50_ms"] if case["p50_ms"] else None
+        memory = result.peak_kib / case["peak_kib"] if case["peak_kib"] else None
+        compared.append(
+            (
+                result,
+                ratio,
+                memory,
+                any(r is not None and r > 1 + tolerance for r in (ratio, memory)),
+            )
+        )
+    return compared
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite")
+    parser.add_argument("-o", "--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare with the results of a run")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="the p50 or peak memory increase reported as regression",
+    )
+    parser.add_argument("--families", nargs="*", default=list(FAMILIES))
+    parser.add_argument("--operations", nargs="*", default=list(OPERATIONS))
+    parser.add_argument(
+        "--quick", action="store_true", help="only the small size of each family"
+    )
+    parser.add_argument("--runs", type=int, default=20, help="min runs per case")
+    parser.add_argument(
+        "--min-seconds", type=float, default=0.2, help="min time per case"
+    )
+    args = parser.parse_args(argv)
+
+    results: list[CaseResult] = []
+    for family in args.families:
+        sizes = SIZES[family][:1] if args.quick else SIZES[family]
+        for size in sizes:
+            for operation in args.operations:
+                result = run_case(family, size, operation, args.runs, args.min_seconds)
+                print(
+                    f"{family}({size}) {operation}: p50 {result.p50_ms}ms",
+                    file=sys.stderr,
+                )
+                results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "time": datetime.now(timezone.utc).isoformat(),
+                    "results": [result._asdict() for result in results],
+                },
+                f,
+                indent=2,
+            )
+
+    if not args.baseline:
+        print(tabulate(results, headers=CaseResult._fields))
+        return 0
+    with open(args.baseline) as f:
+        compared = compare(results, json.load(f), args.tolerance)
+    print(
+        tabulate(
+            [
+                (
+                    *result,
+                    "" if ratio is None else f"{ratio:.2f}",
+                    "" if memory is None else f"{memory:.2f}",
+                    "!" * regressed,
+                )
+                for result, ratio, memory, regressed in compared
+            ],
+            headers=[*CaseResult._fields, "vs baseline", "memory", "regressed"],
+        )
+    )
+    return 1 if any(regressed for *_, regressed in compared) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
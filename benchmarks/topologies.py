@@ -0,0 +1,174 @@
+from typing import Any, Callable, NamedTuple
+
+from apssm.devices.bus import Bus
+from apssm.devices.dc_dc import DcDc
+from apssm.devices.diode import Diode
+from apssm.devices.load import Load
+from apssm.devices.power_supply import PowerSupply
+from apssm.devices.switch import Switch
+from apssm.graph import AbstractPowerSupplySystemGraph
+from apssm.typing import DeviceType
+
+
+class Topology(NamedTuple):
+    """the devices and edges of a graph, so building it could be timed too,
+    and the destinations to find passages to"""
+
+    devices: list[DeviceType]
+    edges: list[tuple[tuple[str, int], tuple[str, int]]]
+    destinations: list[tuple[str, int]]
+    # the tie switches between the buses of power supplies, to the power
+    # supplies of both sides, see `random_graph.random_topology`
+    ties: dict[str, tuple[str, str]] | None = None
+
+    def build_devices(
+        self, forest_cache_size: int = 0
+    ) -> AbstractPowerSupplySystemGraph:
+        """a graph of the devices, without edges, the forest cache is disabled
+        by default, so each `find_passages` searches"""
+        graph = AbstractPowerSupplySystemGraph(forest_cache_size)
+        graph.add_devices(self.devices)
+        return graph
+
+    def build(self, forest_cache_size: int = 0) -> AbstractPowerSupplySystemGraph:
+        """the graph, see `build_devices`"""
+        return self.build_devices(forest_cache_size).add_edges(self.edges)
+
+
+def _feeder(
+    devices: list[DeviceType], edges: list, name: str, to: tuple[str, int]
+) -> None:
+    """a power supply, its switch and dc/dc feeding port `to`"""
+    devices += [PowerSupply(name), Switch(f"{name}_switch"), DcDc(f"{name}_dc_dc")]
+    edges += [
+        ((name, 0), (f"{name}_switch", 0)),
+        ((f"{name}_switch", 1), (f"{name}_dc_dc", 0)),
+        ((f"{name}_dc_dc", 1), to),
+    ]
+
+
+def _loads(
+    devices: list[DeviceType], edges: list, bus: str, n: int
+) -> list[tuple[str, int]]:
+    """`n` switched loads on `bus`, returns the ports of the loads"""
+    loads: list[tuple[str, int]] = []
+    for i in range(n):
+        devices += [Switch(f"{bus}_switch_{i}"), Load(f"{bus}_load_{i}")]
+        edges += [
+            ((bus, 0), (f"{bus}_switch_{i}", 0)),
+            ((f"{bus}_switch_{i}", 1), (f"{bus}_load_{i}", 0)),
+        ]
+        loads.append((f"{bus}_load_{i}", 0))
+    return loads
+
+
+def fan_out(size: int) -> Topology:
+    """two power supplies, each feeding a switch through its own switch and
+    dc/dc, the switch fans out to `size` buses with `size` switched loads
+    each, a two-level fan-out like `build_graph.build_graph`, which has no
+    switch between a power supply and its dc/dc"""
+    devices: list[DeviceType] = []
+    edges: list = []
+    destinations: list[tuple[str, int]] = []
+    for i in range(2):
+        devices.append(Switch(f"switch_{i}"))
+        _feeder(devices, edges, f"power_supply_{i}", (f"switch_{i}", 0))
+        for j in range(size):
+            devices.append(Bus(f"bus_{i}_{j}"))
+            edges.append(((f"switch_{i}", 1), (f"bus_{i}_{j}", 0)))
+            destinations += _loads(devices, edges, f"bus_{i}_{j}", size)
+    return Topology(devices, edges, destinations)
+
+
+def deep_chain(size: int) -> Topology:
+    """a chain of `size` buses, each fed by a dc/dc and a switch from the
+    previous one, with a load on each bus"""
+    devices: list[DeviceType] = [Bus("bus_0")]
+    edges: list = []
+    _feeder(devices, edges, "power_supply", ("bus_0", 0))
+    destinations = _loads(devices, edges, "bus_0", 1)
+    for i in range(1, size):
+        devices += [Switch(f"switch_{i}"), DcDc(f"dc_dc_{i}"), Bus(f"bus_{i}")]
+        edges += [
+            ((f"bus_{i - 1}", 0), (f"switch_{i}", 0)),
+            ((f"switch_{i}", 1), (f"dc_dc_{i}", 0)),
+            ((f"dc_dc_{i}", 1), (f"bus_{i}", 0)),
+        ]
+        destinations += _loads(devices, edges, f"bus_{i}", 1)
+    return Topology(devices, edges, destinations)
+
+
+def wide_bus(size: int) -> Topology:
+    """a single bus with `size` switched loads"""
+    devices: list[DeviceType] = [Bus("bus")]
+    edges: list = []
+    _feeder(devices, edges, "power_supply", ("bus", 0))
+    return Topology(devices, edges, _loads(devices, edges, "bus", size))
+
+
+def diode_mesh(size: int) -> Topology:
+    """`size` power supplies, each feeding its own bus, and `size` shared
+    buses, each OR-ed by diodes from 3 adjacent supply buses, with 10 loads
+    each, so most ports are fed by several power supplies"""
+    devices: list[DeviceType] = []
+    edges: list = []
+    destinations: list[tuple[str, int]] = []
+    for i in range(size):
+        devices.append(Bus(f"bus_{i}"))
+        _feeder(devices, edges, f"power_supply_{i}", (f"bus_{i}", 0))
+    for i in range(size):
+        devices.append(Bus(f"shared_{i}"))
+        for k in range(3):
+            diode = f"diode_{i}_{k}"
+            devices.append(Diode(diode))
+            edges += [
+                ((f"bus_{(i + k) % size}", 0), (diode, 0)),
+                ((diode, 1), (f"shared_{i}", 0)),
+            ]
+        destinations += _loads(devices, edges, f"shared_{i}", 10)
+    return Topology(devices, edges, destinations)
+
+
+def many_supplies(size: int) -> Topology:
+    """`size` power supplies, each feeding a bus of 5 loads, the adjacent
+    buses are tied by open switches"""
+    devices: list[DeviceType] = []
+    edges: list = []
+    destinations: list[tuple[str, int]] = []
+    for i in range(size):
+        devices.append(Bus(f"bus_{i}"))
+        _feeder(devices, edges, f"power_supply_{i}", (f"bus_{i}", 0))
+        destinations += _loads(devices, edges, f"bus_{i}", 5)
+        if i:
+            devices.append(Switch(f"tie_{i}", on=False))
+            edges += [
+                ((f"bus_{i - 1}", 0), (f"tie_{i}", 0)),
+                ((f"tie_{i}", 1), (f"bus_{i}", 0)),
+            ]
+    return Topology(devices, edges, destinations)
+
+
+FAMILIES: dict[str, Callable[[int], Topology]] = {
+    "fan_out": fan_out,
+    "deep_chain": deep_chain,
+    "wide_bus": wide_bus,
+    "diode_mesh": diode_mesh,
+    "many_supplies": many_supplies,
+}
+
+# the sizes of each family, small and large
+SIZES: dict[str, tuple[int, ...]] = {
+    "fan_out": (20, 50),
+    "deep_chain": (500, 2000),
+    "wide_bus": (2000, 10000),
+    "diode_mesh": (50, 200),
+    "many_supplies": (100, 500),
+}
+
+
+def sample(items: list[Any], n: int) -> list[Any]:
+    """`n` items evenly spread over `items`"""
+    if len(items) <= n:
+        return list(items)
+    step = len(items) / n
+    return [items[int(i * step)] for i in range(n)]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+
+from typing import cast
+
+import pytest
+
+from apssm.devices.bus import Bus
+from apssm.devices.load import Load
+from apssm.devices.power_supply import PowerSupply
+from apssm.devices.switch import Switch
+from apssm.graph import AbstractPowerSupplySystemGraph
+
+
+@pytest.fixture
+def graph_fixture():
+    graph = AbstractPowerSupplySystemGraph()
+    power_supply_0 = PowerSupply("power_supply_0")
+    power_supply_1 = PowerSupply("power_supply_1")
+    graph.add_device(power_supply_0).add_device(power_supply_1)
+
+    switch_0 = Switch("switch_0", on=True)
+    switch_1 = Switch("switch_1", on=True)
+    graph.add_device(switch_0).add_edge(("power_supply_0", 0), ("switch_0", 0))
+    graph.add_device(switch_1).add_edge(("power_supply_1", 0), ("switch_1", 0))
+
+    bus_0 = Bus("bus_0")
+    bus_1 = Bus("bus_1")
+    graph.add_device(bus_0).add_edge(("switch_0", 1), ("bus_0", 0))
+    graph.add_device(bus_1).add_edge(("switch_1", 1), ("bus_1", 0))
+
+    switch_2 = Switch("switch_2")
+    graph.add_device(switch_2)
+    graph.add_edge(("bus_0", 0), ("switch_2", 0)).add_edge(
+        ("bus_1", 0), ("switch_2", 1)
+    )
+
+    load_0 = Load("load_0")
+    load_1 = Load("load_1")
+    graph.add_device(load_0).add_edge(("bus_0", 0), ("load_0", 0))
+    graph.add_device(load_1).add_edge(("bus_1", 0), ("load_1", 0))
+    return graph
+
+
+@pytest.fixture
+def graph(graph_fixture: AbstractPowerSupplySystemGraph):
+    """`graph_fixture` with the tie switch_2 open, so its default states are
+    legal"""
+    cast(Switch, graph_fixture.devices["switch_2"]).turn_off()
+    return graph_fixture
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from apssm.aio import AsyncGraph
+from apssm.exceptions import ChargePowerSupply, NoSuchDevice
+from apssm.graph import AbstractPowerSupplySystemGraph
+from apssm.thin_port import ThinPort
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    submitted = 0
+
+    def submit(self, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(*args, **kwargs)
+
+
+def test_find_passages(graph_fixture: AbstractPowerSupplySystemGraph):
+    graph = graph_fixture
+    truth_table = {"switch_1": False}
+    requests = [
+        [ThinPort("load_0", 0)],
+        [("load_1", 0), ("nonexistent", 0)],
+        [ThinPort("load_0", 0), ThinPort("load_1", 0)],
+    ]
+
+    async def main(executor: CountingExecutor):
+        queries = AsyncGraph(graph, executor)
+        return await asyncio.gather(
+            *(queries.find_passages(to, truth_table) for to in requests)
+        )
+
+    with CountingExecutor() as executor:
+        results = asyncio.run(main(executor))
+    # one forest, and one pass for all the destinations
+    assert executor.submitted == 2
+    assert graph.forest_cache_info().misses == 1
+    assert results == [graph.find_passages(to, truth_table) for to in requests]
+    assert list(results[2]) == ["load_0.0", "load_1.0"]
+
+
+def test_gen_forest(graph_fixture: AbstractPowerSupplySystemGraph):
+    graph = graph_fixture
+
+    async def main():
+        queries = AsyncGraph(graph)
+        forests = await asyncio.gather(
+            queries.gen_forest({"switch_2": False}),
+            queries.gen_forest({"switch_2": False, "load_0": True}),
+            queries.gen_forest({"switch_1": False}),
+        )
+        # the different states are not coalesced
+        assert forests[0] is forests[1] and forests[0] is not forests[2]
+
+        with pytest.raises(NoSuchDevice):
+            await queries.gen_forest({"nonexistent": True})
+        results = await asyncio.gather(
+            queries.find_passages([("load_0", 0)], {"switch_2": True}),
+            queries.find_passages([("load_1", 0)], {"switch_2": True}),
+            return_exceptions=True,
+        )
+        assert all(isinstance(e, ChargePowerSupply) for e in results)
+        assert results[0] is not results[1]
+        assert results[0].from_.name == "power_supply_0"  # type: ignore
+
+    asyncio.run(main())
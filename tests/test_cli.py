@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+
+import io
+import json
+
+import pytest
+
+from apssm.cli import batch, main
+from apssm.graph import AbstractPowerSupplySystemGraph
+from apssm.snapshot import save
+
+REQUESTS = [
+    {"id": 0, "destinations": [["load_0", 0], ["load_1", 0]]},
+    {"id": 1, "truth_table": {"switch_2": True}},
+    {"id": 2, "truth_table": {"switch_1": False, "switch_2": True}},
+    {"truth_table": {"nonexistent": True}},
+    {"id": 4, "truth_table": [1]},
+    {"id": 5, "destinations": 5},
+]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch(graph: AbstractPowerSupplySystemGraph, tmp_path, workers: int):
+    save(graph, tmp_path / "graph.apssm")
+    lines = [json.dumps(request) for request in REQUESTS] * 3 + ["", "[1]", "{"]
+    output = io.StringIO()
+    batch(
+        str(tmp_path / "graph.apssm"),
+        io.StringIO("\n".join(lines)),
+        output,
+        workers=workers,
+        chunk_size=2,
+    )
+    responses = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert len(responses) == 3 * len(REQUESTS) + 2
+    assert responses[0] == {
+        "id": 0,
+        "passages": {
+            port_id: [[list(port) for port in passage] for passage in passages]
+            for port_id, passages in graph.find_passages(
+                [("load_0", 0), ("load_1", 0)]
+            ).items()
+        },
+    }
+    assert responses[1] == {"id": 1, "charge": ["power_supply_0", "power_supply_1"]}
+    assert responses[2] == {
+        "id": 2,
+        "energized_loads": {"load_0": ["power_supply_0"], "load_1": ["power_supply_0"]},
+    }
+    assert responses[3] == {"error": "No such Device: nonexistent"}
+    # an ill-typed request is answered, the next ones too
+    assert responses[4] == {
+        "id": 4,
+        "error": "truth_table must be an object of switch names to booleans",
+    }
+    assert responses[5] == {
+        "id": 5,
+        "error": "destinations must be a list of [device, index]",
+    }
+    # in order
+    assert responses[6:18] == responses[:12]
+    assert responses[-2] == {"error": "a request must be an object"}
+    assert "error" in responses[-1]
+
+
+def test_main(graph: AbstractPowerSupplySystemGraph, tmp_path):
+    save(graph, tmp_path / "graph.apssm")
+    (tmp_path / "requests.jsonl").write_text(
+        "\n".join(json.dumps(request) for request in REQUESTS)
+    )
+    main(
+        [
+            "batch",
+            str(tmp_path / "graph.apssm"),
+            "-i",
+            str(tmp_path / "requests.jsonl"),
+            "-o",
+            str(tmp_path / "responses.jsonl"),
+        ]
+    )
+    responses = (tmp_path / "responses.jsonl").read_text().splitlines()
+    assert [json.loads(line).get("id") for line in responses] == [0, 1, 2, None, 4, 5]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+
+import pytest
+
+from apssm.compiled import DeviceKind
+from apssm.devices.bus import Bus
+from apssm.devices.diode import Diode
+from apssm.devices.load import Load
+from apssm.devices.power_supply import PowerSupply
+from apssm.devices.switch import Switch
+from apssm.exceptions import NoSuchDevice
+from apssm.graph import AbstractPowerSupplySystemGraph
+
+
+@pytest.fixture
+def graph():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_device(PowerSupply("power_supply"))
+    graph.add_device(Switch("switch")).add_edge(
+        ("power_supply", 0), ("switch", 0), extras="foo"
+    )
+    graph.add_device(Bus("bus")).add_edge(("switch", 1), ("bus", 0))
+    graph.add_device(Diode("diode")).add_edge(("bus", 0), ("diode", 0))
+    graph.add_device(Load("load")).add_edge(("diode", 1), ("load", 0))
+    return graph
+
+
+def test_compile(graph: AbstractPowerSupplySystemGraph):
+    compiled = graph.compile()
+    assert compiled.port_ids == (
+        "power_supply.0",
+        "switch.0",
+        "switch.1",
+        "bus.0",
+        "diode.0",
+        "diode.1",
+        "load.0",
+    )
+    assert compiled.port_lookup[("bus", 0)] == 3
+    assert list(compiled.offsets) == [0, 1, 2, 3, 5, 6, 7, 8]
+    assert list(compiled.neighbors) == [1, 0, 3, 2, 4, 3, 6, 5]
+    assert compiled.extras[:2] == ["foo", "foo"]
+    assert list(compiled.partners) == [-1, 2, 1, -1, 5, 4, -1]
+    assert compiled.kinds[0] == DeviceKind.POWER_SUPPLY
+    assert compiled.kinds[4] == compiled.kinds[5] == DeviceKind.DIODE
+    assert compiled.roots == (0,)
+    assert compiled.switch_ports == (1,)
+    assert list(compiled.base_links) == [0, 0, 0, 0, 1, 0, 0]
+    assert list(compiled.cathodes) == [0, 0, 0, 0, 0, 1, 0]
+
+
+def test_compile_cache(graph: AbstractPowerSupplySystemGraph):
+    compiled = graph.compile()
+    assert graph.compile() is compiled
+    graph.add_device(Load("load_1"))
+    assert graph.compile() is not compiled
+    compiled = graph.compile()
+    graph.add_edge(("bus", 0), ("load_1", 0))
+    assert graph.compile() is not compiled
+
+
+def test_links(graph: AbstractPowerSupplySystemGraph):
+    compiled = graph.compile()
+    assert list(compiled.links()) == [0, 1, 1, 0, 1, 0, 0]
+    assert list(compiled.links({"switch": False})) == [0, 0, 0, 0, 1, 0, 0]
+    # switch states are read when applying the truth table
+    graph.devices["switch"].turn_off()  # type: ignore
+    assert list(compiled.links()) == [0, 0, 0, 0, 1, 0, 0]
+    with pytest.raises(NoSuchDevice):
+        compiled.links({"nonexistent": True})
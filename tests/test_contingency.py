@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+
+from itertools import combinations
+
+import pytest
+
+from apssm.contingency import contingencies
+from apssm.devices.bus import Bus
+from apssm.devices.dc_dc import DcDc
+from apssm.devices.diode import Diode
+from apssm.devices.load import Load
+from apssm.devices.power_supply import PowerSupply
+from apssm.devices.switch import Switch
+from apssm.energize import energized_with
+from apssm.exceptions import NoSuchDevice
+from apssm.graph import AbstractPowerSupplySystemGraph
+
+
+@pytest.fixture
+def graph():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_devices(
+        [
+            PowerSupply("power_supply_0"),
+            PowerSupply("power_supply_1"),
+            PowerSupply("power_supply_2"),
+            Switch("switch_0"),
+            Switch("switch_1"),
+            Switch("switch_2", on=False),
+            Switch("switch_3"),
+            Switch("switch_4"),
+            Diode("diode_0"),
+            Diode("diode_1"),
+            DcDc("dc_dc"),
+            Bus("bus_0"),
+            Bus("bus_1"),
+            Bus("bus_2"),
+            Load("load_0"),
+            Load("load_1"),
+            Load("load_2"),
+        ]
+    )
+    graph.add_edges(
+        [
+            # switch_0 and switch_3 feed bus_0 in parallel
+            (("power_supply_0", 0), ("switch_0", 0)),
+            (("power_supply_1", 0), ("switch_3", 0)),
+            (("switch_0", 1), ("diode_0", 0)),
+            (("switch_3", 1), ("diode_1", 0)),
+            (("diode_0", 1), ("bus_0", 0)),
+            (("diode_1", 1), ("bus_0", 0)),
+            (("bus_0", 0), ("load_0", 0)),
+            # dc_dc and switch_4 in series
+            (("bus_0", 0), ("dc_dc", 0)),
+            (("dc_dc", 1), ("switch_4", 0)),
+            (("switch_4", 1), ("bus_1", 0)),
+            (("bus_1", 0), ("load_1", 0)),
+            (("power_supply_2", 0), ("switch_1", 0)),
+            (("switch_1", 1), ("bus_2", 0)),
+            (("bus_2", 0), ("load_2", 0)),
+            # open, on no passage
+            (("bus_1", 0), ("switch_2", 0)),
+            (("switch_2", 1), ("bus_2", 0)),
+        ]
+    )
+    return graph
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_contingencies(graph: AbstractPowerSupplySystemGraph, workers: int):
+    results = {
+        result.contingency: result.de_energized
+        for result in contingencies(graph, workers=workers, chunk_size=2)
+    }
+    assert results == {
+        ("switch_0",): [],
+        ("switch_1",): ["load_2"],
+        ("switch_3",): [],
+        ("switch_4",): ["load_1"],
+        ("dc_dc",): ["load_1"],
+        ("switch_0", "switch_1"): ["load_2"],
+        ("switch_0", "switch_3"): ["load_0", "load_1"],
+        ("switch_0", "switch_4"): ["load_1"],
+        ("switch_0", "dc_dc"): ["load_1"],
+        ("switch_1", "switch_3"): ["load_2"],
+        ("switch_1", "switch_4"): ["load_1", "load_2"],
+        ("switch_1", "dc_dc"): ["load_1", "load_2"],
+        ("switch_3", "switch_4"): ["load_1"],
+        ("switch_3", "dc_dc"): ["load_1"],
+        # switch_2 is open, switch_4 and dc_dc are in series
+    }
+
+
+def test_contingencies_brute_force(graph: AbstractPowerSupplySystemGraph):
+    elements = ["switch_0", "switch_1", "switch_2", "switch_3", "switch_4", "dc_dc"]
+    truth_table = {"switch_2": True, "switch_1": False}
+    results = {
+        result.contingency: result.de_energized
+        for result in contingencies(graph, truth_table, k=3, elements=elements)
+    }
+
+    def de_energized(failed: tuple[str, ...]) -> list[str]:
+        compiled = graph.compile()
+        links = compiled.links(truth_table)
+        for name in failed:
+            port = compiled.port_lookup[(name, 0)]
+            links[port] = links[port + 1] = 0
+        energized = bytearray(len(links))
+        for ports in energized_with(compiled, links):
+            energized = bytearray(a | b for a, b in zip(energized, ports))
+        return [
+            name
+            for name in ("load_0", "load_1", "load_2")
+            if not energized[compiled.port_lookup[(name, 0)]]
+        ]
+
+    for size in range(1, 4):
+        for failed in combinations(elements, size):
+            if failed in results:
+                assert results[failed] == de_energized(failed)
+            else:
+                # skipped, the same as without one of its elements
+                assert any(
+                    de_energized(failed) == de_energized(failed[:i] + failed[i + 1 :])
+                    for i in range(size)
+                )
+    assert ("switch_1",) not in results
+    assert ("switch_2",) in results
+
+
+def test_contingencies_invalid(graph: AbstractPowerSupplySystemGraph):
+    with pytest.raises(NoSuchDevice):
+        list(contingencies(graph, elements=["nonexistent"]))
+    with pytest.raises(ValueError):
+        list(contingencies(graph, elements=["bus_0"]))
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+
+
+from apssm.dominators import immediate_dominators
+
+
+def test_immediate_dominators():
+    #      0
+    #     / \
+    #    1   2
+    #    |\ /
+    #    | 3     5 is unreachable
+    #    |/ ^
+    #    4--'
+    successors = [[1, 2], [3, 4], [3], [4], [3], [0]]
+    assert immediate_dominators(successors, 0) == [0, 0, 0, 0, 0, -1]
+    assert immediate_dominators(successors, 1) == [-1, 1, -1, 1, 1, -1]
+    # 4 is only reached through 1
+    successors[3] = []
+    assert immediate_dominators(successors, 0) == [0, 0, 0, 0, 1, -1]
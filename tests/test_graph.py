@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
 
+import random
+import tracemalloc
 from typing import cast
 
 import pytest
@@ -18,11 +20,14 @@ from apssm.exceptions import (
     InvalidPort,
     NoPowerSupplies,
     NoSuchDevice,
+    TooManyConflictSets,
 )
 from apssm.gen_port_id import gen_port_id
 from apssm.graph import AbstractPowerSupplySystemGraph
 from apssm.thin_port import ThinPort
 from apssm.tree import DirectedPort
+from benchmarks.random_graph import random_topology, random_truth_tables
+from benchmarks.topologies import diode_mesh, wide_bus
 
 
 def test_add_device():
@@ -67,6 +72,66 @@ def test_add_edge():
     assert e.value.to.device_name == "switch" and e.value.to.index == 0
 
 
+def test_add_devices():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_device(PowerSupply("power_supply"))
+    with pytest.raises(DuplicateDevice) as e:
+        graph.add_devices([Bus("bus"), Load("load"), Bus("bus")])
+    assert e.value.name == "bus"
+    with pytest.raises(DuplicateDevice) as e:
+        graph.add_devices([Bus("bus"), PowerSupply("power_supply")])
+    assert e.value.name == "power_supply"
+    # nothing is added if any device is invalid
+    assert list(graph.devices) == ["power_supply"]
+
+    version = graph.version
+    graph.add_devices(Switch(f"switch_{i}") for i in range(2))
+    assert graph.version > version
+    assert list(graph.devices) == ["power_supply", "switch_0", "switch_1"]
+    assert list(graph.ports) == [
+        "power_supply.0",
+        "switch_0.0",
+        "switch_0.1",
+        "switch_1.0",
+        "switch_1.1",
+    ]
+
+
+def test_add_edges():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_devices([PowerSupply("power_supply"), Bus("bus"), Switch("switch")])
+    with pytest.raises(NoSuchDevice):
+        graph.add_edges([(("power_supply", 0), ("bus", 0)), (("foo", 0), ("bus", 0))])
+    with pytest.raises(InvalidPort):
+        graph.add_edges([(("power_supply", 0), ("bus", 1))])
+    with pytest.raises(DuplicateConnection) as e:
+        graph.add_edges(
+            [
+                (("power_supply", 0), ("bus", 0), "foo"),
+                (("bus", 0), ("power_supply", 0), "bar"),
+            ]
+        )
+    assert e.value.from_ == ("bus", 0) and e.value.extras == "bar"
+    # nothing is added if any edge is invalid
+    assert not graph.edges
+    assert all(not port.adj_list for port in graph.ports.values())
+
+    graph.add_edges(
+        [
+            (("power_supply", 0), ("bus", 0), "foo"),
+            (ThinPort("bus", 0), ThinPort("switch", 0)),
+        ]
+    )
+    assert [edge.extras for edge in graph.edges] == ["foo", None]
+    bus = graph.ports[gen_port_id("bus", 0)]
+    assert [(port.id, extras) for port, extras in bus.adj_list] == [
+        ("power_supply.0", "foo"),
+        ("switch.0", None),
+    ]
+    with pytest.raises(DuplicateConnection):
+        graph.add_edge(("switch", 0), ("bus", 0))
+
+
 def test_gen_forest_1():
     graph = AbstractPowerSupplySystemGraph()
     with pytest.raises(NoPowerSupplies):
@@ -247,36 +312,6 @@ def test_gen_forest_5():
     assert_tree_1(tree_1.root)
 
 
-@pytest.fixture
-def graph_fixture():
-    graph = AbstractPowerSupplySystemGraph()
-    power_supply_0 = PowerSupply("power_supply_0")
-    power_supply_1 = PowerSupply("power_supply_1")
-    graph.add_device(power_supply_0).add_device(power_supply_1)
-
-    switch_0 = Switch("switch_0", on=True)
-    switch_1 = Switch("switch_1", on=True)
-    graph.add_device(switch_0).add_edge(("power_supply_0", 0), ("switch_0", 0))
-    graph.add_device(switch_1).add_edge(("power_supply_1", 0), ("switch_1", 0))
-
-    bus_0 = Bus("bus_0")
-    bus_1 = Bus("bus_1")
-    graph.add_device(bus_0).add_edge(("switch_0", 1), ("bus_0", 0))
-    graph.add_device(bus_1).add_edge(("switch_1", 1), ("bus_1", 0))
-
-    switch_2 = Switch("switch_2")
-    graph.add_device(switch_2)
-    graph.add_edge(("bus_0", 0), ("switch_2", 0)).add_edge(
-        ("bus_1", 0), ("switch_2", 1)
-    )
-
-    load_0 = Load("load_0")
-    load_1 = Load("load_1")
-    graph.add_device(load_0).add_edge(("bus_0", 0), ("load_0", 0))
-    graph.add_device(load_1).add_edge(("bus_1", 0), ("load_1", 0))
-    return graph
-
-
 def test_gen_forest_6(graph_fixture: AbstractPowerSupplySystemGraph):
     graph = graph_fixture
     devices = graph.devices
@@ -814,3 +849,724 @@ def test_find_passages_5():
         passages["load.0"][0],
     ):
         assert a == b.id
+
+
+def test_update_forest_1(graph_fixture: AbstractPowerSupplySystemGraph):
+    graph = graph_fixture
+
+    truth_table = {"switch_0": True, "switch_1": False, "switch_2": False}
+    forest = graph.gen_forest(truth_table)
+    tree_0, tree_1 = forest
+
+    forest = graph.update_forest(forest, {"switch_2": True}, truth_table)
+    assert forest[1] is tree_1
+    assert len(tree_0.nodes) == 6
+    tree_0 = forest[0]
+    assert len(tree_0.nodes) == 10
+    assert len(tree_1.nodes) == 2
+    assert tree_0.find_passage(ThinPort("load_1", 0)) == (
+        ("power_supply_0", 0),
+        ("switch_0", 0),
+        ("switch_0", 1),
+        ("bus_0", 0),
+        ("switch_2", 0),
+        ("switch_2", 1),
+        ("bus_1", 0),
+        ("load_1", 0),
+    )
+
+    truth_table = {**truth_table, "switch_2": True}
+    tree_0, _ = graph.update_forest(forest, {"switch_2": False}, truth_table)
+    assert len(tree_0.nodes) == 6
+    assert "switch_2.1" not in tree_0.nodes and "load_1.0" not in tree_0.nodes
+    assert not tree_0.find_passage(ThinPort("load_1", 0))
+    bus_0 = tree_0.nodes["bus_0.0"]
+    switch_2 = bus_0.children[0]
+    assert switch_2.device == graph.devices["switch_2"] and not switch_2.children
+    assert len(bus_0.edges) == 2
+
+
+def test_update_forest_2(graph_fixture: AbstractPowerSupplySystemGraph):
+    graph = graph_fixture
+
+    truth_table = {"switch_0": True, "switch_1": True, "switch_2": False}
+    forest = graph.gen_forest(truth_table)
+    with pytest.raises(ChargePowerSupply) as e:
+        graph.update_forest(forest, {"switch_2": True}, truth_table)
+    assert e.value.from_.name == "power_supply_0"
+    assert e.value.to.name == "power_supply_1"
+    # untouched
+    assert len(forest[0].nodes) == 6 and len(forest[1].nodes) == 6
+    assert not forest[0].nodes["switch_2.0"].children
+
+    with pytest.raises(NoSuchDevice):
+        graph.update_forest(forest, {"nonexistent": True}, truth_table)
+
+
+def test_gen_forests(graph_fixture: AbstractPowerSupplySystemGraph):
+    graph = graph_fixture
+
+    truth_tables = [
+        {"switch_0": True, "switch_1": True, "switch_2": False},
+        {"switch_0": True, "switch_1": True, "switch_2": True},
+        {"switch_0": False, "switch_1": True, "switch_2": True},
+    ]
+    results = graph.gen_forests(truth_tables)
+    assert len(results) == 3
+    assert results[0].charge is None and results[0].forest
+    assert [len(tree.nodes) for tree in results[0].forest] == [6, 6]
+    assert results[1].forest is None and results[1].charge
+    assert results[1].charge.from_.name == "power_supply_0"
+    assert results[1].charge.to.name == "power_supply_1"
+    assert results[2].forest
+    assert [len(tree.nodes) for tree in results[2].forest] == [2, 10]
+
+    switches = ("switch_0", "switch_1", "switch_2")
+    rows = [[truth_table[name] for name in switches] for truth_table in truth_tables]
+    for a, b in zip(graph.gen_forests(rows, switches), results):
+        assert (a.forest is None) == (b.forest is None)
+        if a.forest is not None and b.forest is not None:
+            assert [t.nodes.keys() for t in a.forest] == [
+                t.nodes.keys() for t in b.forest
+            ]
+
+    with pytest.raises(NoSuchDevice):
+        graph.gen_forests([{"nonexistent": True}])
+    with pytest.raises(NoSuchDevice):
+        graph.gen_forests([[True]], ["nonexistent"])
+    with pytest.raises(ValueError):
+        graph.gen_forests([[True]], switches)
+
+
+def test_find_passages_cache(graph_fixture: AbstractPowerSupplySystemGraph):
+    graph = graph_fixture
+    destinations = (("load_0", 0), ("load_1", 0))
+
+    info = graph.forest_cache_info()
+    assert info.hits == 0 and info.misses == 0 and info.currsize == 0
+    passages = graph.find_passages(destinations, {"switch_2": False})
+    assert graph.forest_cache_info().misses == 1
+    # the same effective switch states
+    truth_table = {"switch_0": True, "switch_1": True, "switch_2": False}
+    assert graph.find_passages(destinations, truth_table) == passages
+    info = graph.forest_cache_info()
+    assert info.hits == 1 and info.misses == 1 and info.currsize == 1
+
+    for _ in range(2):
+        with pytest.raises(ChargePowerSupply) as e:
+            graph.find_passages(destinations, {"switch_2": True})
+        assert e.value.from_.name == "power_supply_0"
+        assert e.value.to.name == "power_supply_1"
+    info = graph.forest_cache_info()
+    assert info.hits == 2 and info.misses == 2 and info.currsize == 2
+
+    graph.add_device(Load("load_2")).add_edge(("bus_0", 0), ("load_2", 0))
+    passages = graph.find_passages(destinations + (("load_2", 0),), truth_table)
+    assert len(passages) == 3
+    info = graph.forest_cache_info()
+    assert info.hits == 2 and info.misses == 3 and info.currsize == 1
+
+    # shared with cached_forest
+    forest = graph.cached_forest(truth_table)
+    assert graph.cached_forest(truth_table) is forest
+    assert graph.forest_cache_info().hits == 4
+    assert [tree.ports for tree in forest] == [
+        tree.ports for tree in graph.gen_forest(truth_table)
+    ]
+
+
+def test_find_passages_cache_size():
+    graph = AbstractPowerSupplySystemGraph(forest_cache_size=1)
+    graph.add_device(PowerSupply("power_supply"))
+    graph.add_device(Switch("switch")).add_edge(("power_supply", 0), ("switch", 0))
+    for on in (True, False, True):
+        graph.find_passages([("switch", 1)], {"switch": on})
+    info = graph.forest_cache_info()
+    assert info.hits == 0 and info.misses == 3 and info.currsize == 1
+
+
+def test_forest_index(graph_fixture: AbstractPowerSupplySystemGraph):
+    graph = graph_fixture
+
+    truth_table = {"switch_0": True, "switch_1": True, "switch_2": False}
+    forest = graph.gen_forest(truth_table)
+    tree_0, tree_1 = forest
+    port_lookup = graph.compile().port_lookup
+    bus_0, switch_2 = port_lookup[("bus_0", 0)], port_lookup[("switch_2", 1)]
+    assert forest.index[bus_0] == [(tree_0, tree_0.last_nodes[bus_0])]
+    assert forest.index[switch_2] == [(tree_1, tree_1.last_nodes[switch_2])]
+    assert tree_1.passage(tree_1.last_nodes[switch_2])[-1] == ("switch_2", 1)
+    assert forest.find_passages(ThinPort("load_0", 0)) == [
+        tree_0.find_passage(ThinPort("load_0", 0))
+    ]
+    assert forest.find_passages(ThinPort("nonexistent", 0)) == []
+
+    forest = graph.update_forest(forest, {"switch_1": False}, truth_table)
+    assert len(forest.find_passages(ThinPort("load_1", 0))) == 0
+    truth_table = {**truth_table, "switch_1": False}
+    forest = graph.update_forest(forest, {"switch_2": True}, truth_table)
+    (passage,) = forest.find_passages(ThinPort("load_1", 0))
+    assert passage[0] == ("power_supply_0", 0)
+
+
+def test_tree_columns(graph_fixture: AbstractPowerSupplySystemGraph):
+    graph = graph_fixture
+
+    truth_table = {"switch_0": True, "switch_1": False, "switch_2": True}
+    tree_0, _ = graph.gen_forest(truth_table)
+    assert len(tree_0) == len(tree_0.nodes) == 10
+    assert tree_0.parents[0] == -1
+    # the columns and the materialized ports agree
+    for node in range(len(tree_0)):
+        children = tree_0.children[
+            tree_0.child_offsets[node] : tree_0.child_offsets[node + 1]
+        ]
+        passage = tree_0.passage(node)
+        directed_port = tree_0.nodes[passage[-1].id]
+        assert [tree_0.passage(child)[-1] for child in children] == [
+            child.as_thin_port() for child in directed_port.children
+        ]
+        assert tree_0.find_passage(passage[-1]) == passage
+
+
+def test_find_passages_backward(graph_fixture: AbstractPowerSupplySystemGraph):
+    graph = graph_fixture
+    destinations = (("load_0", 0), ("load_1", 0), ("nonexistent", 0))
+    for truth_table in (
+        {"switch_0": True, "switch_1": True, "switch_2": False},
+        {"switch_0": True, "switch_1": False, "switch_2": True},
+        {"switch_0": False, "switch_1": True, "switch_2": True},
+        {"switch_0": True, "switch_1": False, "switch_2": False},
+    ):
+        assert graph.find_passages(
+            destinations, truth_table, search="backward"
+        ) == graph.find_passages(destinations, truth_table)
+
+    # ChargePowerSupply on the way to the destinations
+    truth_table = {"switch_0": True, "switch_1": True, "switch_2": True}
+    with pytest.raises(ChargePowerSupply) as e:
+        graph.find_passages(destinations, truth_table, search="backward")
+    assert e.value.from_.name == "power_supply_0"
+    assert e.value.to.name == "power_supply_1"
+    # the destination is unreachable, the power supplies are not searched
+    graph.add_device(Load("load_2"))
+    assert not graph.find_passages([("load_2", 0)], truth_table, search="backward")
+
+
+def test_find_passages_backward_diodes():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_device(PowerSupply("power_supply"))
+    graph.add_device(Bus("bus_0")).add_edge(("power_supply", 0), ("bus_0", 0))
+    graph.add_device(Diode("diode_0")).add_edge(("bus_0", 0), ("diode_0", 0))
+    graph.add_device(Diode("diode_1")).add_edge(("bus_0", 0), ("diode_1", 0))
+    graph.add_device(Bus("bus_1"))
+    graph.add_edge(("diode_0", 1), ("bus_1", 0)).add_edge(("diode_1", 1), ("bus_1", 0))
+    graph.add_device(Load("load")).add_edge(("bus_1", 0), ("load", 0))
+    graph.add_device(Load("load_0")).add_edge(("diode_0", 1), ("load_0", 0))
+
+    destinations = (("load", 0), ("load_0", 0), ("bus_0", 0))
+    passages = graph.find_passages(destinations, search="backward")
+    assert passages == graph.find_passages(destinations)
+    assert [p.device_name for p in passages["load.0"][0]] == [
+        "power_supply",
+        "bus_0",
+        "diode_0",
+        "diode_0",
+        "bus_1",
+        "load",
+    ]
+
+
+def test_find_passages_backward_loop():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_device(PowerSupply("power_supply"))
+    graph.add_device(Switch("switch")).add_edge(("power_supply", 0), ("switch", 0))
+    graph.add_device(Bus("bus_0")).add_edge(("switch", 1), ("bus_0", 0))
+    graph.add_device(Diode("diode")).add_edge(("bus_0", 0), ("diode", 0))
+    graph.add_device(Load("load")).add_edge(("diode", 1), ("load", 0))
+    graph.add_edge(("load", 0), ("bus_0", 0))
+
+    # the loop through the diode leads back to the power supply
+    truth_table = {"switch": True}
+    with pytest.raises(ChargePowerSupply) as e:
+        graph.gen_dag(truth_table)
+    with pytest.raises(ChargePowerSupply) as e_backward:
+        graph.find_passages([("load", 0)], truth_table, search="backward")
+    assert (e_backward.value.from_, e_backward.value.to) == (e.value.from_, e.value.to)
+
+    # a loop behind a diode, the power supply charges itself
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_device(PowerSupply("power_supply"))
+    graph.add_device(Diode("diode")).add_edge(("power_supply", 0), ("diode", 0))
+    for i in range(3):
+        graph.add_device(Bus(f"bus_{i}"))
+    graph.add_edge(("diode", 1), ("bus_0", 0)).add_edge(("bus_0", 0), ("bus_1", 0))
+    graph.add_edge(("bus_1", 0), ("bus_2", 0)).add_edge(("bus_2", 0), ("bus_0", 0))
+    graph.add_device(Load("load")).add_edge(("bus_1", 0), ("load", 0))
+    with pytest.raises(ChargePowerSupply) as e:
+        graph.find_passages([("load", 0)], search="backward")
+    assert e.value.from_.name == e.value.to.name == "power_supply"
+
+
+def test_gen_dag():
+    g = AbstractPowerSupplySystemGraph()
+    for i in range(2):
+        g.add_device(PowerSupply(f"power_supply_{i}"))
+        g.add_device(Diode(f"diode_{i}")).add_edge(
+            (f"power_supply_{i}", 0), (f"diode_{i}", 0)
+        )
+    g.add_device(Bus("bus"))
+    g.add_edge(("diode_0", 1), ("bus", 0)).add_edge(("diode_1", 1), ("bus", 0))
+    g.add_device(Load("load")).add_edge(("bus", 0), ("load", 0))
+
+    dag = g.gen_dag()
+    assert len(dag.roots) == 2
+    assert len(dag.nodes) == 8
+    bus = dag.nodes["bus.0"]
+    assert [p.id for p in bus.parents] == ["diode_0.1", "diode_1.1"]
+    assert bus.parent is bus.parents[0]
+    assert [c.id for c in bus.children] == ["load.0"]
+    load = dag.nodes["load.0"]
+    assert load.parents == [bus]
+
+    forest = g.gen_forest()
+    for port_id in dag.nodes:
+        to = ThinPort(*port_id.split("."))
+        to = ThinPort(to.device_name, int(to.index))
+        assert dag.find_passages(to) == forest.find_passages(to)
+    assert [p[0].device_name for p in dag.find_passages(ThinPort("load", 0))] == [
+        "power_supply_0",
+        "power_supply_1",
+    ]
+    assert dag.find_passages(ThinPort("nonexistent", 0)) == []
+
+    g.add_device(Switch("switch"))
+    g.add_edge(("bus", 0), ("switch", 0)).add_edge(("switch", 1), ("power_supply_1", 0))
+    with pytest.raises(ChargePowerSupply) as e:
+        g.gen_dag()
+    assert e.value.from_.name == "power_supply_0"
+    assert e.value.to.name == "power_supply_1"
+
+
+def test_gen_dag_passages():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_device(PowerSupply("power_supply"))
+    graph.add_device(Bus("bus_0")).add_edge(("power_supply", 0), ("bus_0", 0))
+    graph.add_device(Diode("diode_0")).add_edge(("bus_0", 0), ("diode_0", 0))
+    graph.add_device(Diode("diode_1")).add_edge(("bus_0", 0), ("diode_1", 0))
+    graph.add_device(Bus("bus_1"))
+    graph.add_edge(("diode_0", 1), ("bus_1", 0)).add_edge(("diode_1", 1), ("bus_1", 0))
+    graph.add_device(Load("load")).add_edge(("bus_1", 0), ("load", 0))
+
+    dag = graph.gen_dag()
+    assert len(dag.nodes) == 8
+    # in the order of visiting, the tree only keeps the last one
+    passages = dag.find_passages(ThinPort("load", 0))
+    assert [[p.device_name for p in passage] for passage in passages] == [
+        ["power_supply", "bus_0", "diode_1", "diode_1", "bus_1", "load"],
+        ["power_supply", "bus_0", "diode_0", "diode_0", "bus_1", "load"],
+    ]
+    assert graph.gen_forest().find_passages(ThinPort("load", 0)) == passages[-1:]
+
+
+def test_gen_dag_size():
+    def size(generate):
+        """bytes allocated by the result of `generate`, while it's alive"""
+        tracemalloc.start()
+        try:
+            return generate(), tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+    # diode_mesh shares the buses fed by several supplies, wide_bus shares none
+    for topology, ratio in ((diode_mesh(50), 0.5), (wide_bus(2000), 2)):
+        graph = topology.build()
+        graph.compile()
+        _, forest_bytes = size(graph.gen_forest)
+        _, dag_bytes = size(graph.gen_dag)
+        assert dag_bytes < ratio * forest_bytes
+
+
+def test_energized_ports(graph_fixture: AbstractPowerSupplySystemGraph):
+    graph = graph_fixture
+    port_ids = graph.compile().port_ids
+
+    truth_table = {"switch_0": True, "switch_1": False, "switch_2": True}
+    energized = graph.energized_ports(truth_table)
+    assert list(energized) == ["power_supply_0", "power_supply_1"]
+    assert {
+        port_ids[port] for port, on in enumerate(energized["power_supply_0"]) if on
+    } == graph.gen_forest(truth_table)[0].nodes.keys()
+    assert [
+        port_ids[port] for port, on in enumerate(energized["power_supply_1"]) if on
+    ] == ["power_supply_1.0", "switch_1.0"]
+    assert graph.energized_loads(truth_table) == {
+        "load_0": ["power_supply_0"],
+        "load_1": ["power_supply_0"],
+    }
+    assert graph.energized_loads({"switch_0": False, "switch_2": False}) == {
+        "load_1": ["power_supply_1"]
+    }
+
+    truth_table = {"switch_0": True, "switch_1": True, "switch_2": True}
+    with pytest.raises(ChargePowerSupply) as e:
+        graph.energized_loads(truth_table)
+    assert e.value.from_.name == "power_supply_0"
+    assert e.value.to.name == "power_supply_1"
+    with pytest.raises(NoSuchDevice):
+        graph.energized_ports({"nonexistent": True})
+
+
+def test_energized_ports_diodes():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_device(PowerSupply("power_supply_0"))
+    graph.add_device(PowerSupply("power_supply_1"))
+    graph.add_device(Diode("diode_0")).add_edge(("power_supply_0", 0), ("diode_0", 0))
+    graph.add_device(Diode("diode_1")).add_edge(("power_supply_1", 0), ("diode_1", 0))
+    graph.add_device(Bus("bus"))
+    graph.add_edge(("diode_0", 1), ("bus", 0)).add_edge(("diode_1", 1), ("bus", 0))
+    graph.add_device(Load("load")).add_edge(("bus", 0), ("load", 0))
+
+    # the bus is fed by both power supplies through the diodes
+    assert graph.energized_loads() == {"load": ["power_supply_0", "power_supply_1"]}
+
+
+def test_critical_loads(graph_fixture: AbstractPowerSupplySystemGraph):
+    graph = graph_fixture
+
+    truth_table = {"switch_0": True, "switch_1": False, "switch_2": True}
+    assert graph.critical_loads(truth_table) == {
+        "switch_0": ["load_0", "load_1"],
+        "switch_1": [],
+        "bus_0": ["load_0", "load_1"],
+        "bus_1": ["load_1"],
+        "switch_2": ["load_1"],
+    }
+    # opening a critical switch loses exactly its loads
+    truth_table = {**truth_table, "switch_2": False}
+    assert graph.energized_loads(truth_table) == {"load_0": ["power_supply_0"]}
+
+    truth_table = {"switch_0": True, "switch_1": True, "switch_2": True}
+    with pytest.raises(ChargePowerSupply):
+        graph.critical_loads(truth_table)
+
+
+def test_critical_loads_diodes():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_devices(
+        [
+            PowerSupply("power_supply_0"),
+            PowerSupply("power_supply_1"),
+            DcDc("dc_dc_0"),
+            DcDc("dc_dc_1"),
+            Diode("diode_0"),
+            Diode("diode_1"),
+            Bus("bus"),
+            Switch("switch"),
+            Load("load_0"),
+            Load("load_1"),
+        ]
+    )
+    graph.add_edges(
+        [
+            (("power_supply_0", 0), ("dc_dc_0", 0)),
+            (("power_supply_1", 0), ("dc_dc_1", 0)),
+            (("dc_dc_0", 1), ("diode_0", 0)),
+            (("dc_dc_1", 1), ("diode_1", 0)),
+            (("diode_0", 1), ("bus", 0)),
+            (("diode_1", 1), ("bus", 0)),
+            (("bus", 0), ("load_0", 0)),
+            (("dc_dc_1", 1), ("switch", 0)),
+            (("switch", 1), ("load_1", 0)),
+        ]
+    )
+
+    # the bus is fed by both power supplies through the diodes
+    assert graph.critical_loads() == {
+        "dc_dc_0": [],
+        "dc_dc_1": ["load_1"],
+        "bus": ["load_0"],
+        "switch": ["load_1"],
+    }
+
+
+def test_conflict_sets(graph_fixture: AbstractPowerSupplySystemGraph):
+    graph = graph_fixture
+    sets = frozenset({"switch_0", "switch_1", "switch_2"})
+    assert graph.conflict_sets() == {
+        ("power_supply_0", "power_supply_1"): [sets],
+        ("power_supply_1", "power_supply_0"): [sets],
+    }
+    assert graph.find_conflict({"switch_2": False}) is None
+    truth_table = {"switch_0": True, "switch_1": True, "switch_2": True}
+    assert graph.find_conflict(truth_table) == ("power_supply_0", "power_supply_1")
+    assert graph.find_conflict({**truth_table, "switch_1": False}) is None
+    with pytest.raises(NoSuchDevice):
+        graph.find_conflict({"nonexistent": True})
+
+    # cached until the graph changes
+    compiled = graph.compile()
+    assert graph.compile().conflicts.masks is compiled.conflicts.masks
+    graph.add_device(Switch("switch_3")).add_edge(
+        ("bus_0", 0), ("switch_3", 0)
+    ).add_edge(("bus_1", 0), ("switch_3", 1))
+    sets_3 = frozenset({"switch_0", "switch_1", "switch_3"})
+    conflict_sets = graph.conflict_sets()
+    assert set(conflict_sets[("power_supply_0", "power_supply_1")]) == {sets, sets_3}
+    # the loop through switch_2 and switch_3
+    assert conflict_sets[("power_supply_0", "power_supply_0")] == [
+        frozenset({"switch_0", "switch_2", "switch_3"})
+    ]
+
+
+def test_conflict_sets_random():
+    # buses meshed by tie switches
+    topology = random_topology(3000, seed=0)
+    graph = topology.build()
+    conflict_sets = graph.conflict_sets()
+    open_ = dict.fromkeys(graph.compile().switch_lookup, False)
+    for sets in conflict_sets.values():
+        for switches in sets[:3]:
+            # each set charges a power supply alone, and is minimal
+            truth_table = {**open_, **dict.fromkeys(switches, True)}
+            assert graph.validate(truth_table) is not None
+            for switch in switches:
+                assert graph.validate({**truth_table, switch: False}) is None
+
+    # over budget, find_conflict falls back to validate
+    compiled = topology.build().compile()
+    compiled.conflicts.budget = 1000
+    with pytest.raises(TooManyConflictSets):
+        _ = compiled.conflicts.masks
+    for truth_table in random_truth_tables(graph, topology, 3, seed=0):
+        truth_table = {**truth_table, **dict.fromkeys(topology.ties or (), True)}
+        links = compiled.links(truth_table)
+        assert compiled.conflicts.find(links) == compiled.conflicts.validate(links)
+
+
+def test_conflict_sets_diodes():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_devices(
+        [
+            PowerSupply("power_supply_0"),
+            PowerSupply("power_supply_1"),
+            Switch("switch_0"),
+            Switch("switch_1"),
+            Diode("diode"),
+            Bus("bus"),
+        ]
+    )
+    graph.add_edges(
+        [
+            (("power_supply_0", 0), ("switch_0", 0)),
+            (("switch_0", 1), ("diode", 0)),
+            (("diode", 1), ("bus", 0)),
+            (("power_supply_1", 0), ("switch_1", 0)),
+            (("switch_1", 1), ("bus", 0)),
+        ]
+    )
+    # power_supply_1 can't charge power_supply_0 against the diode
+    assert graph.conflict_sets() == {
+        ("power_supply_0", "power_supply_1"): [frozenset({"switch_0", "switch_1"})]
+    }
+    for switch_0 in (False, True):
+        for switch_1 in (False, True):
+            truth_table = {"switch_0": switch_0, "switch_1": switch_1}
+            try:
+                graph.gen_forest(truth_table)
+            except ChargePowerSupply as e:
+                assert graph.find_conflict(truth_table) == (e.from_.name, e.to.name)
+            else:
+                assert graph.find_conflict(truth_table) is None
+
+
+def test_validate(graph_fixture: AbstractPowerSupplySystemGraph):
+    graph = graph_fixture
+    assert graph.validate({"switch_2": False}) is None
+    truth_table = {"switch_0": True, "switch_1": True, "switch_2": True}
+    assert graph.validate(truth_table) == ("power_supply_0", "power_supply_1")
+    assert graph.validate({**truth_table, "switch_0": False}) is None
+    with pytest.raises(NoSuchDevice):
+        graph.validate({"nonexistent": True})
+
+    # a loop charges the power supply itself
+    graph.add_device(Switch("switch_3")).add_edge(
+        ("bus_0", 0), ("switch_3", 0)
+    ).add_edge(("bus_1", 0), ("switch_3", 1))
+    truth_table = {"switch_0": True, "switch_1": False, "switch_2": True}
+    assert graph.validate(truth_table) == ("power_supply_0", "power_supply_0")
+    assert graph.validate({**truth_table, "switch_3": False}) is None
+
+
+def test_validate_diodes():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_devices(
+        [PowerSupply(f"power_supply_{i}") for i in range(2)]
+        + [Switch(f"switch_{i}") for i in range(6)]
+        + [Diode(f"diode_{i}") for i in range(3)]
+        + [Bus(f"bus_{i}") for i in range(3)]
+        + [DcDc("dc_dc")]
+    )
+    graph.add_edges(
+        [
+            (("power_supply_0", 0), ("switch_0", 0)),
+            (("switch_0", 1), ("bus_0", 0)),
+            (("power_supply_1", 0), ("switch_1", 0)),
+            (("switch_1", 1), ("dc_dc", 0)),
+            (("dc_dc", 1), ("bus_1", 0)),
+            # bus_0 feeds bus_2 through diode_0, bus_1 through diode_1
+            (("bus_0", 0), ("diode_0", 0)),
+            (("diode_0", 1), ("bus_2", 0)),
+            (("bus_1", 0), ("diode_1", 0)),
+            (("diode_1", 1), ("bus_2", 0)),
+            # bus_2 feeds back bus_0 through diode_2
+            (("bus_2", 0), ("switch_2", 0)),
+            (("switch_2", 1), ("diode_2", 0)),
+            (("diode_2", 1), ("bus_0", 0)),
+            # the cathodes of diode_0 and diode_1 are tied
+            (("diode_0", 1), ("switch_3", 0)),
+            (("switch_3", 1), ("diode_1", 1)),
+            (("bus_0", 0), ("switch_4", 0)),
+            (("switch_4", 1), ("bus_1", 0)),
+            (("bus_2", 0), ("switch_5", 0)),
+            (("switch_5", 1), ("bus_1", 0)),
+        ]
+    )
+    switches = [f"switch_{i}" for i in range(6)]
+    for states in range(1 << len(switches)):
+        truth_table = {
+            switch: bool(states >> i & 1) for i, switch in enumerate(switches)
+        }
+        try:
+            graph.energized_ports(truth_table)
+        except ChargePowerSupply as e:
+            # the power supply charged first depends on the order of search
+            pair = graph.validate(truth_table)
+            assert pair is not None and pair[0] == e.from_.name
+            closed = {switch for switch, on in truth_table.items() if on}
+            assert any(sets <= closed for sets in graph.conflict_sets()[pair])
+        else:
+            assert graph.validate(truth_table) is None
+
+
+def test_validate_self_edges():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_devices(
+        [PowerSupply("power_supply"), Switch("switch"), Switch("switch_1")]
+        + [DcDc("dc_dc"), Bus("bus"), Load("load")]
+    )
+    graph.add_edges(
+        [
+            (("power_supply", 0), ("switch", 0)),
+            # edges between the own ports of a switch and of a dc/dc
+            (("switch", 0), ("switch", 1)),
+            (("switch", 1), ("dc_dc", 0)),
+            (("dc_dc", 0), ("dc_dc", 1)),
+            (("dc_dc", 1), ("bus", 0)),
+            (("bus", 0), ("load", 0)),
+        ]
+    )
+    for on in (True, False):
+        graph.gen_forest({"switch": on})
+        assert graph.validate({"switch": on}) is None
+
+    # a loop through another switch is still one
+    graph.add_edges([(("bus", 0), ("switch_1", 0)), (("switch_1", 1), ("switch", 0))])
+    truth_table = {"switch": True, "switch_1": True}
+    with pytest.raises(ChargePowerSupply):
+        graph.gen_forest(truth_table)
+    assert graph.validate(truth_table) == ("power_supply", "power_supply")
+    assert graph.validate({**truth_table, "switch_1": False}) is None
+
+
+def test_gen_forest_shared():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_devices(
+        [PowerSupply(f"power_supply_{i}") for i in range(3)]
+        + [Diode(f"diode_{i}") for i in range(3)]
+        + [Bus("bus"), Switch("switch"), Bus("bus_1")]
+        + [Load(f"load_{i}") for i in range(3)]
+    )
+    graph.add_edges(
+        [(("bus", 0), ("switch", 0)), (("switch", 1), ("bus_1", 0))]
+        + [(("bus_1", 0), (f"load_{i}", 0)) for i in range(3)]
+    )
+    for i in range(3):
+        graph.add_edge((f"power_supply_{i}", 0), (f"diode_{i}", 0), extras=i)
+        graph.add_edge((f"diode_{i}", 1), ("bus", 0), extras=i)
+
+    compiled = graph.compile()
+    links = compiled.links()
+    forest = graph.gen_forest()
+    # the bus is searched once, and copied into the other trees
+    for root, tree in zip(compiled.roots, forest):
+        ports, parents, extras = compiled._grow(
+            compiled.port_devices[root], root, -1, links
+        )
+        assert list(tree.ports) == list(ports)
+        assert list(tree.parents) == list(parents)
+        assert list(tree.extras) == extras
+    passages = forest.find_passages(ThinPort("load_2", 0))
+    assert [[p.device_name for p in passage] for passage in passages] == [
+        [f"power_supply_{i}", f"diode_{i}", f"diode_{i}"]
+        + ["bus", "switch", "switch", "bus_1", "load_2"]
+        for i in range(3)
+    ]
+
+
+def test_random_topology():
+    topology = random_topology(3000, supplies=4, seed=7, diodes=0.02, ties=0.02)
+    assert random_topology(3000, supplies=4, seed=7, diodes=0.02, ties=0.02) == (
+        topology
+    )
+    graph = topology.build()
+    compiled = graph.compile()
+    assert len(compiled.port_ids) >= 3000
+    destinations = topology.destinations[::50]
+    for truth_table in random_truth_tables(graph, topology, 5, seed=7):
+        links = compiled.links(truth_table)
+        forest = graph.gen_forest(truth_table)
+        # the shared forest is the trees grown from each root alone
+        for root, tree in zip(compiled.roots, forest):
+            ports, parents, _ = compiled._grow(
+                compiled.port_devices[root], root, -1, links
+            )
+            assert list(tree.ports) == list(ports)
+            assert list(tree.parents) == list(parents)
+        assert graph.find_passages(destinations, truth_table) == graph.find_passages(
+            destinations, truth_table, search="backward"
+        )
+
+
+def test_update_forest_random():
+    topology = random_topology(3000, supplies=4, seed=3, diodes=0.02, ties=0.02)
+    graph = topology.build()
+    truth_tables = list(random_truth_tables(graph, topology, 4, seed=3))
+    switches = [
+        device.name
+        for device in topology.devices
+        if isinstance(device, Switch) and device.name not in topology.ties
+    ]
+    # switches shorted by an edge between their own ports
+    shorted = switches[5::97]
+    for name in shorted:
+        graph.add_edge((name, 0), (name, 1))
+    switches += list(topology.ties)
+    rng = random.Random(3)
+    for truth_table in truth_tables:
+        forest = graph.gen_forest(truth_table)
+        for _ in range(8):
+            names = rng.sample(switches, 3) + [rng.choice(shorted)]
+            delta = {name: not truth_table[name] for name in names}
+            try:
+                expected = graph.gen_forest({**truth_table, **delta})
+            except ChargePowerSupply as e:
+                with pytest.raises(ChargePowerSupply) as raised:
+                    graph.update_forest(forest, delta, truth_table)
+                assert (raised.value.from_, raised.value.to) == (e.from_, e.to)
+                continue
+            updated = graph.update_forest(forest, delta, truth_table)
+            for a, b in zip(updated, expected):
+                assert list(a.ports) == list(b.ports)
+                assert list(a.parents) == list(b.parents)
+                assert list(a.extras) == list(b.extras)
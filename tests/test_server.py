@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+
+import http.client
+import json
+import socket
+import threading
+
+import pytest
+
+from apssm.graph import AbstractPowerSupplySystemGraph
+from apssm.server import make_server
+
+
+@pytest.fixture
+def server(graph: AbstractPowerSupplySystemGraph):
+    server = make_server(graph, ("127.0.0.1", 0), workers=4)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def post(server, path: str, body) -> tuple[int, dict]:
+    connection = http.client.HTTPConnection(*server.server_address)
+    connection.request("POST", path, json.dumps(body))
+    response = connection.getresponse()
+    res = response.status, json.loads(response.read())
+    connection.close()
+    return res
+
+
+def test_queries(graph: AbstractPowerSupplySystemGraph, server):
+    destinations = [["load_0", 0], ["load_1", 0]]
+    status, body = post(server, "/find_passages", {"destinations": destinations})
+    assert status == 200
+    assert body["passages"] == json.loads(
+        json.dumps(graph.find_passages(map(tuple, destinations)))
+    )
+    truth_table = {"switch_1": False, "switch_2": True}
+    assert post(server, "/energized_loads", {"truth_table": truth_table}) == (
+        200,
+        {
+            "energized_loads": {
+                "load_0": ["power_supply_0"],
+                "load_1": ["power_supply_0"],
+            }
+        },
+    )
+    status, body = post(server, "/gen_forest", {"truth_table": truth_table})
+    assert [tree["ports"][0] for tree in body["forest"]] == [
+        "power_supply_0.0",
+        "power_supply_1.0",
+    ]
+    assert body["forest"][1] == {
+        "ports": ["power_supply_1.0", "switch_1.0"],
+        "parents": [-1, 0],
+    }
+    # the forest is shared with find_passages by the cache
+    hits = graph.forest_cache_info().hits
+    post(server, "/find_passages", {"destinations": [], "truth_table": truth_table})
+    assert graph.forest_cache_info().hits == hits + 1
+
+    charge = ["power_supply_0", "power_supply_1"]
+    assert post(server, "/validate", {"truth_table": {"switch_2": True}}) == (
+        200,
+        {"charge": charge},
+    )
+    assert post(server, "/gen_forest", {"truth_table": {"switch_2": True}}) == (
+        200,
+        {"charge": charge},
+    )
+    assert post(server, "/validate", {}) == (200, {"charge": None})
+
+
+def test_errors(server):
+    status, body = post(server, "/gen_forest", {"truth_table": {"nonexistent": True}})
+    assert status == 400
+    assert body["error"] == "NoSuchDevice: No such Device: nonexistent"
+    assert post(server, "/find_passages", {})[0] == 400
+    assert post(server, "/gen_forest", []) == (
+        400,
+        {"error": "TypeError: a request must be an object"},
+    )
+    # ill-typed or unknown fields
+    for path in ("/gen_forest", "/validate", "/energized_loads"):
+        status, body = post(server, path, {"truth_table": [1]})
+        assert status == 400
+        assert body["error"].startswith("ValueError: truth_table")
+    assert post(server, "/validate", {"truth_table": {"switch_0": 1}})[0] == 400
+    assert post(server, "/gen_forest", {"destinations": 5}) == (
+        400,
+        {"error": "ValueError: unknown fields: destinations"},
+    )
+    assert post(server, "/find_passages", {"destinations": 5})[0] == 400
+    assert post(server, "/find_passages", {"destinations": [["load_0", "0"]]})[0] == 400
+    status, body = post(
+        server, "/find_passages", {"destinations": [], "search": "sideways"}
+    )
+    assert (status, body["error"]) == (400, "ValueError: invalid search: sideways")
+    assert post(server, "/nonexistent", {})[0] == 404
+
+    connection = http.client.HTTPConnection(*server.server_address)
+    connection.request("GET", "/cache_info")
+    assert json.loads(connection.getresponse().read())["maxsize"] == 128
+
+
+def test_unix_socket(graph: AbstractPowerSupplySystemGraph, tmp_path):
+    path = str(tmp_path / "apssm.sock")
+    server = make_server(graph, path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+            body = b"{}"
+            client.sendall(
+                b"POST /energized_loads HTTP/1.0\r\nContent-Length: 2\r\n\r\n" + body
+            )
+            response = b""
+            while chunk := client.recv(4096):
+                response += chunk
+        head, _, content = response.partition(b"\r\n\r\n")
+        assert head.startswith(b"HTTP/1.0 200")
+        assert json.loads(content)["energized_loads"] == {
+            "load_0": ["power_supply_0"],
+            "load_1": ["power_supply_1"],
+        }
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def test_unix_socket_not_socket(graph: AbstractPowerSupplySystemGraph, tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_text("data")
+    with pytest.raises(FileExistsError):
+        make_server(graph, str(path))
+    assert path.read_text() == "data"
+
+    # a socket left by a previous server is replaced
+    path = str(tmp_path / "apssm.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+        stale.bind(path)
+    server = make_server(graph, path)
+    server.server_close()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+
+import pickle
+
+import pytest
+
+from apssm.devices.bus import Bus
+from apssm.devices.dc_dc import DcDc
+from apssm.devices.diode import Diode
+from apssm.devices.load import Load
+from apssm.devices.power_supply import PowerSupply
+from apssm.devices.switch import Switch
+from apssm.graph import AbstractPowerSupplySystemGraph
+from apssm.snapshot import load, load_graph, open_snapshot, save
+from apssm.thin_port import ThinPort
+
+
+@pytest.fixture
+def graph():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_devices(
+        [
+            PowerSupply("电源_0"),
+            PowerSupply("power_supply_1"),
+            Switch("switch_0"),
+            Switch("switch_1", on=False),
+            DcDc("dc_dc"),
+            Bus("bus"),
+            Diode("diode"),
+            Load("load"),
+        ]
+    )
+    graph.add_edges(
+        [
+            (("电源_0", 0), ("switch_0", 0), {"cable": 1}),
+            (("power_supply_1", 0), ("switch_1", 0)),
+            (("switch_1", 1), ("dc_dc", 0)),
+            (("bus", 0), ("diode", 0), "foo"),
+            (("switch_0", 1), ("bus", 0)),
+            (("dc_dc", 1), ("bus", 0)),
+            (("diode", 1), ("load", 0)),
+        ]
+    )
+    return graph
+
+
+def test_load(graph: AbstractPowerSupplySystemGraph, tmp_path):
+    path = tmp_path / "graph.apssm"
+    save(graph, path)
+
+    compiled, loaded = graph.compile(), load(path)
+    assert isinstance(loaded.offsets, memoryview)
+    assert isinstance(loaded.neighbors, memoryview)
+    assert [device.name for device in loaded.devices] == list(graph.devices)
+    # the tables are read from the snapshot, the lookups built on first use
+    assert "port_ids" not in loaded.__dict__
+    for table in ("port_numbers", "kinds", "partners", "base_links", "cathodes"):
+        assert list(getattr(loaded, table)) == list(getattr(compiled, table))
+    assert loaded.roots == compiled.roots
+    assert loaded.switch_ports == compiled.switch_ports
+    assert loaded.port_ids == compiled.port_ids
+    assert list(loaded.offsets) == list(compiled.offsets)
+    assert list(loaded.neighbors) == list(compiled.neighbors)
+    assert loaded.extras == compiled.extras
+    assert loaded.kinds == compiled.kinds
+    assert list(loaded.links()) == list(compiled.links())
+
+    destinations = [ThinPort("load", 0), ThinPort("bus", 0)]
+    for truth_table in ({}, {"switch_0": False, "switch_1": True}):
+        assert loaded.passages(
+            loaded.gen_forest(truth_table), destinations
+        ) == compiled.passages(compiled.gen_forest(truth_table), destinations)
+
+    # the memoryviews are copied when pickled, e.g. sent to sweep workers
+    unpickled = pickle.loads(pickle.dumps(loaded))
+    assert list(unpickled.neighbors) == list(compiled.neighbors)
+
+
+def test_load_graph(graph: AbstractPowerSupplySystemGraph, tmp_path):
+    path = tmp_path / "graph.apssm"
+    save(graph, path)
+
+    loaded = load_graph(path)
+    version = loaded.version
+    # the compiled graph of the snapshot is used, the ports and edges are only
+    # built on first use
+    assert isinstance(loaded.compile().offsets, memoryview)
+    assert loaded._unbuilt is not None
+    assert loaded.find_passages([("load", 0)]) == graph.find_passages([("load", 0)])
+    assert loaded._unbuilt is not None
+    assert [
+        (port_id, [(neighbor.id, extras) for neighbor, extras in port.adj_list])
+        for port_id, port in loaded.ports.items()
+    ] == [
+        (port_id, [(neighbor.id, extras) for neighbor, extras in port.adj_list])
+        for port_id, port in graph.ports.items()
+    ]
+    assert [(edge.first.id, edge.second.id, edge.extras) for edge in loaded.edges] == [
+        (edge.first.id, edge.second.id, edge.extras) for edge in graph.edges
+    ]
+    assert not loaded.devices["switch_1"].on  # type: ignore
+    assert loaded.find_passages(
+        [("load", 0)], {"switch_0": False, "switch_1": True}
+    ) == graph.find_passages([("load", 0)], {"switch_0": False, "switch_1": True})
+
+    # the switches are shared by the graph and its compiled graph
+    loaded.devices["switch_0"].turn_off()  # type: ignore
+    assert not loaded.find_passages([("load", 0)])
+    assert loaded.version == version
+
+    loaded.add_device(Load("load_1")).add_edge(("bus", 0), ("load_1", 0))
+    assert not isinstance(loaded.compile().offsets, memoryview)
+
+    collected = []
+    loaded = load_graph(path, stats_sink=collected.append)
+    loaded.gen_forest()
+    assert [stats.operation for stats in collected] == ["gen_forest"]
+
+
+def test_invalid_snapshot(graph: AbstractPowerSupplySystemGraph, tmp_path):
+    path = tmp_path / "graph.apssm"
+    for content in (b"", b"not a snapshot" * 10):
+        path.write_bytes(content)
+        with pytest.raises(ValueError):
+            open_snapshot(path)
+
+    save(graph, path)
+    path.write_bytes(path.read_bytes()[:-16])
+    with pytest.raises(ValueError):
+        open_snapshot(path)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+
+import pytest
+
+from apssm.devices.bus import Bus
+from apssm.devices.diode import Diode
+from apssm.devices.load import Load
+from apssm.devices.power_supply import PowerSupply
+from apssm.devices.switch import Switch
+from apssm.exceptions import ChargePowerSupply, NoSuchDevice
+from apssm.graph import AbstractPowerSupplySystemGraph
+from apssm.states import legal_states
+
+
+@pytest.fixture
+def graph():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_devices(
+        [
+            PowerSupply("power_supply_0"),
+            PowerSupply("power_supply_1"),
+            PowerSupply("power_supply_2"),
+            Switch("switch_0"),
+            Switch("switch_1"),
+            Switch("switch_2"),
+            Switch("switch_3"),
+            Switch("switch_4"),
+            Diode("diode"),
+            Bus("bus_0"),
+            Bus("bus_1"),
+            Bus("bus_2"),
+            Load("load_0"),
+            Load("load_1"),
+            Load("load_2"),
+        ]
+    )
+    graph.add_edges(
+        [
+            (("power_supply_0", 0), ("switch_0", 0)),
+            (("switch_0", 1), ("bus_0", 0)),
+            (("bus_0", 0), ("load_0", 0)),
+            (("power_supply_1", 0), ("switch_1", 0)),
+            (("switch_1", 1), ("bus_1", 0)),
+            (("bus_1", 0), ("load_1", 0)),
+            # bus_0 and bus_1 are tied by switch_2
+            (("bus_0", 0), ("switch_2", 0)),
+            (("switch_2", 1), ("bus_1", 0)),
+            # power_supply_2 feeds bus_2 and, through the diode, bus_1
+            (("power_supply_2", 0), ("switch_3", 0)),
+            (("switch_3", 1), ("bus_2", 0)),
+            (("bus_2", 0), ("load_2", 0)),
+            (("bus_2", 0), ("switch_4", 0)),
+            (("switch_4", 1), ("diode", 0)),
+            (("diode", 1), ("bus_1", 0)),
+        ]
+    )
+    return graph
+
+
+def test_legal_states(graph: AbstractPowerSupplySystemGraph):
+    switches = ["switch_0", "switch_1", "switch_2", "switch_3", "switch_4"]
+    results = list(legal_states(graph))
+    expected = []
+    for i in range(1 << len(switches)):
+        # the i-th gray code, bit j is the state of switch j
+        code = i ^ (i >> 1)
+        truth_table = {name: bool(code >> j & 1) for j, name in enumerate(switches)}
+        try:
+            expected.append((truth_table, graph.energized_loads(truth_table)))
+        except ChargePowerSupply:
+            pass
+    assert 0 < len(expected) < 1 << len(switches)
+    assert results == expected
+    assert results[0].energized_loads == {}
+
+
+def test_legal_states_subset(graph: AbstractPowerSupplySystemGraph):
+    results = list(legal_states(graph, ["switch_2", "switch_4"], {"switch_1": False}))
+    assert [list(result.truth_table.values()) for result in results] == [
+        [False, False],
+        [True, False],
+        # both closed, power_supply_2 charges power_supply_0
+        [False, True],
+    ]
+    assert results[1].energized_loads == {
+        "load_0": ["power_supply_0"],
+        "load_1": ["power_supply_0"],
+        "load_2": ["power_supply_2"],
+    }
+    assert results[2].energized_loads == {
+        "load_0": ["power_supply_0"],
+        "load_1": ["power_supply_2"],
+        "load_2": ["power_supply_2"],
+    }
+
+
+def test_legal_states_invalid(graph: AbstractPowerSupplySystemGraph):
+    with pytest.raises(NoSuchDevice):
+        list(legal_states(graph, ["nonexistent"]))
+    with pytest.raises(ValueError):
+        list(legal_states(graph, ["bus_0"]))
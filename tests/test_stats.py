@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+
+import json
+
+import pytest
+
+from apssm.devices.bus import Bus
+from apssm.devices.diode import Diode
+from apssm.devices.load import Load
+from apssm.devices.power_supply import PowerSupply
+from apssm.devices.switch import Switch
+from apssm.exceptions import ChargePowerSupply
+from apssm.graph import AbstractPowerSupplySystemGraph
+from apssm.stats import SearchStats
+
+
+@pytest.fixture
+def collected():
+    return []
+
+
+@pytest.fixture
+def graph(collected):
+    graph = AbstractPowerSupplySystemGraph(stats_sink=collected.append)
+    graph.add_devices(
+        [PowerSupply(f"power_supply_{i}") for i in range(3)]
+        + [Diode(f"diode_{i}") for i in range(3)]
+        + [Bus("bus"), Switch("switch"), Bus("bus_1"), Switch("tie", on=False)]
+        + [Load(f"load_{i}") for i in range(3)]
+    )
+    graph.add_edges(
+        [(("bus", 0), ("switch", 0)), (("switch", 1), ("bus_1", 0))]
+        + [(("bus_1", 0), (f"load_{i}", 0)) for i in range(3)]
+        + [(("power_supply_0", 0), ("tie", 0)), (("tie", 1), ("power_supply_1", 0))]
+    )
+    for i in range(3):
+        graph.add_edge((f"power_supply_{i}", 0), (f"diode_{i}", 0))
+        graph.add_edge((f"diode_{i}", 1), ("bus", 0))
+    return graph
+
+
+def test_gen_forest(graph, collected):
+    forest = graph.gen_forest()
+    (stats,) = collected
+    assert stats.operation == "gen_forest"
+    assert [tree.root for tree in stats.trees] == [
+        f"power_supply_{i}" for i in range(3)
+    ]
+    assert [tree.ports for tree in stats.trees] == [len(tree) for tree in forest]
+    # the bus is searched by the first tree only, and copied into the others
+    first, *others = stats.trees
+    assert first.searched == first.ports
+    for tree in others:
+        assert tree.searched < tree.ports
+        assert tree.edges < first.edges
+    # the bus doesn't enter the cathodes of the other diodes
+    assert first.diode_cutoffs == 2
+    assert stats.cache_hit is None
+    assert stats.forest_bytes > 0
+    assert stats.seconds >= sum(tree.seconds for tree in stats.trees)
+    assert stats.largest() is first
+    assert stats.metrics()["ports"] == sum(map(len, forest))
+    json.dumps(stats.to_dict())
+
+
+def test_find_passages(graph, collected):
+    graph.find_passages(iter([("load_0", 0), ("load_1", 0)]))
+    graph.find_passages([("load_0", 0)])
+    miss, hit = collected
+    assert miss.cache_hit is False
+    assert len(miss.trees) == 3
+    assert (miss.destinations, miss.passages) == (2, 6)
+    assert hit.cache_hit is True
+    assert hit.trees == []
+    assert (hit.destinations, hit.passages) == (1, 3)
+    assert hit.metrics()["cache_hit"] == 1
+
+
+def test_find_passages_backward(graph, collected):
+    passages = graph.find_passages([("load_0", 0)], search="backward")
+    (stats,) = collected
+    assert stats.operation == "find_passages_backward"
+    assert stats.cache_hit is None
+    assert len(stats.trees) == 3
+    assert stats.backward_ports > 0
+    assert stats.passages == len(passages["load_0.0"]) == 3
+    assert all(tree.ports == tree.searched > 0 for tree in stats.trees)
+
+
+def test_charge(graph, collected):
+    with pytest.raises(ChargePowerSupply):
+        graph.gen_forest({"tie": True})
+    (stats,) = collected
+    assert stats.charge == ("power_supply_0", "power_supply_1")
+    assert stats.metrics()["charge"] == 1
+
+
+def test_disabled(graph, collected):
+    graph.stats_sink = None
+    graph.gen_forest()
+    graph.find_passages([("load_0", 0)])
+    assert collected == []
+    assert SearchStats("gen_forest").largest() is None
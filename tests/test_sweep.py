@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+
+import os
+
+import pytest
+
+from apssm.exceptions import NoSuchDevice
+from apssm.graph import AbstractPowerSupplySystemGraph
+from apssm.sweep import ChunkPool, sweep
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_sweep(graph: AbstractPowerSupplySystemGraph, workers: int):
+    switches = ("switch_0", "switch_1", "switch_2")
+    rows = [
+        (a, b, c) for a in (True, False) for b in (True, False) for c in (True, False)
+    ] * 5
+    destinations = [("load_0", 0), ("load_1", 0)]
+    results = list(
+        sweep(graph, rows, destinations, switches, workers=workers, chunk_size=3)
+    )
+    assert len(results) == len(rows)
+    for row, result in zip(rows, results):
+        truth_table = dict(zip(switches, row))
+        if row[0] and row[1] and row[2]:
+            assert result.passages is None and result.charge
+            assert result.charge.from_ is graph.devices["power_supply_0"]
+            assert result.charge.to is graph.devices["power_supply_1"]
+        else:
+            assert result.charge is None
+            assert result.passages == graph.find_passages(destinations, truth_table)
+
+    truth_tables = [dict(zip(switches, row)) for row in rows]
+    for a, b in zip(
+        sweep(graph, truth_tables, destinations, workers=workers, chunk_size=4),
+        results,
+    ):
+        assert a.passages == b.passages
+
+
+def test_sweep_invalid(graph: AbstractPowerSupplySystemGraph):
+    with pytest.raises(NoSuchDevice):
+        list(sweep(graph, [{"nonexistent": True}], [], workers=2))
+    with pytest.raises(NoSuchDevice):
+        list(sweep(graph, [[True]], [], ["nonexistent"], workers=2))
+
+
+def _pid(topology: str, chunk: int) -> tuple[str, int, int]:
+    return topology, chunk, os.getpid()
+
+
+def test_chunk_pool():
+    with ChunkPool("topology", workers=2) as pool:
+        first = list(pool.map(_pid, range(8)))
+        # the second batch is mapped by the same workers
+        second = list(pool.map(_pid, range(8, 16)))
+    results = first + second
+    assert [(topology, chunk) for topology, chunk, _ in results] == [
+        ("topology", chunk) for chunk in range(16)
+    ]
+    pids = {pid for *_, pid in results}
+    assert len(pids) <= 2 and os.getpid() not in pids
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+
+import pickle
+
+import pytest
+
+from apssm.devices.bus import Bus
+from apssm.devices.dc_dc import DcDc
+from apssm.devices.diode import Diode
+from apssm.devices.load import Load
+from apssm.devices.power_supply import PowerSupply
+from apssm.devices.switch import Switch
+from apssm.graph import AbstractPowerSupplySystemGraph
+from apssm.thin_port import ThinPort
+from apssm.tree import AbstractPowerSupplySystemForest, AbstractPowerSupplySystemTree
+
+
+@pytest.fixture
+def graph():
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_devices(
+        [
+            PowerSupply("power_supply_0"),
+            PowerSupply("power_supply_1"),
+            Switch("switch_0"),
+            Switch("switch_1"),
+            Diode("diode_0"),
+            Diode("diode_1"),
+            Bus("bus"),
+            Load("load"),
+        ]
+    )
+    graph.add_edges(
+        [
+            (("power_supply_0", 0), ("switch_0", 0), "cable_0"),
+            (("power_supply_1", 0), ("switch_1", 0), "cable_1"),
+            (("switch_0", 1), ("diode_0", 0)),
+            (("switch_1", 1), ("diode_1", 0)),
+            (("diode_0", 1), ("bus", 0)),
+            (("diode_1", 1), ("bus", 0)),
+            (("bus", 0), ("load", 0)),
+        ]
+    )
+    return graph
+
+
+def test_tree_buffer(graph: AbstractPowerSupplySystemGraph):
+    compiled = graph.compile()
+    tree, _ = graph.gen_forest()
+    imported = AbstractPowerSupplySystemTree.from_buffer(compiled, tree.to_buffer())
+    assert isinstance(imported.ports, memoryview)
+    assert isinstance(imported.parents, memoryview)
+    assert list(imported.ports) == list(tree.ports)
+    assert list(imported.parents) == list(tree.parents)
+    assert list(imported.extras) == list(tree.extras)
+    for port in (ThinPort("load", 0), ThinPort("bus", 0), ThinPort("nonexistent", 0)):
+        assert imported.find_passage(port) == tree.find_passage(port)
+    # a missing port doesn't materialize the directed ports
+    assert "_directed_ports" not in imported.__dict__
+    assert imported.root.as_thin_port() == ("power_supply_0", 0)
+    assert imported.nodes.keys() == tree.nodes.keys()
+
+    with pytest.raises(ValueError):
+        AbstractPowerSupplySystemTree.from_buffer(compiled, b"not a tree" * 10)
+    graph.add_device(Load("load_1"))
+    with pytest.raises(ValueError):
+        AbstractPowerSupplySystemTree.from_buffer(graph.compile(), tree.to_buffer())
+
+
+def test_tree_from_root(graph: AbstractPowerSupplySystemGraph):
+    compiled = graph.compile()
+    tree_0, tree_1 = graph.gen_forest({"switch_1": True})
+    converted = AbstractPowerSupplySystemTree.from_root(compiled, tree_0.root)
+    assert list(converted.ports) == list(tree_0.ports)
+    assert list(converted.parents) == list(tree_0.parents)
+    assert list(converted.extras) == list(tree_0.extras)
+    # equal by the nodes, not by identity
+    assert converted == tree_0
+    assert tree_0 == AbstractPowerSupplySystemTree.from_buffer(
+        compiled, tree_0.to_buffer()
+    )
+    assert converted != tree_1
+
+    other = AbstractPowerSupplySystemGraph()
+    other.add_device(PowerSupply("power_supply_0"))
+    with pytest.raises(ValueError):
+        AbstractPowerSupplySystemTree.from_root(other.compile(), tree_0.root)
+
+
+def test_forest_buffer(graph: AbstractPowerSupplySystemGraph):
+    compiled = graph.compile()
+    forest = graph.gen_forest()
+    imported = AbstractPowerSupplySystemForest.from_buffer(compiled, forest.to_buffer())
+    assert len(imported) == 2
+    assert imported.find_passages(ThinPort("load", 0)) == forest.find_passages(
+        ThinPort("load", 0)
+    )
+    # an imported forest could be updated as well
+    updated = graph.update_forest(imported, {"switch_0": False})
+    assert updated.find_passages(ThinPort("load", 0)) == graph.gen_forest(
+        {"switch_0": False}
+    ).find_passages(ThinPort("load", 0))
+
+
+def test_pickle_forest():
+    # a chain deeper than the recursion limit
+    graph = AbstractPowerSupplySystemGraph()
+    graph.add_devices(
+        [PowerSupply("power_supply")] + [DcDc(f"dc_dc_{i}") for i in range(2000)]
+    )
+    graph.add_edge(("power_supply", 0), ("dc_dc_0", 0))
+    graph.add_edges(((f"dc_dc_{i}", 1), (f"dc_dc_{i + 1}", 0)) for i in range(1999))
+    forest = graph.gen_forest()
+    # the linked DirectedPorts are built and cached
+    assert len(forest[0].nodes) == 4001
+
+    unpickled = pickle.loads(pickle.dumps(forest))
+    assert isinstance(unpickled, AbstractPowerSupplySystemForest)
+    assert unpickled.find_passages(ThinPort("dc_dc_1999", 1)) == forest.find_passages(
+        ThinPort("dc_dc_1999", 1)
+    )
+    assert pickle.loads(pickle.dumps(AbstractPowerSupplySystemForest())) == ()